@@ -1,12 +1,13 @@
 
 from typing_extensions import TypedDict
-from typing import Dict, List
+from typing import Annotated, Any, Dict, List, Union
 from pydantic import BaseModel, Field
 from langchain_core.messages import AnyMessage
+from utils.text_history import TextHistory
 
 # class ResearchResponse(BaseModel):
 #     content: str = Field(default="", description="The content of the research for writing the article")
-#     sources: List[str] = Field(default=[], description="The urls of thesources of the research for writing the article")
+#     sources: List[str] = Field(default_factory=list, description="The urls of thesources of the research for writing the article")
 #     sources_content: str = Field(default="", description="The content of the research websites in concatenated markdown form")
     
 # class BlogAgentState(TypedDict):
@@ -68,7 +69,7 @@ from langchain_core.messages import AnyMessage
 
 class ResearchResponse(BaseModel):
     content: str = Field(default="", description="The content of the research for writing the article")
-    sources: List[str] = Field(default=[], description="The urls of thesources of the research for writing the article")
+    sources: List[str] = Field(default_factory=list, description="The urls of thesources of the research for writing the article")
     sources_content: str = Field(default="", description="The content of the research websites in concatenated markdown form")
 
 class BlogOutlineSimple(BaseModel):
@@ -82,32 +83,48 @@ class BlogOutlineEvaluation(BaseModel):
     evaluation: str = Field(default="", description="Detailed evaluation on how to improve the outline of the blog post or article")
     good_to_go: bool = Field(default=True, description="Whether the outline is good to go (true) or needs more work (false)")
     iteration_number: int = Field(default=0, description="The iteration number of the outline, starting at 0")
-    messages: List[AnyMessage] = Field(default=[], description="The prompt messages from the evaluator LLM")
+    messages: List[AnyMessage] = Field(default_factory=list, description="The prompt messages from the evaluator LLM, the evaluated outlines are kept in documents")
+    documents: TextHistory = Field(default_factory=TextHistory, description="Every evaluated version of the outline, referenced from the prompt messages")
 
 class BlogOutline(BaseModel):
     thesis: str = Field(default="", description="The thesis of the blog post")
-    research: ResearchResponse = Field(default=None,description="The research response from Perplexity AI")
-    outline: BlogOutlineSimple = Field(default=BlogOutlineSimple().model_construct(), description="The core outline points of the blog post")
-    outline_evaluation: BlogOutlineEvaluation = Field(default=BlogOutlineEvaluation().model_construct(), description="Notes about how interesting this outline is and notes on improving it (if needed)")
+    research: ResearchResponse = Field(default_factory=ResearchResponse, description="The research response from Perplexity AI")
+    outline: BlogOutlineSimple = Field(default_factory=BlogOutlineSimple, description="The core outline points of the blog post")
+    candidates: List[BlogOutlineSimple] = Field(default_factory=list, description="Candidate outlines waiting for the evaluator to pick the best one (when several are created per round)")
+    outline_evaluation: BlogOutlineEvaluation = Field(default_factory=BlogOutlineEvaluation, description="Notes about how interesting this outline is and notes on improving it (if needed)")
 
 class BlogArticleEvaluation(BaseModel):
     evaluation: str = Field(default="", description="Detailed evaluation on how interesting this article is and notes on improving it (if needed)")
     good_to_go: bool = Field(default=True, description="Whether the article is good to go (true) or needs more work (false)")
     iteration_number: int = Field(default=0, description="The iteration number of the article, starting at 0")
-    messages: List[AnyMessage] = Field(default=[], description="The prompt messages from the evaluator LLM")
+    messages: List[AnyMessage] = Field(default_factory=list, description="The prompt messages from the evaluator LLM, the evaluated articles are kept in documents")
+    documents: TextHistory = Field(default_factory=TextHistory, description="Every evaluated version of the article, referenced from the prompt messages")
 
 class BlogArticle(BaseModel):
     article_text: str = Field(default="", description="The raw text of the article or blog post")
-    article_text_history: List[str] = Field(default=[], description="The history of the article text, starting with the original article text and ending with the final article text")
+    article_text_history: TextHistory = Field(default_factory=TextHistory, description="The history of the article text, starting with the original article text and ending with the final article text")
+    intro_text: str = Field(default="", description="The intro span of the first pass article, empty if it could not be split into sections")
+    body_text: str = Field(default="", description="The body span of the first pass article")
+    conclusion_text: str = Field(default="", description="The conclusion span of the first pass article")
     revised_intro_text: str = Field(default="", description="The revised text of the intro paragraph")
     revised_body_text: str = Field(default="", description="The revised text of the body paragraphs")
     revised_conclusion_text: str = Field(default="", description="The revised text of the conclusion paragraph")
-    article_evaluation: BlogArticleEvaluation = Field(default=BlogArticleEvaluation().model_construct(), description="Notes about how interesting this article is and notes on improving it (if needed)")
+    article_evaluation: BlogArticleEvaluation = Field(default_factory=BlogArticleEvaluation, description="Notes about how interesting this article is and notes on improving it (if needed)")
+
+def merge_article(current: BlogArticle, update: Union[BlogArticle, Dict[str, Any]]) -> BlogArticle:
+    """
+    State reducer for BlogState.article. A full BlogArticle replaces the current one (the normal
+    sequential node behaviour), a dict of field values is merged into a copy of the current article
+    so that parallel branches (e.g. the revise nodes in the Writer graph) can each update their own field.
+    """
+    if isinstance(update, dict):
+        return current.model_copy(update=update)
+    return update
 
 class BlogState(BaseModel):
     article_idea: str = Field(default="", description="The users original instructions for the what to write in the blog post and how to write it")
-    outline: BlogOutline = Field(default=BlogOutline().model_construct(), description="The outline points of the blog post")
+    outline: BlogOutline = Field(default_factory=BlogOutline, description="The outline points of the blog post")
     author_personality: str = Field(default="", description="A description of the author's personality and writing style")
-    article: BlogArticle = Field(default=BlogArticle().model_construct(), description="The article")
+    article: Annotated[BlogArticle, merge_article] = Field(default_factory=BlogArticle, description="The article")
 
 
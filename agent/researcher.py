@@ -6,15 +6,19 @@ from agent.tool.writertool import WriterTool
 from agent.data_class.blog_data import BlogState, ResearchResponse, BlogOutlineSimple, BlogOutline
 from utils.utils import showgraph
 from langgraph.graph import StateGraph, START, END
+from langchain_core.runnables import RunnableConfig
 from rich import print
 from agent.tool.evaluator import Evaluator
 from typing import Literal
 from agent.tool.websitecontent import WebsiteContentTool
-from utils.utils import write_to_file
+from utils.artifacts import get_artifact_store
+from utils.research_store import get_research_store
+from utils.fixtures import fixtures_enabled
+from utils.envvars import OUTLINE_CANDIDATES, RETRIEVAL_ENABLED, RESEARCH_REUSE_ENABLED
 load_dotenv()
 
 class Researcher:
-    def __init__(self):
+    def __init__(self, outline_candidates: int = OUTLINE_CANDIDATES, fetch_sources: bool = RETRIEVAL_ENABLED, reuse_research: bool = RESEARCH_REUSE_ENABLED):
         self.name = "Researcher"
         self.logger = setup_logger("Researcher")
         self.logger.info("Initializing Researcher")
@@ -23,17 +27,28 @@ class Researcher:
         self.writer = WriterTool()
         self.evaluator = Evaluator()
         self.websitecontent = WebsiteContentTool()
+        self.artifacts = get_artifact_store()
+        self.outline_candidates = max(outline_candidates, 1)
+        # fixture runs replay the recorded Perplexity responses instead
+        self.research_store = get_research_store() if reuse_research and not fixtures_enabled() else None
 
         self.builder = StateGraph(BlogState)
         self.builder.add_node("create_thesis", self.create_thesis)
         self.builder.add_node("research_thesis", self.research_thesis)
+        if fetch_sources:
+            self.builder.add_node("get_research_website_content", self.get_research_website_content)
         self.builder.add_node("get_author_personality", self.get_author_personality)
         self.builder.add_node("create_outline", self.create_outline)
         self.builder.add_node("evaluate_outline_quality", self.evaluate_outline_quality)
 
         self.builder.add_edge(START, "create_thesis")
         self.builder.add_edge("create_thesis", "research_thesis")
-        self.builder.add_edge("research_thesis", "get_author_personality")
+        if fetch_sources:
+            # the writer prompts get the parts of the cited pages most relevant to each call
+            self.builder.add_edge("research_thesis", "get_research_website_content")
+            self.builder.add_edge("get_research_website_content", "get_author_personality")
+        else:
+            self.builder.add_edge("research_thesis", "get_author_personality")
         self.builder.add_edge("get_author_personality", "create_outline")
         self.builder.add_edge("create_outline", "evaluate_outline_quality")
         self.builder.add_conditional_edges("evaluate_outline_quality", self.is_it_interesting)
@@ -42,55 +57,65 @@ class Researcher:
         self.logger.info("Successfully initialized LLM and graph")
 
 
-    def create_thesis(self, state: BlogState) -> BlogState:
+    def create_thesis(self, state: BlogState, config: RunnableConfig) -> BlogState:
         """
         Creates the thesis of the blog post
         """
         self.logger.info("Researcher: Creating thesis")
         instructions = state.article_idea
         thesis = self.writer.construct_thesis(instructions)
-        write_to_file(thesis, "thesis", self.logger)
+        self.artifacts.save_from_node(config, "thesis", thesis, state.article_idea)
         state.outline.thesis = thesis
         self.logger.info(f"Researcher: Thesis created")
         return state
 
-    def research_thesis(self, state: BlogState) -> BlogState:
+    def research_thesis(self, state: BlogState, config: RunnableConfig) -> BlogState:
         """
         Researches the thesis of the blog post
         """
         self.logger.info("Researcher: Researching thesis")
         thesis = state.outline.thesis
-        research : ResearchResponse = self.perplexity.query(thesis)
-        write_to_file(research, "research_thesis", self.logger)
+        stored = self.research_store.find(thesis) if self.research_store else None
+        if stored:
+            # the cited pages are still fetched again by get_research_website_content, which revalidates them against the content cache
+            self.logger.info(f"Researcher: Reusing the research of a {stored.similarity:.0%} similar thesis from {stored.age_days:.1f} days ago")
+            self.research_store.record("reused")
+            research = stored.research
+        else:
+            research : ResearchResponse = self.perplexity.query(thesis)
+            if self.research_store:
+                self.research_store.put(thesis, research)
+                self.research_store.record("researched")
+        self.artifacts.save_from_node(config, "research_thesis", research, state.article_idea)
         state.outline.research = research
         self.logger.info("Researcher: Thesis researched")
         return state
     
-    def get_research_website_content(self, state: BlogState) -> BlogState:
+    def get_research_website_content(self, state: BlogState, config: RunnableConfig = None) -> BlogState:
         """
         Gets the content of the research websites
         """
         self.logger.info("Researcher: Getting research website content")
         research_content = self.websitecontent.get_content_from_urls(state.outline.research.sources)
-        write_to_file(research_content, "research_content", self.logger)
+        self.artifacts.save_from_node(config, "research_content", research_content, state.article_idea)
         state.outline.research.sources_content = research_content
         self.logger.info("Researcher: Research website content retrieved")
         return state
     
-    def get_author_personality(self, state: BlogState) -> BlogState:
+    def get_author_personality(self, state: BlogState, config: RunnableConfig) -> BlogState:
         """
         Gets the author's personality
         """
         self.logger.info("Researcher: Getting author's personality")
         personality = self.personality.get_author_personality()
-        write_to_file(personality, "author_personality", self.logger)
+        self.artifacts.save_from_node(config, "author_personality", personality, state.article_idea)
         state.author_personality = personality
         self.logger.info("Researcher: Author's personality retrieved")
         return state
     
-    def create_outline(self, state: BlogState) -> BlogState:
+    def create_outline(self, state: BlogState, config: RunnableConfig) -> BlogState:
         """
-        Creates the outline of the blog post
+        Creates the outline of the blog post, or several candidates for the evaluator to choose from
         """
         self.logger.info("Researcher: Creating outline")
         existing_outline = None
@@ -98,8 +123,17 @@ class Researcher:
         if state.outline.outline_evaluation.good_to_go == False:
             existing_outline = state.outline.outline.model_dump_json()
             outline_evaluation = state.outline.outline_evaluation.evaluation
-        outline : BlogOutlineSimple = self.writer.create_outline(state.outline.thesis, state.outline.research.content, state.author_personality, existing_outline, outline_evaluation)
-        write_to_file(outline, "outline", self.logger)
+        if self.outline_candidates > 1:
+            candidates = self.writer.create_outline_candidates(state.outline.thesis, state.outline.research.content, state.author_personality,
+                                                               existing_outline, outline_evaluation, self.outline_candidates,
+                                                               state.outline.research.sources_content)
+            self.artifacts.save_from_node(config, "outline_candidates", [candidate.model_dump() for candidate in candidates], state.article_idea)
+            state.outline.candidates = candidates
+            self.logger.info(f"Researcher: {len(candidates)} candidate outlines created")
+            return state
+        outline : BlogOutlineSimple = self.writer.create_outline(state.outline.thesis, state.outline.research.content, state.author_personality, existing_outline, outline_evaluation,
+                                                                 sources_content=state.outline.research.sources_content)
+        self.artifacts.save_from_node(config, "outline", outline, state.article_idea)
         state.outline.outline = outline
         self.logger.info("Researcher: Outline created")
         return state
@@ -113,13 +147,22 @@ class Researcher:
         showgraph(self.graph, self.logger, "researcher_graph")
         return state
 
-    def evaluate_outline_quality(self, state: BlogState) -> BlogState:
+    def evaluate_outline_quality(self, state: BlogState, config: RunnableConfig) -> BlogState:
         """
         Checks if the blog post is interesting
         """
         self.logger.info("Researcher: evaluating the quality of the outline")
-        outline : BlogOutline = self.evaluator.evaluate_outline(state.outline)
-        write_to_file(outline, "outline_evaluation", self.logger)
+        if len(state.outline.candidates) > 1:
+            outline : BlogOutline = self.evaluator.rank_outlines(state.outline, state.outline.candidates)
+            self.artifacts.save_from_node(config, "outline", outline.outline, state.article_idea)
+        else:
+            if state.outline.candidates:
+                # the other candidates failed
+                state.outline.outline = state.outline.candidates[0]
+            outline : BlogOutline = self.evaluator.evaluate_outline(state.outline)
+        outline.candidates = []
+        # only the verdict, not the research and evaluator transcript that the rest of the outline state holds
+        self.artifacts.save_from_node(config, "outline_evaluation", outline.outline_evaluation.model_dump(exclude={"messages", "documents"}), state.article_idea)
         state.outline = outline
         self.logger.info("Researcher: Outline evaluated")
         return state
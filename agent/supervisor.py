@@ -1,21 +1,43 @@
+import uuid
 from utils.logger import setup_logger
 from langgraph.graph import StateGraph, START, END
-from flask import send_file
-import io
 from agent.researcher import Researcher
 from agent.writer import Writer
 from agent.data_class.blog_data import BlogState
-from utils.utils import showgraph
+from utils.utils import showgraph, send_graph, message_text
+from utils.github_reader import GithubReader
+from agent.tool.writertool import WriterTool
+from agent.tool.evaluator import Evaluator
+from agent.tool.authorpersonality import PersonalityTool
+from utils.checkpoints import get_checkpointer, delete_run_checkpoints
+from utils.envvars import CHECKPOINT_KEEP_SUCCEEDED
+from utils.metrics import MetricsCallbackHandler, RUNS_IN_PROGRESS, RUNS, LOOP_ITERATIONS
+from typing import Callable, Iterator, Optional
 
 class Supervisor:
     def __init__(self):
         self.name = "Supervisor"
         self.logger = setup_logger("Supervisor")
         self.logger.info("Initializing Supervisor")
+        self.metrics = MetricsCallbackHandler()
+        self.checkpointer = get_checkpointer()
+        self.prefetch_prompts()
         self.researcher = Researcher()
         self.writer = Writer()
         self.graph = self.build_graph()
         
+    def prefetch_prompts(self):
+        """
+        Reads every system prompt the tools need from GitHub in one concurrent batch, so that
+        the tools built by the Researcher and Writer get them from the GithubReader cache
+        """
+        urls = list(WriterTool.system_prompts_github_url.values()) + [
+            Evaluator.system_prompt_outline_url,
+            Evaluator.system_prompt_article_url,
+            PersonalityTool.personality_github_url,
+        ]
+        GithubReader().read_files(urls)
+
     def build_graph(self):
         builder = StateGraph(BlogState)
         builder.add_node('research_subgraph', self.researcher.graph)
@@ -23,26 +45,111 @@ class Supervisor:
         builder.add_edge(START, 'research_subgraph')
         builder.add_edge('research_subgraph', 'write_subgraph')
         builder.add_edge('write_subgraph', END)
-        graph = builder.compile()
+        graph = builder.compile(checkpointer=self.checkpointer)
         showgraph(graph, self.logger, "supervisor_graph")
         return graph
 
-    def create_blogpost(self, instructions: str):
+    def create_blogpost(self, instructions: str, on_node: Optional[Callable[[str], None]] = None, run_id: Optional[str] = None) -> BlogState:
+        """
+        Runs the graph for the instructions and returns the final state. If on_node is given it is
+        called with the name of each node (including the subgraph nodes) as it starts running.
+        Every step is checkpointed under run_id (a new one if not given) so a failed run can be
+        continued with resume_blogpost.
+        """
         self.logger.info("Creating blogpost")
+        return self.run_graph(self.initial_state(instructions), run_id or self.new_run_id(), on_node)
+
+    def resume_blogpost(self, run_id: str, on_node: Optional[Callable[[str], None]] = None) -> BlogState:
+        """
+        Continues a failed run from its last checkpoint: the nodes that completed (including the
+        ones inside the subgraphs) are not run again. A run that already finished returns its final state.
+        """
+        self.logger.info(f"Resuming blogpost run {run_id}")
+        snapshot = self.graph.get_state(self.run_config(run_id))
+        if not snapshot.values:
+            raise ValueError(f"No checkpoint found for run {run_id}")
+        if not snapshot.next:
+            self.logger.info(f"Run {run_id} already finished")
+            return BlogState(**snapshot.values)
+        return self.run_graph(None, run_id, on_node)
+
+    def run_graph(self, input: Optional[BlogState], run_id: str, on_node: Optional[Callable[[str], None]]) -> BlogState:
+        if on_node is None:
+            with RUNS_IN_PROGRESS.track_inprogress():
+                try:
+                    state = BlogState(**self.graph.invoke(input, config=self.run_config(run_id)))
+                except Exception:
+                    RUNS.labels("failed").inc()
+                    self.logger.error(f"Run {run_id} failed, it can be resumed from its last checkpoint")
+                    raise
+            self.record_run(state, run_id)
+            return state
+
+        for event in self.stream_graph(input, run_id, tokens=False):
+            if event["event"] == "node_start":
+                on_node(event["node"])
+            elif event["event"] == "result":
+                return event["state"]
+
+    def stream_blogpost(self, instructions: str, tokens: bool = True, run_id: Optional[str] = None) -> Iterator[dict]:
+        """
+        Runs the graph for the instructions and yields progress events as they happen:
+            - run: {"event", "run_id"} with the id to resume the run with if it fails, always the first event
+            - node_start / node_end: {"event", "node", "namespace"} for every node, including the subgraph nodes
+            - token: {"event", "node", "text"} for each chunk of text generated by an LLM call (if tokens is True)
+            - result: {"event", "state"} with the final BlogState, always the last event
+        """
+        self.logger.info("Streaming blogpost")
+        return self.stream_graph(self.initial_state(instructions), run_id or self.new_run_id(), tokens)
+
+    def stream_graph(self, input: Optional[BlogState], run_id: str, tokens: bool) -> Iterator[dict]:
+        stream_mode = ["debug", "values", "messages"] if tokens else ["debug", "values"]
+        state = None
+        yield {"event": "run", "run_id": run_id}
+        with RUNS_IN_PROGRESS.track_inprogress():
+            try:
+                for namespace, mode, chunk in self.graph.stream(input, config=self.run_config(run_id), stream_mode=stream_mode, subgraphs=True):
+                    if mode == "debug" and chunk["type"] in ("task", "task_result"):
+                        yield {"event": "node_start" if chunk["type"] == "task" else "node_end",
+                               "node": chunk["payload"]["name"],
+                               "namespace": "|".join(ns.split(":")[0] for ns in namespace)}
+                    elif mode == "messages":
+                        message, metadata = chunk
+                        text = message_text(message)
+                        if text:
+                            yield {"event": "token", "node": metadata.get("langgraph_node"), "text": text}
+                    elif mode == "values" and not namespace:
+                        state = chunk
+            except Exception:
+                RUNS.labels("failed").inc()
+                self.logger.error(f"Run {run_id} failed, it can be resumed from its last checkpoint")
+                raise
+        state = BlogState(**state)
+        self.record_run(state, run_id)
+        yield {"event": "result", "state": state}
+
+    def new_run_id(self) -> str:
+        return uuid.uuid4().hex
+
+    def run_config(self, run_id: str) -> dict:
+        # the subgraphs inherit the checkpointer and save their own checkpoints under the same run id
+        return {"callbacks": [self.metrics], "configurable": {"thread_id": run_id}}
+
+    def record_run(self, state: BlogState, run_id: str):
+        if not CHECKPOINT_KEEP_SUCCEEDED:
+            delete_run_checkpoints(self.checkpointer, run_id)
+        RUNS.labels("succeeded").inc()
+        LOOP_ITERATIONS.labels("outline").observe(state.outline.outline_evaluation.iteration_number)
+        LOOP_ITERATIONS.labels("article").observe(state.article.article_evaluation.iteration_number)
+
+    def initial_state(self, instructions: str) -> BlogState:
         input_data = BlogState.model_construct()
-        input_data.article_idea = instructions  
-        state = self.graph.invoke(input_data)
-        return state
+        input_data.article_idea = instructions
+        return input_data
     
-    def showgraph(self):
+    def showgraph(self, format: str = "png"):
         try:
-            img_data = self.graph.get_graph().draw_mermaid_png()
-            img_io = io.BytesIO(img_data)
-            img_io.seek(0)
-            return send_file(
-                img_io,
-                mimetype='image/png'
-            )
+            return send_graph(self.graph, self.logger, format)
         except Exception as e:
             self.logger.error(f"Failed to display graph: {str(e)}")
-            raise
\ No newline at end of file
+            raise
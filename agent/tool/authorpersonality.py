@@ -1,11 +1,12 @@
 from typing import Dict
 from utils.logger import setup_logger
 import os
-from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from utils.github_reader import GithubReader
+from utils.llm_cache import cached_llm
+from utils.rate_limit import rate_limited
 from agent.data_class.blog_data import BlogState
 logger = setup_logger("PersonalityTool")
 
@@ -15,19 +16,22 @@ load_dotenv(dotenv_path)
 
 class PersonalityTool:
     """Tool for analyzing and suggesting author personality traits for blog writing"""
+
+    personality_github_url = 'https://github.com/lojones/lojo-personality/blob/main/blog-post-author.md'
     
     def __init__(self):
         self.logger = logger
         self.github_reader = GithubReader()
-        self.personality = self.github_reader.read_file('https://github.com/lojones/lojo-personality/blob/main/blog-post-author.md')
+        self.personality = self.github_reader.read_file(self.personality_github_url)
         
         if not self.personality:
             self.logger.error("Couldnt get the personality profile from GitHub")
             raise ValueError("Couldnt get the personality profile from GitHub")
         self.logger.info(f"Initialized with personality profile: {self.personality[:50]}...")
-        self.llm_anthropic = ChatAnthropic(model="claude-3-5-sonnet-20240620", 
-                                    temperature=0.7,
-                                    max_tokens=8000)
+        self.llm_anthropic = cached_llm(rate_limited(ChatAnthropic(model="claude-3-5-sonnet-20240620", 
+                                                                 temperature=0.7,
+                                                                 max_tokens=8000,
+                                                                 max_retries=0), "anthropic"), "personalize")
         
     def get_author_personality(self) -> str:
         self.logger.info("PersonalityTool: Getting author's personality")
@@ -89,7 +93,7 @@ class PersonalityTool:
 
             if isinstance(response, AIMessage):
                 self.logger.info("Got personality response from LLM")
-                self.logger.debug(f"Response OK: {response.content}")
+                self.logger.debug("Response OK: %s", response.content)
                 return response.content
             else:
                 self.logger.error(f"Unexpected response type: {type(response)}")
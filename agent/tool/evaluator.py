@@ -1,26 +1,39 @@
+import re
+from typing import List, Tuple
 from langchain_google_genai import ChatGoogleGenerativeAI
 from dotenv import load_dotenv
 from utils.logger import setup_logger
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from agent.data_class.blog_data import BlogOutline, BlogOutlineEvaluation, BlogOutlineSimple, BlogArticle, BlogArticleEvaluation
 from utils.github_reader import GithubReader
+from utils.llm_cache import cached_llm
+from utils.rate_limit import rate_limited
+from utils.utils import shared_system_message
+from utils.text_history import TextHistory
+from utils.eval_history import EvaluationHistory, document_prompt, estimate_tokens
+from utils.metrics import EVAL_HISTORY_TOKENS_SAVED
+from utils.envvars import EVALUATOR_HISTORY_POLICY, EVALUATOR_HISTORY_WINDOW, EVALUATOR_MAX_PROMPT_TOKENS, EVALUATOR_FEEDBACK_CHARS
 load_dotenv()
 
 
 class Evaluator:
+    system_prompt_outline_url = "https://github.com/lojones/blog-agent-data/blob/main/system-prompts/evaluate-outline.md"
+    system_prompt_article_url = "https://github.com/lojones/blog-agent-data/blob/main/system-prompts/evaluate-article.md"
+
     def __init__(self):
         self.name = "Evaluator"
         self.logger = setup_logger("Evaluator")
         self.logger.info("Initializing Evaluator")
-        self.llm_google = ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=0.7)
+        # no retries in the client, the rate limiter retries the failed calls
+        self.llm_google = cached_llm(rate_limited(ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=0.7, max_retries=0), "gemini"), "evaluator")
         self.github_reader = GithubReader()
+        self.history = EvaluationHistory(EVALUATOR_HISTORY_POLICY, EVALUATOR_HISTORY_WINDOW, EVALUATOR_MAX_PROMPT_TOKENS, EVALUATOR_FEEDBACK_CHARS)
         # self.llm_google_structured = self.llm_google.with_structured_output(BlogOutlineEvaluation)
-        self.system_prompt_outline_url = "https://github.com/lojones/blog-agent-data/blob/main/system-prompts/evaluate-outline.md"
-        self.system_prompt_outline_text = self.github_reader.read_file(self.system_prompt_outline_url)
-        self.system_prompt_outline_obj = SystemMessage(content=self.system_prompt_outline_text)
-        self.system_prompt_article_url = "https://github.com/lojones/blog-agent-data/blob/main/system-prompts/evaluate-article.md"
-        self.system_prompt_article_text = self.github_reader.read_file(self.system_prompt_article_url)
-        self.system_prompt_article_obj = SystemMessage(content=self.system_prompt_article_text)
+        system_prompt_texts = self.github_reader.read_files([self.system_prompt_outline_url, self.system_prompt_article_url])
+        self.system_prompt_outline_text = system_prompt_texts[self.system_prompt_outline_url]
+        self.system_prompt_outline_obj = shared_system_message(self.system_prompt_outline_text)
+        self.system_prompt_article_text = system_prompt_texts[self.system_prompt_article_url]
+        self.system_prompt_article_obj = shared_system_message(self.system_prompt_article_text)
 
 
     def test_google_gemini(self):
@@ -30,28 +43,78 @@ class Evaluator:
         response = self.llm_google.invoke(messages)
         print(response)
 
+    def outline_document(self, outline: BlogOutlineSimple) -> str:
+        """
+        The outline as the evaluator sees it, one line per point rather than single-line JSON, so the
+        diff history policy can show only the points that changed between rounds
+        """
+        return "\n\n".join(f"{name.upper()}:\n{value}" for name, value in outline.model_dump().items())
+
     def get_initial_outline_prompt(self, outline: BlogOutlineSimple) -> HumanMessage:
         first : str = "Evaluate the following article outline, and tell me if it is good to go or needs more work.  \
                          The first word of your response should be YES or NO to indicate if the outline is good to go or needs more work. \
                          If it needs more work give me that detailed evaluation feedback.  \
                          DO NOT penalize the outline for not being detailed enough because this is the outline of the article not the full article. \
-                         : " + outline.model_dump_json()
-        return HumanMessage(content=first)
+                         : "
+        return document_prompt(first, self.outline_document(outline))
     
     def get_revision_outline_prompt(self, outline: BlogOutlineSimple) -> HumanMessage:
         revision : str = "This is the revised outline based on your previous feedback. Evaluate it again and tell if if its good to go or not. \
+                            The first word of your response should be YES or NO to indicate if the outline is good to go or needs more work. \
                             If its still not good enough provide more detailed feedback on what to improve. \
                          DO NOT penalize the outline for not being detailed enough because this is the outline of the article not the full article. \
-                         : " + outline.model_dump_json()
-        return HumanMessage(content=revision)
+                         : "
+        return document_prompt(revision, self.outline_document(outline))
 
     def get_initial_article_prompt(self, article_text: str) -> HumanMessage:
         first : str = "Evaluate the following article, and tell me if it is good to go or needs more work.  \
                          The first word of your response should be YES or NO to indicate if the article is good to go or needs more work. \
                          If it needs more work give me that detailed evaluation feedback.  \
-                         : " + article_text
-        return HumanMessage(content=first)
-    
+                         : "
+        return document_prompt(first, article_text)
+
+    def get_revision_article_prompt(self, article_text: str) -> HumanMessage:
+        revision : str = "This is the revised article based on your previous feedback. Evaluate it again and tell if its good to go or not. \
+                            The first word of your response should be YES or NO to indicate if the article is good to go or needs more work. \
+                            If its still not good enough provide more detailed feedback on what to improve. \
+                         : "
+        return document_prompt(revision, article_text)
+
+    def get_ranking_outline_prompt(self, candidates: List[BlogOutlineSimple], revision: bool) -> HumanMessage:
+        ranking : str = f"{'These are revised outlines based on your previous feedback' if revision else 'These are alternative outlines for the same article'}, \
+                          numbered 1 to {len(candidates)}. Pick the best one, then evaluate it and tell me if it is good to go or needs more work. \
+                          The first word of your response should be the number of the best outline and the second word YES or NO to indicate if it is good to go or needs more work. \
+                          If it needs more work give me detailed evaluation feedback on that outline only. \
+                         DO NOT penalize the outline for not being detailed enough because this is the outline of the article not the full article. \
+                         : "
+        document = "\n\n".join(f"OUTLINE {i}:\n{self.outline_document(candidate)}" for i, candidate in enumerate(candidates, 1))
+        return document_prompt(ranking, document)
+
+    def parse_ranking(self, text: str, count: int) -> Tuple[int, str]:
+        """
+        Returns the index of the chosen candidate and the evaluation without the number in front of it,
+        so it reads like the evaluation of a single outline. Falls back to the first candidate.
+        """
+        match = re.match(r"\W*(?:outline\W*)?(\d+)\W*", text, re.IGNORECASE)
+        if match and 1 <= int(match.group(1)) <= count:
+            return int(match.group(1)) - 1, text[match.end():]
+        self.logger.warning("Evaluator: couldn't tell which outline was chosen, using the first one")
+        return 0, text
+
+    def evaluation_request(self, kind: str, transcript: list, documents: TextHistory) -> list:
+        """
+        The messages to send for the evaluation transcript, compacted with the configured history policy
+        """
+        request, estimates = self.history.build(transcript, documents)
+        full = estimates["full"]
+        for policy, tokens in estimates.items():
+            # a policy can cost more than the full history (a diff bigger than the document), counters only go up
+            EVAL_HISTORY_TOKENS_SAVED.labels(policy).inc(max(0, full - tokens))
+        savings = ", ".join(f"{policy} ~{tokens} (saves {full - tokens})" for policy, tokens in estimates.items())
+        self.logger.info(f"Evaluator: {kind} request tokens by history policy: {savings}; "
+                         f"sending ~{estimate_tokens(request)} with {self.history.policy}")
+        return request
+
 
     def evaluate_outline(self, outline: BlogOutline) -> BlogOutline:
         """
@@ -60,12 +123,13 @@ class Evaluator:
         self.logger.info("Evaluator: Evaluating outline")
         eval : BlogOutlineEvaluation = outline.outline_evaluation
         if len(eval.messages) == 0:
-            eval.messages = [self.system_prompt_outline_obj, self.get_initial_outline_prompt(outline.outline)]
+            eval.messages = [self.system_prompt_outline_obj]
+            self.history.record(eval.messages, eval.documents, self.get_initial_outline_prompt(outline.outline))
         else:
-            eval.messages.append(self.get_revision_outline_prompt(outline.outline))
+            self.history.record(eval.messages, eval.documents, self.get_revision_outline_prompt(outline.outline))
 
         try:
-            response = self.llm_google.invoke(eval.messages)
+            response = self.llm_google.invoke(self.evaluation_request("outline", eval.messages, eval.documents))
             eval.messages.append(AIMessage(content=response.content))
             # Check if response starts with 'yes' (case insensitive)
             is_good_to_go = response.content.lower().startswith('yes')
@@ -73,7 +137,7 @@ class Evaluator:
             outline.outline_evaluation.evaluation = response.content
             outline.outline_evaluation.good_to_go = is_good_to_go
 
-            self.logger.debug(f"Evaluator: Outline evaluation: {outline.outline_evaluation.model_dump_json()}")
+            self.logger.debug("Evaluator: Outline evaluation: %s", outline.outline_evaluation)
             
             return outline
         except Exception as e:
@@ -81,6 +145,36 @@ class Evaluator:
             raise
 
 
+    def rank_outlines(self, outline: BlogOutline, candidates: List[BlogOutlineSimple]) -> BlogOutline:
+        """
+        Picks the best of several candidate outlines and evaluates it in a single call. The chosen one
+        becomes outline.outline and only it is kept in the evaluation transcript, as if it had been
+        evaluated on its own, so the next rounds work the same as with a single outline.
+        """
+        self.logger.info(f"Evaluator: Ranking {len(candidates)} candidate outlines")
+        eval : BlogOutlineEvaluation = outline.outline_evaluation
+        revision = len(eval.messages) > 0
+        if not revision:
+            eval.messages = [self.system_prompt_outline_obj]
+        ranking_prompt = self.get_ranking_outline_prompt(candidates, revision)
+
+        try:
+            response = self.llm_google.invoke(self.evaluation_request("outline ranking", eval.messages + [ranking_prompt], eval.documents))
+            chosen, evaluation = self.parse_ranking(response.content, len(candidates))
+            self.logger.info(f"Evaluator: Chose outline {chosen + 1} of {len(candidates)}")
+            best = candidates[chosen]
+            prompt = self.get_revision_outline_prompt(best) if revision else self.get_initial_outline_prompt(best)
+            self.history.record(eval.messages, eval.documents, prompt)
+            eval.messages.append(AIMessage(content=evaluation))
+            outline.outline = best
+            outline.outline_evaluation.iteration_number += 1
+            outline.outline_evaluation.evaluation = evaluation
+            outline.outline_evaluation.good_to_go = evaluation.lower().startswith('yes')
+            return outline
+        except Exception as e:
+            self.logger.error(f"Evaluator: Error ranking outlines: {str(e)}")
+            raise
+
     def evaluate_article(self, article: BlogArticle) -> BlogArticle:
         """
         Evaluates the article
@@ -89,12 +183,13 @@ class Evaluator:
         article_text = article.article_text
         eval : BlogArticleEvaluation = article.article_evaluation
         if len(eval.messages) == 0:
-            eval.messages = [self.system_prompt_article_obj, self.get_initial_article_prompt(article_text)]
+            eval.messages = [self.system_prompt_article_obj]
+            self.history.record(eval.messages, eval.documents, self.get_initial_article_prompt(article_text))
         else:
-            eval.messages.append(self.get_revision_outline_prompt(article_text))
+            self.history.record(eval.messages, eval.documents, self.get_revision_article_prompt(article_text))
 
         try:
-            response = self.llm_google.invoke(eval.messages)
+            response = self.llm_google.invoke(self.evaluation_request("article", eval.messages, eval.documents))
             eval.messages.append(AIMessage(content=response.content))
             is_good_to_go = response.content.lower().startswith('yes')
             article.article_evaluation.iteration_number += 1
@@ -5,6 +5,8 @@ from langchain_community.chat_models import ChatPerplexity
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from utils.envvars import PPLX_API_KEY
 from agent.data_class.blog_data import ResearchResponse
+from utils.llm_cache import cached_llm
+from utils.rate_limit import rate_limited
 
 logger = setup_logger("PerplexityTool")
 
@@ -14,7 +16,7 @@ class PerplexityTool:
     def __init__(self):
         self.logger = logger
         self.logger.info("Initializing PerplexityTool")
-        self.pplx_chat = ChatPerplexity(api_key=PPLX_API_KEY)
+        self.pplx_chat = cached_llm(rate_limited(ChatPerplexity(api_key=PPLX_API_KEY), "perplexity"), "perplexity_query")
     
     def query(self, thesis: str) -> ResearchResponse:
         try:
@@ -32,7 +34,7 @@ class PerplexityTool:
                 citations = response.additional_kwargs['citations']
                 pplx_response.content = research_content
                 pplx_response.sources = citations
-                self.logger.debug(f"Perplexity response: {pplx_response}")
+                self.logger.debug("Perplexity response: %s", pplx_response)
                 return pplx_response
             else:
                 self.logger.error("Received unexpected response type from Perplexity API")
@@ -1,59 +1,217 @@
 import logging
-from typing import Dict, List
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+from pydantic import BaseModel, Field
 from utils.logger import setup_logger
+from utils.content_cache import CachedPage, ContentCache
+from utils.fixtures import fixtures_enabled, install_http_fixtures
+from utils.envvars import CONTENT_CACHE_ENABLED, CONTENT_CACHE_PATH, CONTENT_CACHE_TTL_SECONDS, CONTENT_CACHE_MAX_MB, EXTRACT_WORKERS, EXTRACT_MAX_CHARS
+from utils.html_extract import MARKDOWN_VERSION, extract_markdown, get_extraction_pool
 import requests
-from bs4 import BeautifulSoup
-import html2text
+from requests.adapters import HTTPAdapter
 
 logger = setup_logger("WebsiteContentTool")
 
+
+class FetchedPage(BaseModel):
+    status_code: int = Field(description="The HTTP status of the response")
+    etag: Optional[str] = Field(default=None, description="The ETag header of the response")
+    last_modified: Optional[str] = Field(default=None, description="The Last-Modified header of the response")
+    text: str = Field(default="", description="The body decoded with the response's encoding, cut off at max_response_bytes")
+    truncated: bool = Field(default=False, description="Whether the body was cut off")
+
+
 class WebsiteContentTool:
     """Tool for fetching and converting website content to markdown"""
-    
-    def __init__(self):
+
+    def __init__(self,
+                 max_workers: int = 8,
+                 max_per_host: int = 2,
+                 connect_timeout: float = 5,
+                 read_timeout: float = 15,
+                 deadline: float = 60,
+                 max_response_bytes: int = 5 * 1024 * 1024,
+                 max_markdown_chars: int = EXTRACT_MAX_CHARS,
+                 extract_workers: int = EXTRACT_WORKERS,
+                 cache: Optional[ContentCache] = None):
+        """
+        Args:
+            max_workers (int): Number of pages fetched at the same time
+            max_per_host (int): Number of pages fetched at the same time from any one host
+            connect_timeout (float): Seconds to wait for a connection to a website
+            read_timeout (float): Seconds to wait between bytes received from a website
+            deadline (float): Seconds get_content_from_urls may take in total, pages not fetched by then are skipped
+            max_response_bytes (int): Downloads are cut off after this many bytes
+            max_markdown_chars (int): The markdown of a page is cut off after this many characters (0 = no cap)
+            extract_workers (int): Processes the pages are converted in, 0 converts them in the fetching thread
+            cache (Optional[ContentCache]): Cache of fetched pages, defaults to the one configured in the environment
+        """
         self.logger = logger
-        self.html2text = html2text.HTML2Text()
-        self.html2text.ignore_links = False
-        self.html2text.ignore_images = False
-        
-    def get_content(self, url: str) -> str:
+        if cache is None and CONTENT_CACHE_ENABLED and not fixtures_enabled():
+            cache = ContentCache(CONTENT_CACHE_PATH, ttl=CONTENT_CACHE_TTL_SECONDS, max_bytes=CONTENT_CACHE_MAX_MB * 1024 * 1024)
+        self.cache = cache
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline
+        self.max_response_bytes = max_response_bytes
+        self.max_markdown_chars = max_markdown_chars
+        # the cached markdown depends on the conversion and its size cap, pages cached with others are converted again
+        self.markdown_version = f"{MARKDOWN_VERSION}/{max_markdown_chars}"
+        self.extract_pool = get_extraction_pool(extract_workers) if extract_workers > 0 else None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_per_host)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        install_http_fixtures(self.session)
+        self.host_semaphores: Dict[str, threading.Semaphore] = defaultdict(lambda: threading.Semaphore(self.max_per_host))
+        self.host_semaphores_lock = threading.Lock()
+
+    def get_host_semaphore(self, url: str) -> threading.Semaphore:
+        with self.host_semaphores_lock:
+            return self.host_semaphores[urlparse(url).netloc]
+
+    def fetch(self, url: str, deadline: Optional[float] = None, headers: Optional[Dict[str, str]] = None) -> FetchedPage:
+        """
+        Downloads a page with a streamed request, honouring the timeouts, the size cap and the
+        time.monotonic() deadline (also while waiting for a free slot for the page's host)
+        """
+        semaphore = self.get_host_semaphore(url)
+        if not semaphore.acquire(timeout=max(deadline - time.monotonic(), 0) if deadline is not None else None):
+            raise TimeoutError("Deadline reached while waiting for other downloads from the same host")
+        try:
+            read_timeout = self.read_timeout
+            if deadline is not None:
+                read_timeout = min(read_timeout, max(deadline - time.monotonic(), 0.1))
+            response = self.session.get(url, headers=headers, timeout=(self.connect_timeout, read_timeout), stream=True)
+            try:
+                chunks = []
+                size = 0
+                truncated = False
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size > self.max_response_bytes:
+                        self.logger.warning(f"Response from {url} is larger than {self.max_response_bytes} bytes, truncating")
+                        truncated = True
+                        break
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise TimeoutError("Deadline reached while downloading")
+            finally:
+                response.close()
+        finally:
+            semaphore.release()
+        return FetchedPage(status_code=response.status_code,
+                           etag=response.headers.get("ETag"),
+                           last_modified=response.headers.get("Last-Modified"),
+                           text=self.decode(b"".join(chunks)[:self.max_response_bytes], response.encoding),
+                           truncated=truncated)
+
+    def decode(self, content: bytes, encoding: Optional[str]) -> str:
+        try:
+            return content.decode(encoding or "utf-8", errors="replace")
+        except LookupError:
+            # an encoding Python doesn't know
+            return content.decode("utf-8", errors="replace")
+
+    def to_markdown(self, html: str, deadline: Optional[float] = None) -> str:
+        """
+        The main content of the page as markdown (see utils/html_extract.py), converted in the
+        extraction pool so the CPU work of a big page doesn't hold up the other threads
+        """
+        if self.extract_pool is None:
+            return extract_markdown(html, self.max_markdown_chars)
+        future = self.extract_pool.submit(extract_markdown, html, self.max_markdown_chars)
+        return future.result(timeout=max(deadline - time.monotonic(), 0.1) if deadline is not None else None)
+
+    def cached_markdown(self, cached: CachedPage, deadline: Optional[float] = None) -> str:
+        """The markdown of a cached page, converted again from its html if another conversion made it"""
+        if cached.markdown_version == self.markdown_version:
+            return cached.markdown
+        self.logger.info(f"Converting the cached html of {cached.url} again, its markdown is from conversion {cached.markdown_version}")
+        markdown = self.to_markdown(cached.html, deadline)
+        self.cache.update_markdown(cached.url, markdown, self.markdown_version)
+        return markdown
+
+    def wrap_content(self, url: str, markdown: str) -> str:
+        return f"--- START OF CONTENT FROM {url} ---\n\n" + markdown + f"\n\n--- END OF CONTENT FROM {url} ---\n\n"
+
+    def get_content(self, url: str, deadline: Optional[float] = None) -> str:
         """
         Fetches website content and converts it to markdown.
-        
+
         Args:
             url (str): The website URL to fetch
-            
+            deadline (Optional[float]): time.monotonic() value after which the fetch is abandoned
+
         Returns:
             str: Website content converted to markdown format, or empty content notice if fetch fails
-            
+
         """
         try:
+            cached = self.cache.get(url) if self.cache else None
+            if cached and self.cache.is_fresh(cached):
+                self.logger.info(f"Using cached content for: {url}")
+                self.cache.record("hit")
+                return self.wrap_content(url, self.cached_markdown(cached, deadline))
+
             self.logger.info(f"Fetching content from: {url}")
-            response = requests.get(url)
-            
+            headers = self.cache.revalidation_headers(cached) if cached else None
+            response = self.fetch(url, deadline, headers)
+
+            if response.status_code == 304 and cached:
+                self.logger.info(f"Cached content for {url} is still valid")
+                self.cache.touch(url)
+                self.cache.record("revalidated")
+                return self.wrap_content(url, self.cached_markdown(cached, deadline))
+
             if response.status_code != 200:
                 self.logger.warning(f"Failed to fetch content from {url} (Status: {response.status_code})")
                 return f"--- CONTENT FROM {url} NOT AVAILABLE (Status: {response.status_code}) ---\n\n"
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            markdown = self.html2text.handle(str(soup))
-            markdown = f"--- START OF CONTENT FROM {url} ---\n\n" + markdown + "\n\n--- END OF CONTENT FROM {url} ---\n\n"
-            
+
+            html = response.text
+            markdown = self.to_markdown(html, deadline)
+            if self.cache:
+                # a truncated page is kept without its validators, or a 304 would keep serving it cut off for good
+                if response.truncated:
+                    self.cache.put(url, html, markdown, markdown_version=self.markdown_version)
+                else:
+                    self.cache.put(url, html, markdown, response.etag, response.last_modified, self.markdown_version)
+                self.cache.record("miss")
+
             self.logger.info(f"Successfully got content from {url}")
-            return markdown
-            
+            return self.wrap_content(url, markdown)
+
         except Exception as e:
             self.logger.error(f"Failed to fetch/convert content: {str(e)}")
             return f"--- CONTENT FROM {url} NOT AVAILABLE (Error: {str(e)}) ---\n\n"
 
     def get_content_from_urls(self, urls: List[str]) -> str:
         """
-        Fetches content from multiple websites and concatenates them into a single string
+        Fetches content from multiple websites concurrently and concatenates them into a single string,
+        in the same order as the urls. Pages that are not fetched before the deadline are marked not available.
         """
-        content = ""
         self.logger.info(f"WebsiteContentTool: Fetching content from {len(urls)} websites")
-        for url in urls:
-            self.logger.info(f"WebsiteContentTool: Fetching content from: {url}")
-            content += self.get_content(url)
+        deadline = time.monotonic() + self.deadline
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="webcontent")
+        try:
+            futures = [executor.submit(self.get_content, url, deadline) for url in urls]
+            contents = []
+            for url, future in zip(urls, futures):
+                try:
+                    contents.append(future.result(timeout=max(deadline - time.monotonic(), 0)))
+                except FutureTimeoutError:
+                    self.logger.warning(f"WebsiteContentTool: Deadline reached before content from {url} was fetched")
+                    future.cancel()
+                    contents.append(f"--- CONTENT FROM {url} NOT AVAILABLE (Error: deadline reached) ---\n\n")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
         self.logger.info(f"WebsiteContentTool: Content from {len(urls)} websites fetched")
-        return content
+        if self.cache:
+            self.logger.info(f"WebsiteContentTool: Content cache stats: {self.cache.stats()}")
+        return "".join(contents)
@@ -1,12 +1,18 @@
 import logging
+from typing import List, Optional
 from utils.logger import setup_logger
-from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.runnables.config import ContextThreadPoolExecutor
 from utils.github_reader import GithubReader
+from utils.llm_cache import cached_llm
+from utils.rate_limit import rate_limited
 from enum import Enum
-from agent.data_class.blog_data import BlogState, BlogOutlineSimple
-from utils.envvars import LLM_CLAUDE_SONNET
+from agent.data_class.blog_data import BlogState, BlogArticle, BlogOutlineSimple
+from utils.envvars import (LLM_CLAUDE_SONNET, WRITER_REVISION_SCOPE, WRITER_REVISION_MODE, WRITER_REVISION_CONTEXT_CHARS, OUTLINE_CANDIDATE_TEMPERATURES,
+                           RETRIEVAL_TOP_K, RETRIEVAL_TOKEN_BUDGET, RETRIEVAL_CHUNK_CHARS)
+from utils.retrieval import research_index, format_excerpts
+from utils.article_sections import context_before, context_after
 from pydantic import BaseModel, Field
 
 logger = setup_logger("BloggerTool")
@@ -32,25 +38,96 @@ class WriterTool:
 
     }
 
-    def __init__(self):
+    REVISION_SCOPES = ("section", "article")
+
+    def __init__(self, revision_scope: str = WRITER_REVISION_SCOPE, revision_context_chars: int = WRITER_REVISION_CONTEXT_CHARS,
+                 retrieval_top_k: int = RETRIEVAL_TOP_K, retrieval_token_budget: int = RETRIEVAL_TOKEN_BUDGET,
+                 cache_article: bool = WRITER_REVISION_MODE == "sequential"):
         self.logger = logger
+        if revision_scope not in self.REVISION_SCOPES:
+            raise ValueError(f"Invalid revision scope '{revision_scope}', expected one of {self.REVISION_SCOPES}")
+        self.revision_scope = revision_scope
+        self.revision_context_chars = revision_context_chars
+        self.retrieval_top_k = retrieval_top_k
+        self.retrieval_token_budget = retrieval_token_budget
+        # the current article is only worth a cache marker when the revise calls run one after the other: run in
+        # parallel, all three would write the same cache entry at once and none would read it
+        self.cache_article = cache_article
         # self.llm = ChatOpenAI(model="gpt-4o", temperature=0.7)
-        self.llm_anthropic = ChatAnthropic(model=LLM_CLAUDE_SONNET, 
-                                           temperature=0.7,
-                                           max_tokens=8000)
-        self.llm_anthropic_structured_outline = self.llm_anthropic.with_structured_output(BlogOutlineSimple, include_raw=True)
+        # the rate limiter retries rate limited and failed calls (connection, timeout, server errors), coordinated across all the runs
+        self.llm_anthropic = rate_limited(ChatAnthropic(model=LLM_CLAUDE_SONNET, 
+                                                        temperature=0.7,
+                                                        max_tokens=8000,
+                                                        max_retries=0), "anthropic")
+        self.llm_anthropic_thesis = cached_llm(self.llm_anthropic, "construct_thesis")
+        self.llm_anthropic_structured_outline = cached_llm(self.llm_anthropic, "create_outline").with_structured_output(BlogOutlineSimple, include_raw=True)
+        # the other candidate outlines of a round, each one at its own temperature
+        self.llm_anthropic_structured_outline_candidates = [
+            cached_llm(self.llm_anthropic.model_copy(update={"temperature": temperature}), "create_outline").with_structured_output(BlogOutlineSimple, include_raw=True)
+            for temperature in OUTLINE_CANDIDATE_TEMPERATURES
+        ]
+        self.llm_anthropic_blog_post = cached_llm(self.llm_anthropic, "create_blog_post")
+        self.llm_anthropic_revise = cached_llm(self.llm_anthropic, "revise")
         self.github_reader = GithubReader()
         self.logger.info("Initializing BloggerTool - getting system prompts from GitHub")
 
+        system_prompt_texts = self.github_reader.read_files(list(self.system_prompts_github_url.values()))
         self.system_prompts = {
-            self.ArticlePart.INTRO: self.github_reader.read_file(self.system_prompts_github_url[self.ArticlePart.INTRO]),
-            self.ArticlePart.BODY: self.github_reader.read_file(self.system_prompts_github_url[self.ArticlePart.BODY]),
-            self.ArticlePart.CONCLUSION: self.github_reader.read_file(self.system_prompts_github_url[self.ArticlePart.CONCLUSION]),
-            self.ArticlePart.FULL_ARTICLE: self.github_reader.read_file(self.system_prompts_github_url[self.ArticlePart.FULL_ARTICLE]),
-            self.ArticlePart.THESIS: self.github_reader.read_file(self.system_prompts_github_url[self.ArticlePart.THESIS]),
-            self.ArticlePart.OUTLINE_PREWRITING: self.github_reader.read_file(self.system_prompts_github_url[self.ArticlePart.OUTLINE_PREWRITING])
+            article_part: system_prompt_texts[url] for article_part, url in self.system_prompts_github_url.items()
         }
 
+    def shared_context(self, research_content: str, author_personality: str) -> str:
+        """
+        The research and author personality, identical in the outline, blog post and revise prompts of a run
+        """
+        return f"""
+        WRITE IN THE STYLE AND VOICE OF THE AUTHOR DESCRIBED HERE:
+        {author_personality}
+
+        THE FOLLOWING IS THE BACKGROUND RESEARCH FROM PERPLEXITY AI:
+        {research_content}
+        """
+
+    def cached_system_message(self, system_prompt: str, *stable_blocks: str, uncached: str = "") -> SystemMessage:
+        """
+        System message with the large blocks that repeat across calls first, each marked for Anthropic
+        prompt caching, and the system prompt of the call after them. Claude caches the prefix up to each
+        marker, tools included, so a later call with the same tools and blocks reads them from the cache:
+        create_outline (structured output sends a tool) only shares it with its own other rounds and
+        candidates, create_blog_post and the revise calls share it with each other. `uncached` goes
+        between the marked blocks and the system prompt, without a marker.
+        """
+        content = [
+            {"type": "text", "text": block, "cache_control": {"type": "ephemeral"}}
+            for block in stable_blocks if block
+        ]
+        if uncached:
+            content.append({"type": "text", "text": uncached})
+        content.append({"type": "text", "text": system_prompt})
+        return SystemMessage(content=content)
+
+    def source_excerpts(self, sources_content: str, query: str) -> str:
+        """
+        The chunks of the cited pages that best match the query, as a prompt section. Empty when the
+        pages weren't fetched. It goes in the human message, after the cached system prompt blocks.
+        """
+        if not sources_content or not self.retrieval_top_k or not self.retrieval_token_budget:
+            return ""
+        chunks = research_index(sources_content, RETRIEVAL_CHUNK_CHARS).search(query, self.retrieval_top_k, self.retrieval_token_budget)
+        if not chunks:
+            return ""
+        self.logger.info(f"Adding {len(chunks)} source excerpts ({sum(len(chunk.text) for chunk in chunks)} characters) to the prompt")
+        return f"""
+        EXCERPTS FROM THE PAGES THE RESEARCH CITES, THE PARTS MOST RELEVANT HERE (each one starts with its url in brackets, cite it when you use it):
+        {format_excerpts(chunks)}
+        """
+
+    def log_usage(self, response: AIMessage):
+        usage = response.usage_metadata or {}
+        cache = usage.get("input_token_details", {})
+        self.logger.info(f"Usage metadata: {usage}")
+        self.logger.info(f"Prompt cache: {cache.get('cache_read') or 0} tokens read, {cache.get('cache_creation') or 0} tokens written")
+
     def construct_thesis(self, instructions: str) -> str:
         """
         Constructs the thesis of the blog post
@@ -68,12 +145,12 @@ class WriterTool:
                 HumanMessage(content=prompt)
             ]
             
-            response = self.llm_anthropic.invoke(messages)
+            response = self.llm_anthropic_thesis.invoke(messages)
             
             if isinstance(response, AIMessage):
-                self.logger.info(f"Usage metadata: {response.usage_metadata}")
+                self.log_usage(response)
                 self.logger.info("Successfully constructed thesis")
-                self.logger.debug(f"Blog post: {response.content}")
+                self.logger.debug("Blog post: %s", response.content)
                 return response.content
             else:
                 raise ValueError(f"Unexpected response type: {type(response)}")
@@ -82,21 +159,20 @@ class WriterTool:
             self.logger.error(f"Failed to create blog post: {str(e)}")
             raise
 
-    def create_outline(self, thesis: str, research_content: str, author_personality: str, existing_outline: str, outline_evaluation: str) -> str:
+    def create_outline(self, thesis: str, research_content: str, author_personality: str, existing_outline: str, outline_evaluation: str,
+                       candidate: int = 0, candidates: int = 1, sources_content: str = "") -> str:
         """
-        Creates an outline for the blog post
+        Creates an outline for the blog post. When several candidates are created for a round, the
+        first one is made exactly like a single outline and the others with their own temperature and
+        a nudge towards a different angle, so they don't all come out the same.
         """
-        self.logger.info("Creating outline")
+        self.logger.info("Creating outline" + (f" candidate {candidate + 1} of {candidates}" if candidates > 1 else ""))
         system_prompt = self.system_prompts[self.ArticlePart.OUTLINE_PREWRITING]
         prompt = f"""
         Write an outline for the following thesis:
         {thesis}
 
-        The following is the research from Perplexity AI:
-        {research_content}
-
-        Write it in the voice of the author described here:
-        {author_personality}
+        Use the research from Perplexity AI and write it in the voice of the author, both given in the system prompt.
 
         """
         if existing_outline and outline_evaluation:
@@ -110,16 +186,24 @@ class WriterTool:
             """
         else:
             self.logger.info("Creating new outline")
+        prompt += self.source_excerpts(sources_content, f"{thesis}\n{outline_evaluation or ''}")
+        llm = self.llm_anthropic_structured_outline
+        if candidate > 0:
+            prompt += f"""
+            This is alternative outline {candidate + 1} of {candidates}: take a different angle on the thesis than the most obvious one.
+            """
+            if self.llm_anthropic_structured_outline_candidates:
+                llm = self.llm_anthropic_structured_outline_candidates[(candidate - 1) % len(self.llm_anthropic_structured_outline_candidates)]
         try:
             messages = [
-                SystemMessage(content=system_prompt),
+                self.cached_system_message(system_prompt, self.shared_context(research_content, author_personality)),
                 HumanMessage(content=prompt)
             ]
-            response = self.llm_anthropic_structured_outline.invoke(messages)
+            response = llm.invoke(messages)
             if isinstance(response['parsed'], BlogOutlineSimple):
                 self.logger.info("Successfully created outline")
-                self.logger.info(f"Usage metadata: {response['raw'].usage_metadata}")
-                self.logger.debug(f"Outline: {response['parsed']}")
+                self.log_usage(response['raw'])
+                self.logger.debug("Outline: %s", response['parsed'])
                 return response['parsed']
             else:
                 raise ValueError(f"Unexpected response type: {type(response['parsed'])}")
@@ -128,6 +212,29 @@ class WriterTool:
             raise
         
 
+    def create_outline_candidates(self, thesis: str, research_content: str, author_personality: str, existing_outline: Optional[str],
+                                  outline_evaluation: Optional[str], count: int, sources_content: str = "") -> List[BlogOutlineSimple]:
+        """
+        Creates `count` candidate outlines at once. Only fails if every candidate failed, the ones
+        that succeeded are returned in candidate order.
+        """
+        self.logger.info(f"Creating {count} candidate outlines")
+        # copies the context of the calling node into the threads, so the run callbacks see every candidate's LLM call
+        with ContextThreadPoolExecutor(max_workers=count, thread_name_prefix="outline") as executor:
+            futures = [executor.submit(self.create_outline, thesis, research_content, author_personality, existing_outline, outline_evaluation, i, count, sources_content)
+                       for i in range(count)]
+        outlines, errors = [], []
+        for future in futures:
+            try:
+                outlines.append(future.result())
+            except Exception as e:
+                errors.append(e)
+        if not outlines:
+            raise errors[0]
+        if errors:
+            self.logger.warning(f"{len(errors)} of {count} candidate outlines failed, choosing from the other {len(outlines)}")
+        return outlines
+
     def create_blog_post(self, state: BlogState) -> str:
 
         try:
@@ -152,11 +259,7 @@ class WriterTool:
             CONCLUSION:
             {state.outline.outline.conclusion}
 
-            WRITE IN THIS STYLE AND VOICE:
-            {state.author_personality}
-
-            INCORPORATE THIS BACKGROUND RESEARCH:
-            {state.outline.research.content}
+            Write in the style and voice of the author, and incorporate the background research, both given in the system prompt.
 
             IMPORTANT GUIDELINES:
             1. Follow the outline structure exactly
@@ -166,18 +269,21 @@ class WriterTool:
             5. Keep the tone consistent with the blog's objective
             6. Make it engaging and readable
             """
+            outline = state.outline.outline
+            prompt += self.source_excerpts(state.outline.research.sources_content,
+                                           f"{outline.title}\n{outline.intro}\n{outline.body}\n{outline.conclusion}")
             
             messages = [
-                SystemMessage(content=system_prompt),
+                self.cached_system_message(system_prompt, self.shared_context(state.outline.research.content, state.author_personality)),
                 HumanMessage(content=prompt)
             ]
             
-            response = self.llm_anthropic.invoke(messages)
+            response = self.llm_anthropic_blog_post.invoke(messages)
             
             if isinstance(response, AIMessage):
                 self.logger.info("Successfully generated blog post")
-                self.logger.info(f"Usage metadata: {response.usage_metadata}")
-                self.logger.debug(f"Blog post: {response.content}")
+                self.log_usage(response)
+                self.logger.debug("Blog post: %s", response.content)
                 return response.content
             else:
                 raise ValueError(f"Unexpected response type: {type(response)}")
@@ -208,29 +314,40 @@ class WriterTool:
                 self.logger.error("Failed to fetch revision prompt from GitHub")
                 raise ValueError("Could not fetch revision prompt")
             
-            prompt = f"""
-            Evaluate and/or revise the {article_part} of the following article:
-
-            CURRENT ARTICLE START:
-            {state.article.article_text}
-            CURRENT ARTICLE END
-
-            INCORPORATE THIS RESEARCH SUMMARY:
-            {state.outline.research.content}
-            
-            """
-            
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=prompt)
-            ]
+            shared_context = self.shared_context(state.outline.research.content, state.author_personality)
+            excerpts = self.source_excerpts(state.outline.research.sources_content, self.revision_query(article_part, state))
+            if self.revision_scope == "section" and state.article.intro_text:
+                messages = [
+                    self.cached_system_message(system_prompt, shared_context),
+                    HumanMessage(content=self.section_revision_prompt(article_part, state.article) + excerpts)
+                ]
+            else:
+                current_article = f"""
+                CURRENT ARTICLE START:
+                {state.article.article_text}
+                CURRENT ARTICLE END
+                """
+
+                prompt = f"""
+                Evaluate and/or revise the {article_part} of the current article given in the system prompt.
+                Incorporate the research summary given in the system prompt.
+                """
+
+                if self.cache_article:
+                    system_message = self.cached_system_message(system_prompt, shared_context, current_article)
+                else:
+                    system_message = self.cached_system_message(system_prompt, shared_context, uncached=current_article)
+                messages = [
+                    system_message,
+                    HumanMessage(content=prompt + excerpts)
+                ]
             
-            response = self.llm_anthropic.invoke(messages)
+            response = self.llm_anthropic_revise.invoke(messages)
             
             if isinstance(response, AIMessage):
                 self.logger.info("Successfully revised introduction")
-                self.logger.info(f"Usage metadata: {response.usage_metadata}")
-                self.logger.debug(f"Revised article: {response.content}")
+                self.log_usage(response)
+                self.logger.debug("Revised article: %s", response.content)
 
                 return response.content
             else:
@@ -240,5 +357,47 @@ class WriterTool:
             self.logger.error(f"Failed to revise introduction: {str(e)}")
             raise
 
+    def revision_query(self, article_part: ArticlePart, state: BlogState) -> str:
+        """What the source excerpts for a revision are matched against: the section's text, or its outline notes if the article wasn't split"""
+        parts = [self.ArticlePart.INTRO, self.ArticlePart.BODY, self.ArticlePart.CONCLUSION]
+        spans = [state.article.intro_text, state.article.body_text, state.article.conclusion_text]
+        notes = [state.outline.outline.intro, state.outline.outline.body, state.outline.outline.conclusion]
+        if article_part not in parts:
+            return state.article.article_text
+        index = parts.index(article_part)
+        return spans[index] or notes[index]
+
+    def section_revision_prompt(self, article_part: ArticlePart, article: BlogArticle) -> str:
+        """
+        Prompt with only the span of the article being revised and a short excerpt of the text on either side of it
+        """
+        spans = [article.intro_text, article.body_text, article.conclusion_text]
+        index = [self.ArticlePart.INTRO, self.ArticlePart.BODY, self.ArticlePart.CONCLUSION].index(article_part)
+        before = context_before("".join(spans[:index]), self.revision_context_chars)
+        after = context_after("".join(spans[index + 1:]), self.revision_context_chars)
+        part = article_part.value
+        self.logger.info(f"Revising the {part} only, sending {len(spans[index]) + len(before) + len(after)} of {len(article.article_text)} article characters")
+
+        prompt = f"""
+        Evaluate and/or revise the {part} of an article. Only the {part} is given below, with a short
+        excerpt of the text around it for context. Return only the revised {part}, without the excerpts
+        around it, so it can be put back into the article in place of the original.
+        Incorporate the research summary given in the system prompt.
+        """
+        if before:
+            prompt += f"""
+        TEXT BEFORE THE {part} (context only, do not revise or repeat it):
+        {before}
+        """
+        prompt += f"""
+        {part} START:
+        {spans[index]}
+        {part} END
+        """
+        if after:
+            prompt += f"""
+        TEXT AFTER THE {part} (context only, do not revise or repeat it):
+        {after}
+        """
+        return prompt
 
-            
\ No newline at end of file
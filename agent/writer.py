@@ -1,21 +1,30 @@
 from langgraph.graph import StateGraph, START, END
+from langchain_core.runnables import RunnableConfig
 from agent.data_class.blog_data import BlogState
 from agent.tool.writertool import WriterTool
 from agent.tool.evaluator import Evaluator
 from dotenv import load_dotenv
 from utils.logger import setup_logger
-from utils.utils import write_to_file
-from typing import Literal
+from utils.artifacts import get_artifact_store
+from utils.article_sections import split_article, stitch_article
+from utils.envvars import WRITER_REVISION_MODE
+from typing import Literal, Union
 load_dotenv()
 
 
 
 class Writer:
-    def __init__(self):
+    REVISION_MODES = ("sequential", "parallel")
+
+    def __init__(self, revision_mode: str = WRITER_REVISION_MODE):
         self.logger = setup_logger("Writer")
-        self.logger.info("Initializing Writer")
-        self.writer_tool = WriterTool()
+        self.logger.info(f"Initializing Writer (revision mode: {revision_mode})")
+        if revision_mode not in self.REVISION_MODES:
+            raise ValueError(f"Invalid revision mode '{revision_mode}', expected one of {self.REVISION_MODES}")
+        self.revision_mode = revision_mode
+        self.writer_tool = WriterTool(cache_article=revision_mode == "sequential")
         self.evaluator = Evaluator()
+        self.artifacts = get_artifact_store()
         self.builder = StateGraph(BlogState)
         self.builder.add_node("write_article", self.write_article)
         self.builder.add_node("revise_intro", self.revise_intro)
@@ -24,52 +33,78 @@ class Writer:
         self.builder.add_node("collect_article_parts", self.collect_article_parts)
         self.builder.add_node("evaluate_article", self.evaluate_article)
         self.builder.add_edge(START, "write_article")
-        self.builder.add_edge("write_article", "revise_intro")
-        self.builder.add_edge("revise_intro", "revise_body")
-        self.builder.add_edge("revise_body", "revise_conclusion")
-        self.builder.add_edge("revise_conclusion", "collect_article_parts")
+        if self.revision_mode == "parallel":
+            # the revisions only read the first pass article and the research, so fan them out
+            # and join them once all three are done
+            self.builder.add_edge("write_article", "revise_intro")
+            self.builder.add_edge("write_article", "revise_body")
+            self.builder.add_edge("write_article", "revise_conclusion")
+            self.builder.add_edge(["revise_intro", "revise_body", "revise_conclusion"], "collect_article_parts")
+        else:
+            self.builder.add_edge("write_article", "revise_intro")
+            self.builder.add_edge("revise_intro", "revise_body")
+            self.builder.add_edge("revise_body", "revise_conclusion")
+            self.builder.add_edge("revise_conclusion", "collect_article_parts")
         self.builder.add_edge("collect_article_parts", "evaluate_article")
         self.builder.add_conditional_edges("evaluate_article", self.is_it_good_to_go)
 
         self.graph = self.builder.compile()
 
-    def write_article(self, state: BlogState) -> BlogState:
+    def write_article(self, state: BlogState, config: RunnableConfig) -> BlogState:
         self.logger.info("Writing article")
         article = self.writer_tool.create_blog_post(state)
-        write_to_file(article, "article_firstpass", self.logger)
+        self.artifacts.save_from_node(config, "article_firstpass", article, state.article_idea)
         state.article.article_text = article
+        # split once here so every revise node works on the same spans and collect_article_parts can put them back in order
+        sections = split_article(article)
+        if sections is None:
+            self.logger.warning("Could not split the article into intro, body and conclusion, revising the whole article")
+        state.article.intro_text, state.article.body_text, state.article.conclusion_text = sections or ("", "", "")
+        state.article.revised_intro_text = state.article.revised_body_text = state.article.revised_conclusion_text = ""
         self.logger.info(f"Article written")
         return state
     
-    def revise_intro(self, state: BlogState) -> BlogState:
+    def revise_intro(self, state: BlogState, config: RunnableConfig) -> Union[BlogState, dict]:
         self.logger.info("Revising intro")
         revised_text = self.writer_tool.revise_intro(state)
-        write_to_file(revised_text, "article_revised_intro", self.logger)
-        state.article.revised_intro_text = revised_text
+        self.artifacts.save_from_node(config, "article_revised_intro", revised_text, state.article_idea)
         self.logger.info(f"Intro revised")
-        return state
+        return self.revision_update(state, "revised_intro_text", revised_text)
     
-    def revise_body(self, state: BlogState) -> BlogState:
+    def revise_body(self, state: BlogState, config: RunnableConfig) -> Union[BlogState, dict]:
         self.logger.info("Revising body")
         revised_text = self.writer_tool.revise_body(state)
-        write_to_file(revised_text, "article_revised_body", self.logger)
-        state.article.revised_body_text = revised_text
+        self.artifacts.save_from_node(config, "article_revised_body", revised_text, state.article_idea)
         self.logger.info(f"Body revised")
-        return state
+        return self.revision_update(state, "revised_body_text", revised_text)
 
-    def revise_conclusion(self, state: BlogState) -> BlogState:
+    def revise_conclusion(self, state: BlogState, config: RunnableConfig) -> Union[BlogState, dict]:
         self.logger.info("Revising conclusion")
         revised_text = self.writer_tool.revise_conclusion(state)
-        write_to_file(revised_text, "article_revised_conclusion", self.logger)
-        state.article.revised_conclusion_text = revised_text
-        
+        self.artifacts.save_from_node(config, "article_revised_conclusion", revised_text, state.article_idea)
         self.logger.info(f"Conclusion revised")
+        return self.revision_update(state, "revised_conclusion_text", revised_text)
+
+    def revision_update(self, state: BlogState, field: str, revised_text: str) -> Union[BlogState, dict]:
+        """
+        Returns the graph update for a revise node. In parallel mode the three revise nodes run in the
+        same step, so each one only returns its own article field and the merge_article reducer combines them.
+        """
+        if self.revision_mode == "parallel":
+            return {"article": {field: revised_text}}
+        setattr(state.article, field, revised_text)
         return state
     
     def collect_article_parts(self, state: BlogState) -> BlogState:
         self.logger.info("Collecting article parts")
         state.article.article_text_history.append(state.article.article_text)
-        state.article.article_text = state.article.revised_intro_text + state.article.revised_body_text + state.article.revised_conclusion_text
+        article = state.article
+        # a revision that came back empty keeps the original span
+        state.article.article_text = stitch_article(article.revised_intro_text or article.intro_text,
+                                                    article.revised_body_text or article.body_text,
+                                                    article.revised_conclusion_text or article.conclusion_text)
+        # the first pass spans are only needed until here, the first pass itself is in article_text_history
+        state.article.intro_text = state.article.body_text = state.article.conclusion_text = ""
         self.logger.info(f"Article parts collected")
         return state
     
@@ -80,7 +115,7 @@ class Writer:
         self.logger.info(f"Article evaluated")
         return state
     
-    def is_it_good_to_go(self, state: BlogState) -> Literal["revise_intro","__end__"]:
+    def is_it_good_to_go(self, state: BlogState) -> Literal["write_article","__end__"]:
         self.logger.info("Deciding if the article is good to go")
         if state.article.article_evaluation.good_to_go or state.article.article_evaluation.iteration_number >= 3:
             return END
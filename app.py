@@ -1,30 +1,74 @@
-from flask import Flask, request, jsonify
-from agent.supervisor import Supervisor
+import json
+import uuid
+from flask import Flask, request, jsonify, Response, stream_with_context
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from utils.logger import setup_logger
-from agent.tool.evaluator import Evaluator
+from utils.jobs import JobManager, JobQueueFullError
+from utils.startup import LazyInstance
+from utils.batch import BatchRunner
+from utils.artifacts import get_artifact_store
+from utils.envvars import JOB_WORKERS, JOB_QUEUE_SIZE, STARTUP_MODE, BATCH_CONCURRENCY, BATCH_MAX_TOPICS
 
 app = Flask(__name__)
 logger = setup_logger("BlogAgent App")
 
-try:
-    # captain = AgentCaptain()
-    supervisor = Supervisor()
-    logger.info("Successfully initialized Supervisor")
-except Exception as e:
-    logger.error(f"Failed to initialize Supervisor: {str(e)}")
+def build_supervisor():
+    # imported here so the agents and provider SDKs only load when the Supervisor is first needed
+    from agent.supervisor import Supervisor
+    return Supervisor()
+
+def build_jobs():
+    return JobManager(lambda topic, on_node, run_id: supervisor.get().create_blogpost(topic, on_node, run_id),
+                      lambda run_id, on_node: supervisor.get().resume_blogpost(run_id, on_node),
+                      workers=JOB_WORKERS,
+                      max_queue=JOB_QUEUE_SIZE)
+
+# captain = AgentCaptain()
+supervisor = LazyInstance(build_supervisor, "Supervisor")
+jobs = LazyInstance(build_jobs, "JobManager")
+
+# the page extraction workers are spawned processes that import the main module again as __mp_main__,
+# they must not build or warm up anything
+if __name__ != "__mp_main__":
+    if STARTUP_MODE == "eager":
+        try:
+            supervisor.get()
+            logger.info("Successfully initialized Supervisor")
+        except Exception as e:
+            logger.error(f"Failed to initialize Supervisor: {str(e)}")
+    elif STARTUP_MODE == "background":
+        supervisor.warm_up()
+
+def sse(event: str, data: dict) -> str:
+    """One server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 @app.route('/')
 def hello_world():
     logger.info("Received request to /")
     return "Hello, World!"
 
+@app.route('/health')
+def health():
+    return jsonify({"status": "ok", "supervisor": supervisor.status()})
+
+
+@app.route('/metrics')
+def metrics():
+    return generate_latest(), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+
+@app.route('/cache/stats')
+def cache_stats():
+    from utils.llm_cache import llm_cache_stats
+    from utils.research_store import research_store_stats
+    return jsonify({"llm": llm_cache_stats(), "research": research_store_stats()})
 
 @app.route('/showgraph')
 def show_graph():
     logger.info("Received request to /showgraph")
     try:
         # return captain.showgraph()
-        return supervisor.showgraph()
+        return supervisor.get().showgraph(request.args.get('format', 'png'))
         
     except Exception as e:
         logger.error(f"Failed to show graph: {str(e)}")
@@ -33,6 +77,8 @@ def show_graph():
 @app.route('/create/blogpost', methods=['POST'])
 def create_blogpost():
     logger.info("Received request to /create/blogpost")
+    # returned with errors too, so a failed run can be continued with /resume/blogpost
+    run_id = uuid.uuid4().hex
     try:
         data = request.get_json()
         topic = data.get('topic')
@@ -42,16 +88,157 @@ def create_blogpost():
             return jsonify({"error": "Topic is required"}), 400
             
         # result = captain.create_blogpost(topic)
-        result = supervisor.create_blogpost(topic)
-        return jsonify({"result": result.model_dump()})
+        result = supervisor.get().create_blogpost(topic, run_id=run_id)
+        return jsonify({"result": result.model_dump(), "run_id": run_id})
         
     except Exception as e:
         logger.error(f"Failed to create blog post: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e), "run_id": run_id}), 500
+
+@app.route('/create/blogposts', methods=['POST'])
+def create_blogposts():
+    logger.info("Received request to /create/blogposts")
+    data = request.get_json(silent=True) or {}
+    topics = data.get('topics')
+
+    if not isinstance(topics, list) or not topics or not all(isinstance(topic, str) and topic.strip() for topic in topics):
+        logger.warning("No topics provided in request")
+        return jsonify({"error": "topics must be a non-empty list of topics"}), 400
+    if len(topics) > BATCH_MAX_TOPICS:
+        return jsonify({"error": f"At most {BATCH_MAX_TOPICS} topics per batch"}), 400
+
+    try:
+        concurrency = min(int(data.get('concurrency') or BATCH_CONCURRENCY), BATCH_CONCURRENCY)
+    except (TypeError, ValueError):
+        return jsonify({"error": "concurrency must be a number"}), 400
+    runner = BatchRunner(lambda topic, run_id: supervisor.get().stream_blogpost(topic, tokens=False, run_id=run_id), concurrency)
+
+    def generate():
+        try:
+            for event in runner.run(topics):
+                name = event.pop("event")
+                if "result" in event:
+                    event["result"] = event["result"].model_dump(mode="json")
+                if "report" in event:
+                    event["report"] = event["report"].model_dump(mode="json")
+                yield sse(name, event)
+        except Exception as e:
+            logger.error(f"Failed to run blog post batch: {str(e)}")
+            yield sse("error", {"error": str(e)})
+
+    # one event per topic as it finishes, then the batch report
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/resume/blogpost', methods=['POST'])
+def resume_blogpost():
+    logger.info("Received request to /resume/blogpost")
+    data = request.get_json(silent=True) or {}
+    run_id = data.get('run_id')
+
+    if not run_id:
+        logger.warning("No run_id provided in request")
+        return jsonify({"error": "run_id is required"}), 400
+
+    try:
+        result = supervisor.get().resume_blogpost(run_id)
+        return jsonify({"result": result.model_dump(), "run_id": run_id})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Failed to resume blog post: {str(e)}")
+        return jsonify({"error": str(e), "run_id": run_id}), 500
+
+@app.route('/create/blogpost/stream', methods=['GET', 'POST'])
+def create_blogpost_stream():
+    logger.info("Received request to /create/blogpost/stream")
+    data = request.get_json(silent=True) or {}
+    topic = data.get('topic') or request.args.get('topic')
+
+    if not topic:
+        logger.warning("No topic provided in request")
+        return jsonify({"error": "Topic is required"}), 400
+
+    def generate():
+        try:
+            for event in supervisor.get().stream_blogpost(topic):
+                name = event.pop("event")
+                if name == "result":
+                    event = {"result": event["state"].model_dump(mode="json")}
+                yield sse(name, event)
+        except Exception as e:
+            logger.error(f"Failed to stream blog post: {str(e)}")
+            yield sse("error", {"error": str(e)})
+
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    logger.info("Received request to /jobs")
+    data = request.get_json()
+    topic = data.get('topic') if data else None
+
+    if not topic:
+        logger.warning("No topic provided in request")
+        return jsonify({"error": "Topic is required"}), 400
+
+    try:
+        job = jobs.get().submit(topic)
+    except JobQueueFullError as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "60"}
+    return jsonify({"job_id": job.id, "status": job.status.value}), 202
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    logger.info(f"Received request to /jobs/{job_id}")
+    job = jobs.get().get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.model_dump(mode="json"))
+
+@app.route('/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    logger.info(f"Received request to /jobs/{job_id}/resume")
+    try:
+        job = jobs.get().resume(job_id)
+    except KeyError:
+        return jsonify({"error": "Job not found"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    except JobQueueFullError as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "60"}
+    return jsonify({"job_id": job.id, "status": job.status.value}), 202
+
+@app.route('/artifacts')
+def list_artifacts():
+    """
+    The intermediate results saved by the runs, filtered by the run_id, topic (any part of the
+    article idea), node and name query parameters
+    """
+    logger.info("Received request to /artifacts")
+    artifacts = get_artifact_store().find(run_id=request.args.get('run_id'),
+                                          topic=request.args.get('topic'),
+                                          node=request.args.get('node'),
+                                          name=request.args.get('name'))
+    return jsonify({"artifacts": [artifact.model_dump() for artifact in artifacts]})
+
+@app.route('/artifacts/<int:artifact_id>')
+def get_artifact(artifact_id):
+    logger.info(f"Received request to /artifacts/{artifact_id}")
+    store = get_artifact_store()
+    artifact = store.get(artifact_id)
+    if not artifact:
+        return jsonify({"error": "Artifact not found"}), 404
+    mimetype = 'application/json' if artifact.content_type == 'json' else 'text/plain'
+    return Response(store.read(artifact), mimetype=mimetype)
     
 @app.route('/test_google_gemini')
 def test_google_gemini():
     logger.info("Received request to /test_google_gemini")
+    from agent.tool.evaluator import Evaluator
     evaluator = Evaluator()
     evaluator.test_google_gemini()
     return "Google Gemini test completed"
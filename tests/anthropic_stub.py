@@ -0,0 +1,76 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+
+class AnthropicStub:
+    """
+    Local stand-in for the Anthropic Messages API that keeps prompt caching the way Claude does: the
+    prefix up to each cache_control marker (tools, then the system blocks) is written to the cache the
+    first time it is sent and read from it after that. Every request is answered with a short text reply,
+    or, if it has tools and `tool_input` is given, with a call of its first tool with tool_input(request number).
+    """
+
+    def __init__(self, tool_input: Optional[Callable[[int], dict]] = None):
+        self.tool_input = tool_input
+        self.requests: List[dict] = []
+        # for each request, the markers whose prefix was read from the cache and the ones written to it
+        self.reads: List[List[int]] = []
+        self.writes: List[List[int]] = []
+        self.cached = set()
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                read_tokens, write_tokens, number = stub.record(body)
+                content, stop_reason = [{"type": "text", "text": f"reply {number}"}], "end_turn"
+                if body.get("tools") and stub.tool_input:
+                    content = [{"type": "tool_use", "id": f"toolu_{number}", "name": body["tools"][0]["name"], "input": stub.tool_input(number)}]
+                    stop_reason = "tool_use"
+                reply = {"id": f"msg_{number}", "type": "message", "role": "assistant", "model": body["model"],
+                         "content": content, "stop_reason": stop_reason, "stop_sequence": None,
+                         "usage": {"input_tokens": 10, "output_tokens": 3,
+                                   "cache_creation_input_tokens": write_tokens, "cache_read_input_tokens": read_tokens}}
+                data = json.dumps(reply).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def record(self, body: dict) -> tuple:
+        system = body.get("system") or []
+        if isinstance(system, str):
+            system = [{"type": "text", "text": system}]
+        prefix = json.dumps(body.get("tools", []))
+        reads, writes, read_tokens, write_tokens = [], [], 0, 0
+        with self.lock:
+            for marker, block in enumerate(system):
+                prefix += block["text"]
+                if "cache_control" not in block:
+                    continue
+                if prefix in self.cached:
+                    reads.append(marker)
+                    read_tokens = len(prefix) // 4
+                else:
+                    self.cached.add(prefix)
+                    writes.append(marker)
+                    write_tokens = len(prefix) // 4 - read_tokens
+            self.requests.append(body)
+            self.reads.append(reads)
+            self.writes.append(writes)
+            number = len(self.requests)
+        return read_tokens, write_tokens, number
+
+    def close(self):
+        self.server.shutdown()
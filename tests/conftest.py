@@ -0,0 +1,32 @@
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# utils.envvars reads the environment once, at import, so the test settings go in before anything is imported:
+# dummy secrets, nothing cached across tests and everything written under a temporary directory
+TEST_DIR = tempfile.mkdtemp(prefix="blog-agent-tests-")
+for name in ["OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GITHUB_TOKEN", "PPLX_API_KEY", "GOOGLE_API_KEY", "PERSONALITY", "LLM_CLAUDE_SONNET", "LLM_GPT_4O"]:
+    os.environ.setdefault(name, "test")
+os.environ.update({
+    "FIXTURE_MODE": "off",
+    "STARTUP_MODE": "lazy",
+    "LLM_CACHE_ENABLED": "false",
+    "CONTENT_CACHE_ENABLED": "false",
+    "RESEARCH_REUSE_ENABLED": "false",
+    "CHECKPOINT_BACKEND": "memory",
+    "EXTRACT_WORKERS": "0",
+    "ARTIFACT_DIR": os.path.join(TEST_DIR, "artifacts"),
+    "LOG_DIR": os.path.join(TEST_DIR, "logs"),
+})
+
+
+@pytest.fixture(autouse=True)
+def github_prompts(monkeypatch):
+    """The system prompts and personality normally read from GitHub"""
+    from utils.github_reader import GithubReader
+    monkeypatch.setattr(GithubReader, "read_file", lambda self, url: f"system prompt from {url}")
+    monkeypatch.setattr(GithubReader, "read_files", lambda self, urls: {url: f"system prompt from {url}" for url in urls})
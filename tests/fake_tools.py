@@ -0,0 +1,167 @@
+"""The real Supervisor, Researcher and Writer graphs wired to zero-latency fake tools, for the tests and the graph benchmark"""
+import functools
+import os
+import random
+import sqlite3
+import time
+from contextlib import ExitStack
+from typing import Dict, List
+from unittest.mock import patch
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.graph import StateGraph
+import agent.researcher
+import agent.supervisor
+import agent.writer
+from agent.data_class.blog_data import BlogState, BlogOutline, BlogOutlineSimple, BlogArticle, ResearchResponse
+from utils.artifacts import ArtifactStore
+from utils.eval_history import EvaluationHistory, document_prompt
+
+WORDS = ("agent graph model prompt token latency cache research article outline draft writer evaluator thesis author "
+         "voice reader system memory state python request response network parallel revise section summary data").split()
+# outline and article evaluation rounds of every run (the evaluator says NO until the last one)
+ROUNDS = 2
+RESEARCH_CHARS = 20000
+# share of the paragraphs rewritten between two drafts
+CHANGED_PARAGRAPHS = 0.3
+
+
+def text(rng: random.Random, chars: int) -> str:
+    words = []
+    length = 0
+    while length < chars:
+        words.append(rng.choice(WORDS))
+        length += len(words[-1]) + 1
+    return " ".join(words)
+
+
+def article_parts(rng: random.Random, chars: int) -> List[str]:
+    """The headings and paragraphs of a markdown article of about `chars` characters that split_article can split"""
+    sections = max(3, min(12, chars // 500))
+    paragraphs = max(1, chars // sections // 600)
+    parts = [f"# {text(rng, 60)}"]
+    for _ in range(sections):
+        parts.append(f"## {text(rng, 40)}")
+        parts.extend(text(rng, max(chars // sections // paragraphs - 60, 20)) for _ in range(paragraphs))
+    return parts
+
+
+class FakeWriterTool:
+    """WriterTool that answers at once with text of the benchmark's sizes"""
+
+    def __init__(self, article_chars: int = 1024):
+        self.article_chars = article_chars
+        self.rng = random.Random(0)
+        self.parts: List[str] = []
+
+    def construct_thesis(self, instructions: str) -> str:
+        return text(self.rng, 300)
+
+    def create_outline(self, *args, **kwargs) -> BlogOutlineSimple:
+        return BlogOutlineSimple(short_title=text(self.rng, 40), title=text(self.rng, 80), intro=text(self.rng, 400),
+                                 body=text(self.rng, 1500), conclusion=text(self.rng, 300))
+
+    def create_outline_candidates(self, *args, **kwargs) -> List[BlogOutlineSimple]:
+        return [self.create_outline() for _ in range(args[5] if len(args) > 5 else kwargs.get("count", 1))]
+
+    def create_blog_post(self, state: BlogState) -> str:
+        """A new article, or the last one with part of its paragraphs rewritten, as the next rounds are"""
+        if not state.article.article_text or not self.parts:
+            self.parts = article_parts(self.rng, self.article_chars)
+        else:
+            for i in self.rng.sample(range(1, len(self.parts)), int((len(self.parts) - 1) * CHANGED_PARAGRAPHS)):
+                self.parts[i] = text(self.rng, len(self.parts[i]))
+        return "\n\n".join(self.parts) + "\n"
+
+    def revise_intro(self, state: BlogState) -> str:
+        return state.article.intro_text or state.article.article_text
+
+    def revise_body(self, state: BlogState) -> str:
+        return state.article.body_text
+
+    def revise_conclusion(self, state: BlogState) -> str:
+        return state.article.conclusion_text
+
+
+class FakeEvaluator:
+    """Evaluator that keeps a transcript the way the real one does and approves in the last round"""
+
+    def __init__(self):
+        self.rng = random.Random(1)
+        self.history = EvaluationHistory("diff", 1, 10 ** 9, 1500)
+
+    def evaluate(self, evaluation, document: str):
+        if not evaluation.messages:
+            evaluation.messages = [AIMessage(content="system prompt")]
+        self.history.record(evaluation.messages, evaluation.documents, document_prompt("Evaluate this and answer YES or NO first: ", document))
+        evaluation.iteration_number += 1
+        evaluation.good_to_go = evaluation.iteration_number >= ROUNDS
+        evaluation.evaluation = ("YES " if evaluation.good_to_go else "NO ") + text(self.rng, 1200)
+        evaluation.messages.append(AIMessage(content=evaluation.evaluation))
+
+    def evaluate_outline(self, outline: BlogOutline) -> BlogOutline:
+        self.evaluate(outline.outline_evaluation, outline.outline.model_dump_json())
+        return outline
+
+    def rank_outlines(self, outline: BlogOutline, candidates: List[BlogOutlineSimple]) -> BlogOutline:
+        outline.outline = candidates[0]
+        return self.evaluate_outline(outline)
+
+    def evaluate_article(self, article: BlogArticle) -> BlogArticle:
+        self.evaluate(article.article_evaluation, article.article_text)
+        return article
+
+
+class FakePerplexityTool:
+    def query(self, thesis: str) -> ResearchResponse:
+        return ResearchResponse(content=text(random.Random(2), RESEARCH_CHARS), sources=[f"https://example.com/{i}" for i in range(8)])
+
+
+class FakePersonalityTool:
+    def get_author_personality(self) -> str:
+        return text(random.Random(3), 3000)
+
+
+class FakeWebsiteContentTool:
+    def get_content_from_urls(self, urls: List[str]) -> str:
+        return ""
+
+
+def timed_add_node(body_times: Dict[str, List[float]]):
+    """StateGraph.add_node that also records the time spent in the node functions themselves"""
+    add_node = StateGraph.add_node
+
+    def timed(self, node, action=None, **kwargs):
+        if callable(action) and not hasattr(action, "invoke"):
+            function = action
+
+            @functools.wraps(function)
+            def node_function(*args, **kw):
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kw)
+                finally:
+                    body_times.setdefault(node, []).append(time.perf_counter() - started)
+            action = node_function
+        return add_node(self, node, action, **kwargs)
+    return timed
+
+
+def build_supervisor(directory: str, article_chars: int, checkpointer: str, body_times: Dict[str, List[float]]) -> agent.supervisor.Supervisor:
+    """The real Supervisor, Researcher and Writer graphs with fake tools, storing everything under directory"""
+    saver = SqliteSaver(sqlite3.connect(os.path.join(directory, "checkpoints.sqlite"), check_same_thread=False)) if checkpointer == "sqlite" else MemorySaver()
+    artifacts = ArtifactStore(os.path.join(directory, "artifacts"), "gzip")
+    with ExitStack() as stack:
+        for module in (agent.researcher, agent.writer):
+            stack.enter_context(patch.object(module, "WriterTool", lambda **kwargs: FakeWriterTool(article_chars)))
+            stack.enter_context(patch.object(module, "Evaluator", FakeEvaluator))
+            stack.enter_context(patch.object(module, "get_artifact_store", lambda: artifacts))
+        stack.enter_context(patch.object(agent.researcher, "PerplexityTool", FakePerplexityTool))
+        stack.enter_context(patch.object(agent.researcher, "PersonalityTool", FakePersonalityTool))
+        stack.enter_context(patch.object(agent.researcher, "WebsiteContentTool", FakeWebsiteContentTool))
+        stack.enter_context(patch.object(agent.researcher, "get_research_store", lambda: None))
+        stack.enter_context(patch.object(agent.supervisor, "get_checkpointer", lambda: saver))
+        stack.enter_context(patch.object(agent.supervisor.Supervisor, "prefetch_prompts", lambda self: None))
+        stack.enter_context(patch.object(StateGraph, "add_node", timed_add_node(body_times)))
+        return agent.supervisor.Supervisor()
@@ -0,0 +1,32 @@
+import time
+import pytest
+from agent.data_class.blog_data import BlogState
+from utils.startup import LazyInstance
+
+
+class FakeSupervisor:
+    def create_blogpost(self, topic: str, on_node=None, run_id=None) -> BlogState:
+        on_node("create_thesis")
+        return BlogState(article_idea=topic)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import app
+    monkeypatch.setattr(app, "supervisor", LazyInstance(FakeSupervisor, "Supervisor"))
+    return app.app.test_client()
+
+
+def test_jobs_run_when_the_app_is_imported(client):
+    assert client.get("/jobs/unknown").status_code == 404
+
+    response = client.post("/jobs", json={"topic": "testing"})
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+    for _ in range(100):
+        job = client.get(f"/jobs/{job_id}").get_json()
+        if job["status"] == "succeeded":
+            break
+        time.sleep(0.05)
+    assert job["status"] == "succeeded" and job["result"]["article_idea"] == "testing"
+    assert client.post(f"/jobs/{job_id}/resume").status_code == 409
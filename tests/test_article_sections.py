@@ -0,0 +1,61 @@
+from agent.data_class.blog_data import BlogArticle, merge_article
+from utils.article_sections import split_article, split_by_headings, split_by_paragraphs, stitch_article
+
+ARTICLE = """# Why tests matter
+
+Tests catch regressions before users do.
+
+## Fast feedback
+
+A quick suite runs on every change.
+
+## Confidence to refactor
+
+Good coverage makes big changes safe.
+
+## Conclusion
+
+Write the tests first.
+"""
+
+PARAGRAPHS = "\n\n".join(f"Paragraph {i} of an article without headings." for i in range(10)) + "\n"
+
+
+def test_split_by_headings_keeps_the_title_in_the_intro_and_the_last_section_as_conclusion():
+    intro_end, conclusion_start = split_by_headings(ARTICLE)
+    assert ARTICLE[:intro_end] == "# Why tests matter\n\nTests catch regressions before users do.\n\n"
+    assert ARTICLE[conclusion_start:] == "## Conclusion\n\nWrite the tests first.\n"
+
+
+def test_split_by_headings_ignores_headings_in_code_blocks():
+    text = "Intro.\n\n## One\n\nText.\n\n```\n## not a heading\n```\n\n## Two\n\nEnd.\n"
+    intro_end, conclusion_start = split_by_headings(text)
+    assert text[:intro_end] == "Intro.\n\n" and text[conclusion_start:] == "## Two\n\nEnd.\n"
+
+
+def test_split_by_paragraphs_gives_a_share_to_intro_and_conclusion():
+    intro_end, conclusion_start = split_by_paragraphs(PARAGRAPHS)
+    # 15% of the 10 paragraphs each
+    assert PARAGRAPHS[:intro_end].startswith("Paragraph 0") and PARAGRAPHS[intro_end:].startswith("Paragraph 2")
+    assert PARAGRAPHS[conclusion_start:].startswith("Paragraph 8")
+    assert split_by_paragraphs("One.\n\nTwo.\n") is None
+
+
+def test_articles_with_too_few_sections_are_not_split_by_paragraphs():
+    text = "## The only section\n\n" + PARAGRAPHS
+    assert split_by_headings(text) is None
+    assert split_article(text) is None
+
+
+def test_split_and_merge_round_trip():
+    intro, body, conclusion = split_article(ARTICLE)
+    assert intro + body + conclusion == ARTICLE
+    article = BlogArticle(article_text=ARTICLE, intro_text=intro, body_text=body, conclusion_text=conclusion)
+    # the parallel revise nodes each send their own field, the reducer merges them
+    for update in ({"revised_intro_text": intro.upper()}, {"revised_conclusion_text": conclusion.upper()}, {"revised_body_text": ""}):
+        article = merge_article(article, update)
+    assert article.intro_text == intro and article.revised_intro_text == intro.upper()
+    stitched = stitch_article(article.revised_intro_text or article.intro_text, article.revised_body_text or article.body_text,
+                              article.revised_conclusion_text or article.conclusion_text)
+    assert stitched == stitch_article(intro.upper(), body, conclusion.upper())
+    assert stitch_article(intro, body, conclusion) == ARTICLE
@@ -0,0 +1,30 @@
+import sqlite3
+import time
+import zlib
+from agent.tool.websitecontent import WebsiteContentTool
+from utils.content_cache import ContentCache
+
+URL = "https://example.com/post"
+HTML = "<html><body><nav>Home | About</nav><article><h1>The post</h1><p>What the post says.</p></article></body></html>"
+
+
+def old_cache(path: str):
+    """A content cache from before the markdown was versioned, holding the page converted by html2text"""
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE pages (url TEXT PRIMARY KEY, html BLOB, markdown BLOB, etag TEXT, last_modified TEXT,
+                                        fetched_at REAL, last_access REAL, size INTEGER)""")
+    conn.execute("INSERT INTO pages VALUES (?, ?, ?, NULL, NULL, ?, ?, 0)",
+                 (URL, zlib.compress(HTML.encode()), zlib.compress(b"Home | About\n\n# The post\n\nWhat the post says."), time.time(), time.time()))
+    conn.commit()
+    conn.close()
+
+
+def test_cached_markdown_of_another_conversion_is_converted_again(tmp_path):
+    path = str(tmp_path / "content.sqlite")
+    old_cache(path)
+    tool = WebsiteContentTool(extract_workers=0, cache=ContentCache(path))
+
+    content = tool.get_content(URL)
+    assert "# The post" in content and "Home | About" not in content
+    assert tool.cache.get(URL).markdown_version == tool.markdown_version
+    assert tool.cache.stats()["hit"] == 1
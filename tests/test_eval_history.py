@@ -0,0 +1,49 @@
+from langchain_core.messages import AIMessage, SystemMessage
+from utils.eval_history import EvaluationHistory, document_prompt, split_prompt
+from utils.text_history import TextHistory
+
+INSTRUCTION = "Evaluate the following article, and tell me if it is good to go or needs more work: "
+
+
+def diff_request(previous: str, new: str):
+    history = EvaluationHistory("diff", window=1, max_tokens=100000, feedback_chars=200)
+    transcript, documents = [SystemMessage(content="You are an editor")], TextHistory()
+    history.record(transcript, documents, document_prompt(INSTRUCTION, previous))
+    transcript.append(AIMessage(content="NO, tighten the intro"))
+    history.record(transcript, documents, document_prompt(INSTRUCTION, new))
+    return history.build(transcript, documents)
+
+
+def test_diff_falls_back_when_the_diff_prompt_is_not_smaller():
+    # a short draft rewritten completely: the diff is barely shorter than the draft, the added instruction makes it longer
+    request, estimates = diff_request("a" * 300, "b" * 300)
+    assert len(request) == 2
+    assert split_prompt(request[-1])[1] == "b" * 300
+    assert estimates["diff"] == estimates["summary"]
+
+
+def test_diff_sends_only_the_changed_lines():
+    paragraphs = [f"Paragraph {i}: " + "words " * 80 for i in range(20)]
+    revised = paragraphs[:10] + ["Paragraph 10: rewritten"] + paragraphs[11:]
+    request, estimates = diff_request("\n".join(paragraphs), "\n".join(revised))
+    instruction, document = split_prompt(request[-1])
+    assert "unified diff" in instruction
+    assert "+Paragraph 10: rewritten" in document and "Paragraph 3:" not in document
+    assert estimates["diff"] < estimates["full"]
+
+
+def test_capped_diff_request_keeps_the_whole_document():
+    paragraphs = [f"Paragraph {i}: " + "words " * 80 for i in range(20)]
+    revised = paragraphs[:10] + ["Paragraph 10: rewritten"] + paragraphs[11:]
+    history = EvaluationHistory("diff", window=1, max_tokens=3000, feedback_chars=200)
+    transcript, documents = [SystemMessage(content="You are an editor")], TextHistory()
+    history.record(transcript, documents, document_prompt(INSTRUCTION, "\n".join(paragraphs)))
+    transcript.append(AIMessage(content="NO, tighten paragraph 10"))
+    history.record(transcript, documents, document_prompt(INSTRUCTION, "\n".join(revised)))
+
+    request, _ = history.build(transcript, documents)
+    # the previous version doesn't fit next to the diff, so the new version is sent whole with the feedback recapped
+    assert len(request) == 2
+    instruction, document = split_prompt(request[-1])
+    assert "unified diff" not in instruction and "tighten paragraph 10" in instruction
+    assert document.startswith("Paragraph 0:")
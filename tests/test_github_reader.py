@@ -0,0 +1,50 @@
+import base64
+import time
+import pytest
+from utils.github_reader import GithubReader
+
+# the real method, the autouse github_prompts fixture replaces it in every test
+READ_FILE = GithubReader.read_file
+URL = "https://github.com/owner/repo/blob/main/prompt.md"
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, content: str = "", etag: str = ""):
+        self.status_code = status_code
+        self.headers = {"ETag": etag}
+        self.content = content
+
+    def json(self):
+        return {"content": base64.b64encode(self.content.encode()).decode()}
+
+
+@pytest.fixture
+def reader(monkeypatch, tmp_path):
+    monkeypatch.setattr(GithubReader, "read_file", READ_FILE)
+    monkeypatch.setattr(GithubReader, "memory_cache", {})
+    reader = GithubReader()
+    reader.cache_dir = str(tmp_path)
+    reader.cache_ttl = 0.2
+    return reader
+
+
+def test_memory_copy_expires_with_the_ttl(reader, monkeypatch):
+    responses = [FakeResponse(200, "first prompt", '"v1"'), FakeResponse(304), FakeResponse(200, "updated prompt", '"v2"')]
+    requests = []
+
+    def get(url, headers, timeout):
+        requests.append(headers.get("If-None-Match"))
+        return responses.pop(0)
+    monkeypatch.setattr(GithubReader.session, "get", get)
+
+    assert reader.read_file(URL) == "first prompt"
+    assert reader.read_file(URL) == "first prompt"
+    assert requests == [None]
+
+    time.sleep(0.25)
+    assert reader.read_file(URL) == "first prompt"
+    assert requests == [None, '"v1"']
+
+    time.sleep(0.25)
+    assert reader.read_file(URL) == "updated prompt"
+    assert len(requests) == 3
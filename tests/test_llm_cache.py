@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from prometheus_client import REGISTRY
+from utils.llm_cache import LLMResponseCache, LLMResponseStore
+from utils.metrics import MetricsCallbackHandler
+
+
+def total(metric: str, **labels) -> float:
+    return sum(sample.value for family in REGISTRY.collect() for sample in family.samples
+               if sample.name == metric and all(sample.labels.get(k) == v for k, v in labels.items()))
+
+
+def test_cached_responses_are_not_counted_as_requests(tmp_path):
+    cache = LLMResponseCache(LLMResponseStore(str(tmp_path / "llm.sqlite"), ttl=3600, max_entries=10), "test")
+    reply = AIMessage(content="the reply", usage_metadata={"input_tokens": 100, "output_tokens": 20, "total_tokens": 120})
+    llm = GenericFakeChatModel(messages=iter([reply, reply]), cache=cache)
+    handler = MetricsCallbackHandler()
+    tokens, requests = total("blog_llm_tokens_total", direction="input"), total("blog_llm_request_duration_seconds_count")
+
+    for _ in range(2):
+        assert llm.invoke("the prompt", config={"callbacks": [handler]}).content == "the reply"
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert total("blog_llm_tokens_total", direction="input") - tokens == 100
+    assert total("blog_llm_request_duration_seconds_count") - requests == 1
+
+
+def test_concurrent_lookups_are_all_counted(tmp_path):
+    cache = LLMResponseCache(LLMResponseStore(str(tmp_path / "llm.sqlite"), ttl=3600, max_entries=10), "test")
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: cache.lookup(f"prompt {i % 4}", "model"), range(400)))
+    assert cache.stats() == {"hits": 0, "misses": 400}
@@ -0,0 +1,34 @@
+import pytest
+from agent.data_class.blog_data import BlogOutlineSimple
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableLambda
+from tests.anthropic_stub import AnthropicStub
+
+
+class ChatModelStarts(BaseCallbackHandler):
+    def __init__(self):
+        self.starts = 0
+
+    def on_chat_model_start(self, *args, **kwargs):
+        self.starts += 1
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    stub = AnthropicStub(tool_input=lambda number: BlogOutlineSimple(title=f"Outline {number}").model_dump())
+    monkeypatch.setenv("ANTHROPIC_API_URL", stub.url)
+    yield stub
+    stub.close()
+
+
+def test_run_callbacks_see_every_candidate(stub):
+    from agent.tool.writertool import WriterTool
+    writer = WriterTool()
+    handler = ChatModelStarts()
+
+    candidates = RunnableLambda(lambda _: writer.create_outline_candidates("thesis", "research", "personality", None, None, 3)) \
+        .invoke(None, config={"callbacks": [handler]})
+    assert len(candidates) == 3 and all(isinstance(candidate, BlogOutlineSimple) for candidate in candidates)
+    assert sorted(candidate.title for candidate in candidates) == ["Outline 1", "Outline 2", "Outline 3"]
+    assert len(stub.requests) == 3
+    assert handler.starts == 3
@@ -0,0 +1,49 @@
+import pytest
+from agent.data_class.blog_data import BlogState, ResearchResponse
+from tests.anthropic_stub import AnthropicStub
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    stub = AnthropicStub()
+    monkeypatch.setenv("ANTHROPIC_API_URL", stub.url)
+    yield stub
+    stub.close()
+
+
+def run_state() -> BlogState:
+    state = BlogState(article_idea="idea", author_personality="a curious engineer " * 200)
+    state.outline.research = ResearchResponse(content="research findings " * 2000, sources=[])
+    state.article.article_text = "# Title\n\nThe article. " * 300
+    return state
+
+
+def write_and_revise(cache_article: bool) -> None:
+    from agent.tool.writertool import WriterTool
+    writer = WriterTool(revision_scope="article", cache_article=cache_article)
+    state = run_state()
+    writer.create_blog_post(state)
+    writer.revise_intro(state)
+    writer.revise_body(state)
+    writer.revise_conclusion(state)
+
+
+def test_revise_calls_read_the_research_and_article_from_the_cache(stub):
+    write_and_revise(cache_article=True)
+
+    # create_blog_post writes the research block, the first revise reads it and writes the article block
+    assert stub.writes[0] == [0] and stub.reads[0] == []
+    assert stub.reads[1] == [0] and stub.writes[1] == [1]
+    # the other two revise calls read both
+    assert stub.reads[2] == [0, 1] and stub.reads[3] == [0, 1]
+    assert stub.writes[2] == [] and stub.writes[3] == []
+
+
+def test_article_is_not_marked_when_revisions_run_in_parallel(stub):
+    write_and_revise(cache_article=False)
+
+    for request in stub.requests[1:]:
+        markers = [block for block in request["system"] if "cache_control" in block]
+        assert len(markers) == 1
+        assert "CURRENT ARTICLE START" in "".join(block["text"] for block in request["system"])
+    assert stub.reads[1:] == [[0], [0], [0]]
@@ -0,0 +1,64 @@
+import anthropic
+import httpx
+import pytest
+import utils.rate_limit
+from utils.rate_limit import ProviderLimiter
+
+
+def status_error(status: int) -> anthropic.APIStatusError:
+    response = httpx.Response(status, request=httpx.Request("POST", "https://api.anthropic.com/v1/messages"))
+    return anthropic.APIStatusError("error", response=response, body=None)
+
+
+def flaky(*errors):
+    """A request that raises the errors in turn, then succeeds"""
+    remaining = list(errors)
+
+    def request():
+        if remaining:
+            raise remaining.pop(0)
+        return "ok"
+    return request
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(utils.rate_limit, "backoff", lambda attempt: 0)
+    return ProviderLimiter("anthropic", 0, 0, 4)
+
+
+def test_transient_errors_are_retried(limiter):
+    timeout = anthropic.APITimeoutError(httpx.Request("POST", "https://api.anthropic.com/v1/messages"))
+    request = flaky(timeout, status_error(500), status_error(502), status_error(529))
+    assert limiter.call(request, 100, lambda result: None) == "ok"
+    assert limiter.in_flight == 0
+    # only the overload error halves the calls in flight
+    assert int(limiter.limit) == 2
+
+
+def test_other_errors_are_raised(limiter):
+    with pytest.raises(anthropic.APIStatusError):
+        limiter.call(flaky(status_error(400)), 100, lambda result: None)
+    assert limiter.in_flight == 0 and limiter.limit == 4
+
+
+def test_streams_are_retried_before_their_first_chunk(limiter):
+    failures = [ConnectionError("reset")]
+
+    def stream():
+        if failures:
+            raise failures.pop()
+        yield from ("a", "b")
+    assert list(limiter.stream(stream, 100, lambda chunks: None)) == ["a", "b"]
+
+
+def test_failures_dont_grow_the_limit(limiter):
+    limiter.call(flaky(status_error(529)), 100, lambda result: None)
+    assert int(limiter.limit) == 2
+    for _ in range(10):
+        with pytest.raises(anthropic.APIStatusError):
+            limiter.call(flaky(status_error(401)), 100, lambda result: None)
+    assert int(limiter.limit) == 2 and limiter.in_flight == 0
+    for _ in range(4):
+        limiter.call(flaky(), 100, lambda result: None)
+    assert int(limiter.limit) == 3
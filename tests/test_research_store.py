@@ -0,0 +1,20 @@
+from agent.data_class.blog_data import ResearchResponse
+from utils.research_store import ResearchStore, minhash, similarity
+
+THESIS = "AI coding assistants will replace most junior software developers within the next five years"
+
+
+def test_a_thesis_and_its_negation_are_not_similar():
+    negated = "AI coding assistants will not replace most junior software developers within the next five years"
+    assert similarity(minhash(THESIS), minhash(negated)) < 0.3
+    contraction = "AI coding assistants won't replace most junior software developers within the next five years"
+    assert similarity(minhash(THESIS), minhash(contraction)) < 0.3
+
+
+def test_research_is_reused_for_a_reworded_thesis_only(tmp_path):
+    store = ResearchStore(str(tmp_path / "research.sqlite"), threshold=0.6)
+    store.put(THESIS, ResearchResponse(content="findings", sources=["https://example.com/study"]))
+
+    found = store.find("Within the next five years, AI coding assistants will replace most junior software developers")
+    assert found is not None and found.research.content == "findings"
+    assert store.find("AI coding assistants will never replace most junior software developers within the next five years") is None
@@ -0,0 +1,38 @@
+import pytest
+from tests.fake_tools import build_supervisor
+
+
+def fail_once(tool, method: str):
+    """Makes tool.method raise on its first call, the way a provider error would, and counts the calls"""
+    original = getattr(tool, method)
+    calls = []
+
+    def flaky(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise ConnectionError(f"{method} failed")
+        return original(*args, **kwargs)
+    setattr(tool, method, flaky)
+    return calls
+
+
+@pytest.mark.parametrize("tool, method", [
+    ("researcher.perplexity", "query"),
+    ("researcher.evaluator", "evaluate_outline"),
+    ("writer.writer_tool", "create_blog_post"),
+    ("writer.evaluator", "evaluate_article"),
+])
+def test_resume_after_a_failure(tmp_path, tool, method):
+    supervisor = build_supervisor(str(tmp_path), 2048, "memory", {})
+    subgraph, attribute = tool.split(".")
+    calls = fail_once(getattr(getattr(supervisor, subgraph), attribute), method)
+    run_id = supervisor.new_run_id()
+    with pytest.raises(ConnectionError):
+        supervisor.create_blogpost("resume test", run_id=run_id)
+    nodes = []
+    state = supervisor.resume_blogpost(run_id, on_node=nodes.append)
+    assert state.article.article_evaluation.good_to_go and state.article.article_text
+    assert state.outline.research.content
+    # the nodes that completed before the failure are not run again
+    assert "create_thesis" not in nodes
+    assert len(calls) >= 2
@@ -0,0 +1,130 @@
+import re
+from typing import List, Optional, Tuple
+
+ATX_HEADING = re.compile(r"^ {0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+# a line that is only bold text, used as a heading when the article has no markdown headings
+BOLD_HEADING = re.compile(r"^\s*(?:\*\*|__)(.+?)(?:\*\*|__):?\s*$")
+FENCE = re.compile(r"^\s*(```|~~~)")
+BLANK_LINES = re.compile(r"\n[ \t]*\n\s*")
+
+INTRO_TITLES = ("intro", "introduction", "overview")
+CONCLUSION_TITLES = ("conclusion", "final thoughts", "closing thoughts", "wrapping up", "wrap up", "wrap-up", "in closing",
+                     "takeaways", "key takeaways", "the bottom line", "bottom line", "summary", "looking ahead")
+# share of the paragraphs used for the intro and for the conclusion when the article has no headings
+PARAGRAPH_SHARE = 0.15
+
+
+def find_headings(text: str) -> List[Tuple[int, int, str]]:
+    """
+    Returns (offset, level, title) for every heading line outside fenced code blocks. Bold-only
+    lines get level 7 so they only count as sections when there are no markdown headings.
+    """
+    headings = []
+    offset = 0
+    fence = None
+    for line in text.splitlines(keepends=True):
+        stripped = line.rstrip("\r\n")
+        fence_match = FENCE.match(stripped)
+        if fence_match:
+            if fence is None:
+                fence = fence_match.group(1)
+            elif fence_match.group(1) == fence:
+                fence = None
+        elif fence is None:
+            if heading := ATX_HEADING.match(stripped):
+                headings.append((offset, len(heading.group(1)), heading.group(2)))
+            elif heading := BOLD_HEADING.match(stripped):
+                headings.append((offset, 7, heading.group(1)))
+        offset += len(line)
+    return headings
+
+
+def heading_key(title: str) -> str:
+    return re.sub(r"[^a-z ]", "", title.lower()).strip()
+
+
+def has_prose(span: str) -> bool:
+    """True if the span has any line that isn't blank or a heading"""
+    return any(line.strip() and not ATX_HEADING.match(line) and not BOLD_HEADING.match(line) for line in span.splitlines())
+
+
+def split_by_headings(text: str) -> Optional[Tuple[int, int]]:
+    headings = find_headings(text)
+    if not headings:
+        return None
+    # a heading before any text, alone at its level, is the article title and not a section
+    first_offset, first_level, _ = headings[0]
+    if not text[:first_offset].strip() and sum(1 for _, level, _ in headings if level == first_level) == 1:
+        headings = headings[1:]
+    if len(headings) < 2:
+        return None
+    section_level = min(level for _, level, _ in headings)
+    sections = [(offset, title) for offset, level, title in headings if level == section_level]
+    if len(sections) < 2:
+        return None
+
+    bounds = [offset for offset, _ in sections]
+    # an 'Introduction' section belongs to the intro, and so does the next section if the intro is only the title
+    start = 1 if heading_key(sections[0][1]) in INTRO_TITLES else 0
+    while start < len(bounds) - 1 and not has_prose(text[:bounds[start]]):
+        start += 1
+    intro_end = bounds[start]
+    # the last section is the conclusion, whatever its title
+    conclusion_start = bounds[-1]
+    if intro_end >= conclusion_start or not has_prose(text[intro_end:conclusion_start]):
+        return None
+    return intro_end, conclusion_start
+
+
+def split_by_paragraphs(text: str) -> Optional[Tuple[int, int]]:
+    starts = [0] + [match.end() for match in BLANK_LINES.finditer(text)
+                    if text[:match.start()].strip() and text[match.end():].strip()]
+    share = max(1, round(len(starts) * PARAGRAPH_SHARE))
+    if len(starts) < 3 or share >= len(starts) - share:
+        return None
+    return starts[share], starts[len(starts) - share]
+
+
+def split_article(text: str) -> Optional[Tuple[str, str, str]]:
+    """
+    Splits a markdown article into its intro, body and conclusion spans. Sections are found from the
+    top level headings (ignoring the title and anything in code blocks): the text up to the first
+    section is the intro, the last section is the conclusion. Articles without any headings are
+    split by paragraphs instead. One with headings but too few sections is not split, splitting it
+    by paragraphs could cut a heading off from its text. The three spans always add back up to the original text.
+
+    Returns:
+        Optional[Tuple[str, str, str]]: intro, body and conclusion, None if the article is too short to split
+    """
+    if not text or not text.strip():
+        return None
+    bounds = split_by_headings(text) if find_headings(text) else split_by_paragraphs(text)
+    if bounds is None:
+        return None
+    intro_end, conclusion_start = bounds
+    return text[:intro_end], text[intro_end:conclusion_start], text[conclusion_start:]
+
+
+def stitch_article(*parts: str) -> str:
+    """
+    Joins article parts back together with exactly one blank line between them
+    """
+    return "\n\n".join(part.strip() for part in parts if part and part.strip()) + "\n"
+
+
+def context_before(text: str, max_chars: int) -> str:
+    """The end of the text, at most max_chars long and starting at a word boundary"""
+    text = text.rstrip()
+    if len(text) <= max_chars:
+        return text
+    excerpt = text[-max_chars:]
+    return "..." + excerpt[excerpt.find(" ") + 1:] if " " in excerpt else excerpt
+
+
+def context_after(text: str, max_chars: int) -> str:
+    """The start of the text, at most max_chars long and ending at a word boundary"""
+    text = text.lstrip()
+    if len(text) <= max_chars:
+        return text
+    excerpt = text[:max_chars]
+    return excerpt[:excerpt.rfind(" ")] + "..." if " " in excerpt else excerpt
@@ -0,0 +1,184 @@
+import atexit
+import gzip
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, List, Optional
+from langchain_core.runnables import RunnableConfig
+from pydantic import BaseModel, Field
+from utils.logger import setup_logger
+from utils.envvars import ARTIFACT_DIR, ARTIFACT_COMPRESSION
+
+logger = setup_logger("ArtifactStore")
+
+COMPRESSIONS = ("gzip", "none")
+
+
+class Artifact(BaseModel):
+    id: int = Field(description="Id of the artifact in the index")
+    run_id: str = Field(description="The run (graph thread id) that produced it")
+    topic: str = Field(default="", description="The article idea of the run")
+    node: str = Field(description="The graph node that produced it")
+    name: str = Field(description="What it is: thesis, outline, article_firstpass, ...")
+    path: str = Field(description="The file it is stored in, relative to the store directory")
+    content_type: str = Field(description="'json' or 'txt'")
+    size: int = Field(description="Size of the content in bytes")
+    stored_size: int = Field(description="Size of the file in bytes")
+    created_at: float = Field(description="Unix time the artifact was saved")
+
+
+def serialize(content: Any) -> tuple:
+    """The content as text and its type, pydantic models, dicts and lists as json"""
+    if hasattr(content, "model_dump_json"):
+        return content.model_dump_json(), "json"
+    if isinstance(content, (dict, list)):
+        return json.dumps(content, ensure_ascii=False), "json"
+    return str(content), "txt"
+
+
+def run_context(config: Optional[RunnableConfig]) -> tuple:
+    """The run id and node name of a graph node from the config it was called with"""
+    config = config or {}
+    run_id = config.get("configurable", {}).get("thread_id") or "unscoped"
+    node = config.get("metadata", {}).get("langgraph_node") or "unknown"
+    return run_id, node
+
+
+class ArtifactStore:
+    """
+    Keeps the intermediate results of every run (thesis, research, outlines, drafts ...) in a
+    directory per run, `<root>/<run_id>/<id>-<node>-<name>.<ext>[.gz]`, with a SQLite index to find
+    them by run, topic or node. save() only queues the content: compressing and writing it happens
+    on the store's writer thread, so the graph nodes never wait on the disk.
+    """
+
+    def __init__(self, root: str = "artifacts", compression: str = "gzip"):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Invalid artifact compression '{compression}', expected one of {COMPRESSIONS}")
+        self.logger = logger
+        self.root = root
+        self.compression = compression
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS artifacts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id TEXT,
+                topic TEXT,
+                node TEXT,
+                name TEXT,
+                path TEXT,
+                content_type TEXT,
+                size INTEGER,
+                stored_size INTEGER,
+                created_at REAL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS artifacts_run ON artifacts (run_id, id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS artifacts_node ON artifacts (node)")
+        self.conn.commit()
+        self.pending: queue.Queue = queue.Queue()
+        self.writer = threading.Thread(target=self.write_pending, name="artifact-writer", daemon=True)
+        self.writer.start()
+        self.logger.info(f"Initialized ArtifactStore at {root} ({compression})")
+
+    def save(self, run_id: str, node: str, name: str, content: Any, topic: str = ""):
+        """
+        Queues an artifact to be written. The content is serialized here, so the caller can keep
+        changing the object it came from.
+        """
+        text, content_type = serialize(content)
+        self.pending.put((run_id, topic or "", node, name, text, content_type, time.time()))
+
+    def save_from_node(self, config: Optional[RunnableConfig], name: str, content: Any, topic: str = ""):
+        """save() for the run and node of the config a graph node was called with"""
+        run_id, node = run_context(config)
+        self.save(run_id, node, name, content, topic)
+
+    def write_pending(self):
+        while True:
+            item = self.pending.get()
+            try:
+                self.write(*item)
+            except Exception as e:
+                self.logger.error(f"Failed to write artifact {item[3]} of run {item[0]}: {str(e)}")
+            finally:
+                self.pending.task_done()
+
+    def write(self, run_id: str, topic: str, node: str, name: str, text: str, content_type: str, created_at: float):
+        data = text.encode("utf-8")
+        stored = gzip.compress(data) if self.compression == "gzip" else data
+        with self.lock:
+            cur = self.conn.execute(
+                "INSERT INTO artifacts (run_id, topic, node, name, content_type, size, stored_size, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, topic, node, name, content_type, len(data), len(stored), created_at),
+            )
+            artifact_id = cur.lastrowid
+            filename = f"{artifact_id:05d}-{safe_name(node)}-{safe_name(name)}.{content_type}" + (".gz" if self.compression == "gzip" else "")
+            path = os.path.join(safe_name(run_id), filename)
+            os.makedirs(os.path.join(self.root, safe_name(run_id)), exist_ok=True)
+            with open(os.path.join(self.root, path), "wb") as f:
+                f.write(stored)
+            self.conn.execute("UPDATE artifacts SET path = ? WHERE id = ?", (path, artifact_id))
+            self.conn.commit()
+
+    def flush(self):
+        """Waits until every queued artifact is written"""
+        self.pending.join()
+
+    def find(self, run_id: Optional[str] = None, topic: Optional[str] = None, node: Optional[str] = None, name: Optional[str] = None) -> List[Artifact]:
+        """
+        The artifacts written so far, oldest first. topic matches any part of the run's article idea.
+        """
+        conditions, params = [], []
+        for column, value in (("run_id", run_id), ("node", node), ("name", name)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if topic:
+            conditions.append("topic LIKE ?")
+            params.append(f"%{topic}%")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, run_id, topic, node, name, path, content_type, size, stored_size, created_at FROM artifacts {where} ORDER BY id",
+                params,
+            ).fetchall()
+        fields = list(Artifact.model_fields)
+        return [Artifact(**dict(zip(fields, row))) for row in rows if row[5]]
+
+    def get(self, artifact_id: int) -> Optional[Artifact]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, run_id, topic, node, name, path, content_type, size, stored_size, created_at FROM artifacts WHERE id = ? AND path IS NOT NULL",
+                (artifact_id,),
+            ).fetchone()
+        return Artifact(**dict(zip(Artifact.model_fields, row))) if row else None
+
+    def read(self, artifact: Artifact) -> str:
+        with open(os.path.join(self.root, artifact.path), "rb") as f:
+            data = f.read()
+        return (gzip.decompress(data) if artifact.path.endswith(".gz") else data).decode("utf-8")
+
+
+def safe_name(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", value)[:100]
+
+
+store: Optional[ArtifactStore] = None
+store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """The process wide artifact store in ARTIFACT_DIR"""
+    global store
+    with store_lock:
+        if store is None:
+            store = ArtifactStore(ARTIFACT_DIR, ARTIFACT_COMPRESSION)
+            # write what's still queued before the process exits
+            atexit.register(store.flush)
+        return store
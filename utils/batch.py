@@ -0,0 +1,140 @@
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Tuple
+from pydantic import BaseModel, Field
+from utils.logger import setup_logger
+
+logger = setup_logger("BatchRunner")
+
+
+class StageUtilization(BaseModel):
+    runs: int = Field(default=0, description="How many times the stage (graph node) ran")
+    busy_seconds: float = Field(default=0, description="Total time spent in the stage across all the runs")
+    mean_seconds: float = Field(default=0, description="Average time of one run of the stage")
+    utilization: float = Field(default=0, description="Share of the batch's worker capacity (elapsed time x concurrency) spent in the stage, nodes that run in parallel within a post each count in full")
+
+
+class BatchReport(BaseModel):
+    topics: int = Field(description="Number of distinct topics that were run")
+    duplicates: int = Field(description="Number of requested topics that were duplicates of another one")
+    succeeded: int = Field(description="Number of posts that were created")
+    failed: int = Field(description="Number of topics that failed")
+    concurrency: int = Field(description="Number of posts created at once")
+    elapsed_seconds: float = Field(description="Wall time of the whole batch")
+    posts_per_hour: float = Field(description="Throughput of the batch in created posts per hour")
+    stages: Dict[str, StageUtilization] = Field(description="Time spent in each graph node, busiest first")
+
+
+def topic_key(topic: str) -> str:
+    """Topics that only differ in case or whitespace are the same topic"""
+    return " ".join(topic.split()).casefold()
+
+
+def dedupe_topics(topics: List[str]) -> List[Tuple[str, List[int]]]:
+    """
+    Returns each distinct topic once (the first spelling of it) with the positions it had in the request
+    """
+    positions: Dict[str, Tuple[str, List[int]]] = {}
+    for i, topic in enumerate(topics):
+        positions.setdefault(topic_key(topic), (topic.strip(), []))[1].append(i)
+    return list(positions.values())
+
+
+class BatchRunner:
+    """
+    Creates blog posts for a list of topics, at most `concurrency` at once.
+
+    stream_fn(topic, run_id) runs one post and yields the Supervisor.stream_blogpost events, the
+    node_start / node_end events are used to time every stage. All the runs go through the same
+    Supervisor, so the system prompts and author personality are loaded once for the whole batch.
+    """
+
+    def __init__(self, stream_fn: Callable[[str, str], Iterator[dict]], concurrency: int):
+        self.logger = logger
+        self.stream_fn = stream_fn
+        self.concurrency = max(concurrency, 1)
+        self.busy: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def run(self, topics: List[str]) -> Iterator[dict]:
+        """
+        Runs the distinct topics and yields events:
+            - topic_result: {"event", "topic", "positions", "run_id", "status", "seconds", "result" or "error"}
+              as each topic finishes; a failed topic can be continued with its run_id
+            - batch_report: {"event", "report"} with the BatchReport, always the last event
+        """
+        distinct = dedupe_topics(topics)
+        self.logger.info(f"Running a batch of {len(distinct)} topics ({len(topics) - len(distinct)} duplicates) with concurrency {self.concurrency}")
+        results: queue.Queue = queue.Queue()
+        started = time.perf_counter()
+        succeeded = failed = 0
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="blogbatch")
+        try:
+            for topic, positions in distinct:
+                executor.submit(self.run_topic, topic, positions, results)
+            for _ in distinct:
+                event = results.get()
+                if event["status"] == "succeeded":
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield event
+        finally:
+            # if the caller stops listening, don't start the topics that are still queued
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        report = self.report(len(distinct), len(topics) - len(distinct), succeeded, failed, time.perf_counter() - started)
+        self.logger.info(f"Batch done: {succeeded} posts, {failed} failed in {report.elapsed_seconds:.0f}s ({report.posts_per_hour:.1f} posts/hour)")
+        yield {"event": "batch_report", "report": report}
+
+    def run_topic(self, topic: str, positions: List[int], results: queue.Queue):
+        run_id = uuid.uuid4().hex
+        event = {"event": "topic_result", "topic": topic, "positions": positions, "run_id": run_id}
+        node_started: Dict[Tuple[str, str], float] = {}
+        started = time.perf_counter()
+        try:
+            for progress in self.stream_fn(topic, run_id):
+                # the top level nodes are the subgraphs wrapping the real stages, only time the nodes inside them
+                if progress["event"] in ("node_start", "node_end") and progress["namespace"]:
+                    key = (progress["namespace"], progress["node"])
+                    if progress["event"] == "node_start":
+                        node_started[key] = time.perf_counter()
+                    elif key in node_started:
+                        self.add_stage_time(progress["node"], time.perf_counter() - node_started.pop(key))
+                elif progress["event"] == "result":
+                    event.update(status="succeeded", result=progress["state"])
+        except Exception as e:
+            self.logger.error(f"Topic '{topic}' failed: {str(e)}")
+            event.update(status="failed", error=str(e))
+        event.setdefault("status", "failed")
+        event["seconds"] = round(time.perf_counter() - started, 3)
+        results.put(event)
+
+    def add_stage_time(self, node: str, seconds: float):
+        with self.lock:
+            self.busy[node] += seconds
+            self.counts[node] += 1
+
+    def report(self, topics: int, duplicates: int, succeeded: int, failed: int, elapsed: float) -> BatchReport:
+        capacity = max(elapsed * self.concurrency, 1e-9)
+        with self.lock:
+            stages = {
+                node: StageUtilization(runs=self.counts[node],
+                                       busy_seconds=round(busy, 3),
+                                       mean_seconds=round(busy / self.counts[node], 3),
+                                       utilization=round(busy / capacity, 4))
+                for node, busy in sorted(self.busy.items(), key=lambda item: item[1], reverse=True)
+            }
+        return BatchReport(topics=topics,
+                           duplicates=duplicates,
+                           succeeded=succeeded,
+                           failed=failed,
+                           concurrency=self.concurrency,
+                           elapsed_seconds=round(elapsed, 3),
+                           posts_per_hour=round(succeeded * 3600 / elapsed, 2) if elapsed > 0 else 0,
+                           stages=stages)
@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import threading
+from typing import Optional
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+from utils.logger import setup_logger
+from utils.envvars import CHECKPOINT_BACKEND, CHECKPOINT_PATH
+
+logger = setup_logger("Checkpoints")
+
+checkpointer: Optional[BaseCheckpointSaver] = None
+checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer() -> BaseCheckpointSaver:
+    """
+    The process wide checkpointer the graphs are compiled with. 'sqlite' keeps the checkpoints of
+    every run in CHECKPOINT_PATH so a failed run can be resumed after a restart, 'memory' only until
+    the process exits.
+    """
+    global checkpointer
+    with checkpointer_lock:
+        if checkpointer is None:
+            if CHECKPOINT_BACKEND == "sqlite":
+                if os.path.dirname(CHECKPOINT_PATH):
+                    os.makedirs(os.path.dirname(CHECKPOINT_PATH), exist_ok=True)
+                checkpointer = SqliteSaver(sqlite3.connect(CHECKPOINT_PATH, check_same_thread=False))
+                logger.info(f"Checkpointing runs to {CHECKPOINT_PATH}")
+            elif CHECKPOINT_BACKEND == "memory":
+                checkpointer = MemorySaver()
+                logger.info("Checkpointing runs in memory")
+            else:
+                raise ValueError(f"Invalid checkpoint backend '{CHECKPOINT_BACKEND}', expected 'sqlite' or 'memory'")
+        return checkpointer
+
+
+def delete_run_checkpoints(saver: BaseCheckpointSaver, run_id: str):
+    """
+    Removes every checkpoint of a run (including the ones of its subgraphs)
+    """
+    if isinstance(saver, SqliteSaver):
+        with saver.cursor() as cur:
+            cur.execute("DELETE FROM checkpoints WHERE thread_id = ?", (run_id,))
+            cur.execute("DELETE FROM writes WHERE thread_id = ?", (run_id,))
+    elif isinstance(saver, MemorySaver):
+        saver.storage.pop(run_id, None)
+        for key in [key for key in saver.writes if key[0] == run_id]:
+            saver.writes.pop(key, None)
@@ -0,0 +1,155 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+from pydantic import BaseModel, Field
+from utils.logger import setup_logger
+
+logger = setup_logger("ContentCache")
+
+
+class CachedPage(BaseModel):
+    url: str = Field(description="The url of the page")
+    html: str = Field(default="", description="The raw html of the page")
+    markdown: str = Field(default="", description="The page converted to markdown")
+    markdown_version: Optional[str] = Field(default=None, description="Version of the conversion that made the markdown, None before versions were stored")
+    etag: Optional[str] = Field(default=None, description="The ETag header the page was served with")
+    last_modified: Optional[str] = Field(default=None, description="The Last-Modified header the page was served with")
+    fetched_at: float = Field(default=0, description="Unix time the page was last fetched or revalidated")
+
+
+class ContentCache:
+    """
+    Persistent cache of fetched web pages, keyed by url and stored in SQLite.
+
+    Both the raw html and the converted markdown are kept (zlib compressed), the markdown with the
+    version of the conversion that made it so it can be redone from the html. Entries younger than
+    `ttl` seconds are served as is, older ones should be revalidated with the conditional headers
+    from revalidation_headers(). When the stored size goes over `max_bytes` the least recently used
+    entries are evicted.
+    """
+
+    def __init__(self, path: str = "cache/website_content.sqlite", ttl: float = 7 * 24 * 3600, max_bytes: int = 512 * 1024 * 1024):
+        self.logger = logger
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.counts = {"hit": 0, "revalidated": 0, "miss": 0}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                html BLOB,
+                markdown BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL,
+                last_access REAL,
+                size INTEGER
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access)")
+        # caches made before the markdown was versioned
+        if "markdown_version" not in [column[1] for column in self.conn.execute("PRAGMA table_info(pages)")]:
+            self.conn.execute("ALTER TABLE pages ADD COLUMN markdown_version TEXT")
+        self.conn.commit()
+        self.logger.info(f"Initialized ContentCache at {path}")
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """
+        Returns the cached page for the url, fresh or stale, or None if it was never cached
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT html, markdown, markdown_version, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE pages SET last_access = ? WHERE url = ?", (time.time(), url))
+            self.conn.commit()
+        html, markdown, markdown_version, etag, last_modified, fetched_at = row
+        return CachedPage(url=url,
+                          html=zlib.decompress(html).decode("utf-8"),
+                          markdown=zlib.decompress(markdown).decode("utf-8"),
+                          markdown_version=markdown_version,
+                          etag=etag,
+                          last_modified=last_modified,
+                          fetched_at=fetched_at)
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        return time.time() - page.fetched_at < self.ttl
+
+    def revalidation_headers(self, page: CachedPage) -> Dict[str, str]:
+        """
+        Conditional request headers that let the server answer 304 Not Modified if the page did not change
+        """
+        headers = {}
+        if page.etag:
+            headers["If-None-Match"] = page.etag
+        if page.last_modified:
+            headers["If-Modified-Since"] = page.last_modified
+        return headers
+
+    def record(self, outcome: str):
+        """
+        Counts a lookup outcome: 'hit' (served fresh), 'revalidated' (served after a 304) or 'miss' (downloaded)
+        """
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def touch(self, url: str):
+        """
+        Marks a cached page as fetched now, after the server confirmed it did not change
+        """
+        with self.lock:
+            self.conn.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self.conn.commit()
+
+    def put(self, url: str, html: str, markdown: str, etag: Optional[str] = None, last_modified: Optional[str] = None,
+            markdown_version: Optional[str] = None):
+        html_blob = zlib.compress(html.encode("utf-8"))
+        markdown_blob = zlib.compress(markdown.encode("utf-8"))
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (url, html, markdown, markdown_version, etag, last_modified, fetched_at, last_access, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, html_blob, markdown_blob, markdown_version, etag, last_modified, now, now, len(html_blob) + len(markdown_blob)),
+            )
+            self.evict()
+            self.conn.commit()
+
+    def update_markdown(self, url: str, markdown: str, markdown_version: str):
+        """
+        Replaces the markdown of a cached page, converted again from its html by another version of the conversion
+        """
+        markdown_blob = zlib.compress(markdown.encode("utf-8"))
+        with self.lock:
+            self.conn.execute("UPDATE pages SET markdown = ?, markdown_version = ?, size = LENGTH(html) + ? WHERE url = ?",
+                              (markdown_blob, markdown_version, len(markdown_blob), url))
+            self.conn.commit()
+
+    def evict(self):
+        """
+        Deletes the least recently used pages until the cache fits in max_bytes, call with the lock held
+        """
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute("SELECT url, size FROM pages ORDER BY last_access").fetchall()
+        evicted = 0
+        for url, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            total -= size
+            evicted += 1
+        self.logger.info(f"Evicted {evicted} pages from the content cache")
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.counts)
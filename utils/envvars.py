@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -5,6 +6,25 @@ from dotenv import load_dotenv
 dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
 load_dotenv(dotenv_path)
 
+# Record/replay of every LLM and HTTP response: 'off', 'record' (run live and save them) or 'replay' (serve them, no network)
+FIXTURE_MODE = os.getenv('FIXTURE_MODE', 'off')
+FIXTURE_DIR = os.getenv('FIXTURE_DIR', 'fixtures/default')
+# On replay, sleep for the recorded latency times this factor (0 = no simulated latency)
+FIXTURE_LATENCY_SCALE = float(os.getenv('FIXTURE_LATENCY_SCALE', '0'))
+# Settings that are saved with a recording so a replay uses the same models, the API keys are never saved
+FIXTURE_SETTINGS = ['PERSONALITY', 'LLM_CLAUDE_SONNET', 'LLM_GPT_4O']
+FIXTURE_SECRETS = ['OPENAI_API_KEY', 'ANTHROPIC_API_KEY', 'GITHUB_TOKEN', 'PPLX_API_KEY', 'GOOGLE_API_KEY']
+
+if FIXTURE_MODE == 'replay':
+    # a replay needs no credentials, fill in the recorded settings and placeholder keys
+    manifest_path = os.path.join(FIXTURE_DIR, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            for var, value in json.load(f).get('settings', {}).items():
+                os.environ[var] = value
+    for var in FIXTURE_SECRETS:
+        os.environ.setdefault(var, 'replay')
+
 # Define constants from environment variables
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
@@ -14,6 +34,98 @@ PERSONALITY = os.getenv('PERSONALITY')
 LLM_CLAUDE_SONNET = os.getenv('LLM_CLAUDE_SONNET')
 LLM_GPT_4O = os.getenv('LLM_GPT_4O')
 
+# Optional settings
+# How the Writer graph runs revise_intro / revise_body / revise_conclusion: 'parallel' or 'sequential'
+WRITER_REVISION_MODE = os.getenv('WRITER_REVISION_MODE', 'parallel')
+# What each revise call sends: 'section' (only its intro/body/conclusion span plus some context around it) or 'article' (the whole article)
+WRITER_REVISION_SCOPE = os.getenv('WRITER_REVISION_SCOPE', 'section')
+# Characters of the neighbouring text sent with a section on each side
+WRITER_REVISION_CONTEXT_CHARS = int(os.getenv('WRITER_REVISION_CONTEXT_CHARS', '600'))
+# Candidate outlines created at once in each create_outline round (1 = a single outline), the evaluator picks the best one in the same call it evaluates it
+OUTLINE_CANDIDATES = int(os.getenv('OUTLINE_CANDIDATES', '1'))
+# Temperatures the other candidates are created with, in turn (the first one is made like a single outline)
+OUTLINE_CANDIDATE_TEMPERATURES = [float(t) for t in os.getenv('OUTLINE_CANDIDATE_TEMPERATURES', '1.0,0.4').split(',') if t.strip()]
+# Logging: level of the app's loggers, and the log file in LOG_DIR ('json' records or 'text' lines) rotated
+# at midnight ('time') or at LOG_MAX_MB ('size'), keeping LOG_BACKUP_COUNT old files
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_DIR = os.getenv('LOG_DIR', 'logs')
+LOG_FILE_FORMAT = os.getenv('LOG_FILE_FORMAT', 'json')
+LOG_ROTATION = os.getenv('LOG_ROTATION', 'time')
+LOG_MAX_MB = int(os.getenv('LOG_MAX_MB', '50'))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '14'))
+# Longer log messages (article drafts, research) are cut to this many characters, 0 = never
+LOG_MAX_MESSAGE_CHARS = int(os.getenv('LOG_MAX_MESSAGE_CHARS', '2000'))
+# The system prompts and personality read from GitHub are kept in GITHUB_CACHE_DIR and in memory, and read again
+# (revalidated with their ETag) once older than GITHUB_CACHE_TTL_SECONDS
+GITHUB_CACHE_DIR = os.getenv('GITHUB_CACHE_DIR', 'cache/github')
+GITHUB_CACHE_TTL_SECONDS = float(os.getenv('GITHUB_CACHE_TTL_SECONDS', '3600'))
+GITHUB_TIMEOUT_SECONDS = float(os.getenv('GITHUB_TIMEOUT_SECONDS', '10'))
+# Fetch the pages the research cites and add the chunks of them most relevant to each outline, blog post and revise call
+# to its prompt: at most RETRIEVAL_TOP_K chunks of RETRIEVAL_CHUNK_CHARS, about RETRIEVAL_TOKEN_BUDGET tokens in all
+RETRIEVAL_ENABLED = os.getenv('RETRIEVAL_ENABLED', 'true').lower() == 'true'
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '8'))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv('RETRIEVAL_TOKEN_BUDGET', '3000'))
+RETRIEVAL_CHUNK_CHARS = int(os.getenv('RETRIEVAL_CHUNK_CHARS', '1200'))
+# When the app builds the Supervisor: 'background' (warm-up thread at startup), 'lazy' (first request) or 'eager' (at import)
+STARTUP_MODE = os.getenv('STARTUP_MODE', 'background')
+# Number of blog post jobs that run at once, and how many more can wait before new jobs get a 429
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', '10'))
+# What the evaluator resends of earlier evaluation rounds: 'full', 'window', 'summary' or 'diff' (see utils/eval_history.py)
+EVALUATOR_HISTORY_POLICY = os.getenv('EVALUATOR_HISTORY_POLICY', 'diff')
+EVALUATOR_HISTORY_WINDOW = int(os.getenv('EVALUATOR_HISTORY_WINDOW', '1'))
+EVALUATOR_MAX_PROMPT_TOKENS = int(os.getenv('EVALUATOR_MAX_PROMPT_TOKENS', '32000'))
+EVALUATOR_FEEDBACK_CHARS = int(os.getenv('EVALUATOR_FEEDBACK_CHARS', '1500'))
+# /create/blogposts: posts created at once per batch (a request can ask for fewer) and the most topics in one batch
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))
+BATCH_MAX_TOPICS = int(os.getenv('BATCH_MAX_TOPICS', '100'))
+# Process wide limits of the calls to each LLM provider: requests and tokens (prompt + completion) per minute (0 = no limit)
+# and the most calls in flight, which halves on every 429/529 and grows back as calls succeed
+ANTHROPIC_RPM = int(os.getenv('ANTHROPIC_RPM', '50'))
+ANTHROPIC_TPM = int(os.getenv('ANTHROPIC_TPM', '80000'))
+ANTHROPIC_MAX_CONCURRENCY = int(os.getenv('ANTHROPIC_MAX_CONCURRENCY', '8'))
+GEMINI_RPM = int(os.getenv('GEMINI_RPM', '10'))
+GEMINI_TPM = int(os.getenv('GEMINI_TPM', '1000000'))
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '4'))
+PERPLEXITY_RPM = int(os.getenv('PERPLEXITY_RPM', '50'))
+PERPLEXITY_TPM = int(os.getenv('PERPLEXITY_TPM', '0'))
+PERPLEXITY_MAX_CONCURRENCY = int(os.getenv('PERPLEXITY_MAX_CONCURRENCY', '8'))
+# How many times a call rejected with a rate limit / overload error is retried (after the provider's retry-after)
+RATE_LIMIT_MAX_RETRIES = int(os.getenv('RATE_LIMIT_MAX_RETRIES', '6'))
+# Completion tokens booked against the tokens/min limits for each call until its actual usage is known (at most its max_tokens)
+RATE_LIMIT_COMPLETION_TOKENS = int(os.getenv('RATE_LIMIT_COMPLETION_TOKENS', '2000'))
+# Where the intermediate results of every run (thesis, research, outlines, drafts) are kept, one directory per run, and
+# whether they're stored 'gzip' compressed or as they are ('none')
+ARTIFACT_DIR = os.getenv('ARTIFACT_DIR', 'artifacts')
+ARTIFACT_COMPRESSION = os.getenv('ARTIFACT_COMPRESSION', 'gzip')
+# Where the graph checkpoints of each run are kept so failed runs can be resumed: 'sqlite' (CHECKPOINT_PATH) or 'memory'
+CHECKPOINT_BACKEND = os.getenv('CHECKPOINT_BACKEND', 'sqlite')
+CHECKPOINT_PATH = os.getenv('CHECKPOINT_PATH', 'cache/checkpoints.sqlite')
+# Keep the checkpoints of runs that succeeded (they're only needed to resume failed ones)
+CHECKPOINT_KEEP_SUCCEEDED = os.getenv('CHECKPOINT_KEEP_SUCCEEDED', 'false').lower() == 'true'
+# Research web pages are converted to markdown in EXTRACT_WORKERS processes (0 = in the fetching thread), keeping at most EXTRACT_MAX_CHARS of each
+EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', '2'))
+EXTRACT_MAX_CHARS = int(os.getenv('EXTRACT_MAX_CHARS', '40000'))
+# On-disk cache of fetched research web pages, set CONTENT_CACHE_ENABLED=false to always download
+CONTENT_CACHE_ENABLED = os.getenv('CONTENT_CACHE_ENABLED', 'true').lower() == 'true'
+CONTENT_CACHE_PATH = os.getenv('CONTENT_CACHE_PATH', 'cache/website_content.sqlite')
+CONTENT_CACHE_TTL_SECONDS = float(os.getenv('CONTENT_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+CONTENT_CACHE_MAX_MB = int(os.getenv('CONTENT_CACHE_MAX_MB', '512'))
+# Reuse the research of an earlier run whose thesis is at least RESEARCH_REUSE_THRESHOLD similar (0 to 1, estimated
+# Jaccard similarity of the theses' words and word pairs) and at most RESEARCH_REUSE_MAX_AGE_DAYS old, instead of asking
+# Perplexity again. Off by default: the similarity is lexical, two theses with the same words can still argue different things
+RESEARCH_REUSE_ENABLED = os.getenv('RESEARCH_REUSE_ENABLED', 'false').lower() == 'true'
+RESEARCH_REUSE_PATH = os.getenv('RESEARCH_REUSE_PATH', 'cache/research.sqlite')
+RESEARCH_REUSE_THRESHOLD = float(os.getenv('RESEARCH_REUSE_THRESHOLD', '0.6'))
+RESEARCH_REUSE_MAX_AGE_DAYS = float(os.getenv('RESEARCH_REUSE_MAX_AGE_DAYS', '7'))
+RESEARCH_REUSE_MAX_ENTRIES = int(os.getenv('RESEARCH_REUSE_MAX_ENTRIES', '1000'))
+# Exact-match cache of LLM responses. Call sites: construct_thesis, create_outline, create_blog_post, revise, perplexity_query, evaluator
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', 'cache/llm_responses.sqlite')
+LLM_CACHE_TTL_SECONDS = float(os.getenv('LLM_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000'))
+LLM_CACHE_SITES = [site.strip() for site in os.getenv('LLM_CACHE_SITES', 'construct_thesis,create_outline,perplexity_query').split(',') if site.strip()]
+
 # Validate required variables
 required_vars = ['OPENAI_API_KEY', 'ANTHROPIC_API_KEY', 'GITHUB_TOKEN', 'PPLX_API_KEY', 'PERSONALITY', 'LLM_CLAUDE_SONNET', 'LLM_GPT_4O']
 missing_vars = [var for var in required_vars if not globals()[var]]
@@ -0,0 +1,134 @@
+import difflib
+from typing import Dict, List, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from utils.utils import message_text
+from utils.text_history import TextHistory
+
+HISTORY_POLICIES = ("full", "window", "summary", "diff")
+CHARS_PER_TOKEN = 4
+TRUNCATION_NOTE = "\n[... truncated to fit the request size limit]"
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Rough token count of the messages, about 4 characters per token"""
+    return sum(len(message_text(message)) for message in messages) // CHARS_PER_TOKEN
+
+
+def document_prompt(instruction: str, document: str) -> HumanMessage:
+    """
+    Evaluation prompt with the instruction and the evaluated document (outline or article) as separate
+    text parts, so the history policies can tell them apart later
+    """
+    return HumanMessage(content=[{"type": "text", "text": instruction}, {"type": "text", "text": document}])
+
+
+def document_ref(instruction: str, version: int) -> HumanMessage:
+    """
+    Stored form of a prompt made by document_prompt, with the document replaced by its version number
+    in the evaluation's documents history so the transcript doesn't hold a full copy of every version
+    """
+    return HumanMessage(content=[{"type": "text", "text": instruction}, {"type": "text", "text": "", "document_version": version}])
+
+
+def inflate(transcript: List[BaseMessage], documents: TextHistory) -> List[BaseMessage]:
+    """The transcript with every document reference replaced by the document it points to"""
+    versions = None
+    inflated = []
+    for message in transcript:
+        if isinstance(message.content, list) and len(message.content) == 2 and "document_version" in message.content[1]:
+            versions = versions or documents.versions()
+            message = document_prompt(message.content[0]["text"], versions[message.content[1]["document_version"]])
+        inflated.append(message)
+    return inflated
+
+
+def split_prompt(message: BaseMessage) -> Tuple[str, str]:
+    """Returns the instruction and document of a prompt made by document_prompt"""
+    if isinstance(message.content, list) and len(message.content) == 2:
+        return message.content[0]["text"], message.content[1]["text"]
+    return message_text(message), ""
+
+
+def truncate(text: str, max_chars: int) -> str:
+    return text if len(text) <= max_chars else text[:max_chars] + TRUNCATION_NOTE
+
+
+class EvaluationHistory:
+    """
+    Builds the request sent to the evaluator LLM from the full evaluation transcript
+    [system, prompt 1, reply 1, ..., prompt n] with one of these policies:
+        full     the whole transcript (every earlier version of the document and every reply)
+        window   the system prompt, the last `window` prompt/reply rounds and the new prompt
+        summary  the system prompt and the new prompt, with the earlier feedback recapped in front of it
+        diff     the previous round in full, then the new prompt with only a diff of the document against
+                 the previous version; falls back to summary when the diff prompt (with its instruction)
+                 isn't smaller than the new prompt
+    Every request is capped at `max_tokens`: the oldest rounds are dropped first, then the new document is truncated.
+    A diff request over the cap is sent as a summary instead, its previous round is the base of the diff and can't be dropped.
+    """
+
+    def __init__(self, policy: str, window: int, max_tokens: int, feedback_chars: int):
+        if policy not in HISTORY_POLICIES:
+            raise ValueError(f"Invalid evaluator history policy '{policy}', expected one of {HISTORY_POLICIES}")
+        self.policy = policy
+        self.window = window
+        self.max_tokens = max_tokens
+        self.feedback_chars = feedback_chars
+
+    def record(self, transcript: List[BaseMessage], documents: TextHistory, prompt: HumanMessage):
+        """Adds a prompt made by document_prompt to the stored transcript, keeping its document in documents"""
+        instruction, document = split_prompt(prompt)
+        documents.append(document)
+        transcript.append(document_ref(instruction, len(documents) - 1))
+
+    def build(self, transcript: List[BaseMessage], documents: TextHistory) -> Tuple[List[BaseMessage], Dict[str, int]]:
+        """
+        Returns the capped request for the configured policy, and the estimated tokens of the
+        request every policy would have sent (uncapped) so their savings can be compared
+        """
+        transcript = inflate(transcript, documents)
+        estimates = {policy: estimate_tokens(self.build_for(policy, transcript)) for policy in HISTORY_POLICIES}
+        request = self.build_for(self.policy, transcript)
+        if self.policy == "diff" and estimate_tokens(request) > self.max_tokens:
+            request = self.build_for("summary", transcript)
+        return self.cap(request), estimates
+
+    def build_for(self, policy: str, transcript: List[BaseMessage]) -> List[BaseMessage]:
+        system, history, new_prompt = transcript[0], transcript[1:-1], transcript[-1]
+        if policy == "full" or not history:
+            return list(transcript)
+        if policy == "window":
+            return [system] + history[-2 * self.window:] + [new_prompt]
+        if policy == "diff":
+            previous_prompt, previous_reply = history[-2], history[-1]
+            _, previous_document = split_prompt(previous_prompt)
+            instruction, document = split_prompt(new_prompt)
+            diff = "\n".join(difflib.unified_diff(previous_document.splitlines(), document.splitlines(),
+                                                  "previous version", "new version", lineterm=""))
+            changes = f"{instruction}\nOnly the changes since the version you last evaluated are shown, as a unified diff:\n"
+            diff_prompt = document_prompt(changes, diff)
+            if previous_document and estimate_tokens([diff_prompt]) < estimate_tokens([new_prompt]):
+                return [system, previous_prompt, previous_reply, diff_prompt]
+        return [system, self.recap(history, new_prompt)]
+
+    def recap(self, history: List[BaseMessage], new_prompt: BaseMessage) -> HumanMessage:
+        """The new prompt with the feedback of the earlier rounds, shortened, in front of it"""
+        feedback = [
+            f"Round {i + 1}: {truncate(message_text(reply), self.feedback_chars)}"
+            for i, reply in enumerate(m for m in history if isinstance(m, AIMessage))
+        ]
+        instruction, document = split_prompt(new_prompt)
+        recap = "Your feedback on the earlier versions was:\n" + "\n\n".join(feedback) + "\n\n"
+        return document_prompt(recap + instruction, document)
+
+    def cap(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        messages = list(messages)
+        # drop whole prompt/reply rounds, oldest first, keeping the system prompt and the new prompt
+        while estimate_tokens(messages) > self.max_tokens and len(messages) > 3:
+            del messages[1:3]
+        overflow = estimate_tokens(messages) - self.max_tokens
+        if overflow > 0:
+            instruction, document = split_prompt(messages[-1])
+            keep = max(len(document) - overflow * CHARS_PER_TOKEN - len(TRUNCATION_NOTE), 0)
+            messages[-1] = document_prompt(instruction, truncate(document, keep))
+        return messages
@@ -0,0 +1,114 @@
+import glob
+import os
+import random
+import sqlite3
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+from bs4 import BeautifulSoup
+import html2text
+from utils.envvars import CONTENT_CACHE_PATH, EXTRACT_MAX_CHARS, EXTRACT_WORKERS
+from utils.html_extract import extract_markdown, get_extraction_pool
+
+WORDS = ("agent graph model prompt token latency cache research article outline draft writer evaluator thesis author "
+         "voice reader system memory state python request response network parallel revise section summary data").split()
+SYNTHETIC_PAGES = 20
+
+
+def previous_markdown(html: str) -> str:
+    """The conversion WebsiteContentTool used before: parse, serialize the whole tree back and run html2text on it"""
+    soup = BeautifulSoup(html, 'html.parser')
+    converter = html2text.HTML2Text()
+    converter.ignore_links = False
+    converter.ignore_images = False
+    return converter.handle(str(soup))
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def synthetic_page(rng: random.Random) -> str:
+    """A heavy page the way news and blog sites serve them: scripts, menus, sidebars and comments around a short article"""
+    scripts = "".join(f"<script>var config{i} = {{{', '.join(f'k{j}: {j}' for j in range(300))}}};</script>" for i in range(20))
+    menu = "".join(f"<li><a href='/section/{i}'>{sentence(rng, 2)}</a></li>" for i in range(150))
+    article = "".join(f"<h2>{sentence(rng, 5)}</h2>" + "".join(f"<p>{sentence(rng, 60)} <a href='https://example.com/{i}'>{sentence(rng, 3)}</a></p>" for i in range(6))
+                      for _ in range(8))
+    sidebar = "".join(f"<div class='widget'><h3>{sentence(rng, 3)}</h3><p>{sentence(rng, 30)}</p></div>" for _ in range(40))
+    comments = "".join(f"<div class='comment'><p>{sentence(rng, 40)}</p></div>" for _ in range(100))
+    return (f"<html><head><title>{sentence(rng, 6)}</title><style>{'.c{color:red}' * 2000}</style>{scripts}</head><body>"
+            f"<header><nav><ul>{menu}</ul></nav></header><main><article><h1>{sentence(rng, 8)}</h1>{article}</article>"
+            f"<section id='comments'>{comments}</section></main><aside class='sidebar'>{sidebar}</aside>"
+            f"<div class='cookie-banner'>{sentence(rng, 40)}</div><footer>{menu}</footer></body></html>")
+
+
+def load_corpus(corpus_dir: str = "") -> Dict[str, List[str]]:
+    """
+    The pages to benchmark on: the *.html files of corpus_dir if given, otherwise the pages in the
+    content cache, otherwise synthetic ones
+    """
+    if corpus_dir:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(corpus_dir, "*.html"))):
+            with open(path, encoding="utf-8", errors="replace") as f:
+                pages.append(f.read())
+        return {corpus_dir: pages}
+    if os.path.exists(CONTENT_CACHE_PATH):
+        conn = sqlite3.connect(CONTENT_CACHE_PATH)
+        try:
+            pages = [zlib.decompress(html).decode("utf-8") for (html,) in conn.execute("SELECT html FROM pages")]
+        finally:
+            conn.close()
+        pages = [page for page in pages if page]
+        if pages:
+            return {CONTENT_CACHE_PATH: pages}
+    rng = random.Random(0)
+    return {"synthetic": [synthetic_page(rng) for _ in range(SYNTHETIC_PAGES)]}
+
+
+def measure(convert: Callable[[str], str], pages: List[str]) -> Dict[str, float]:
+    started = time.perf_counter()
+    sizes = [len(convert(page)) for page in pages]
+    seconds = time.perf_counter() - started
+    return {"ms_per_page": seconds * 1000 / len(pages), "chars_per_page": sum(sizes) / len(pages)}
+
+
+def pool_pages_per_second(pages: List[str], workers: int, max_chars: int, threads: int = 8) -> float:
+    """Pages converted per second when `threads` fetching threads hand them to the extraction pool, as get_content_from_urls does"""
+    pool = get_extraction_pool(workers)
+    # the first call starts the workers, keep that out of the measurement
+    list(pool.map(extract_markdown, pages[:workers], [max_chars] * workers))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda page: pool.submit(extract_markdown, page, max_chars).result(), pages))
+    return len(pages) / (time.perf_counter() - started)
+
+
+def extraction_report(corpus_dir: str = "", max_chars: int = EXTRACT_MAX_CHARS, workers: int = EXTRACT_WORKERS) -> Dict[str, object]:
+    (source, pages), = load_corpus(corpus_dir).items()
+    if not pages:
+        raise ValueError(f"No pages to benchmark in '{source}'")
+    report = {
+        "source": source,
+        "pages": len(pages),
+        "html_chars_per_page": sum(len(page) for page in pages) / len(pages),
+        "previous": measure(previous_markdown, pages),
+        "single_parse": measure(lambda page: extract_markdown(page, max_chars), pages),
+    }
+    if workers > 0:
+        report["pool_pages_per_second"] = pool_pages_per_second(pages, workers, max_chars)
+    return report
+
+
+if __name__ == "__main__":
+    corpus_dir = sys.argv[1] if len(sys.argv) > 1 else ""
+    report = extraction_report(corpus_dir)
+    print(f"HTML to markdown on {report['pages']} pages from {report['source']} ({report['html_chars_per_page'] / 1024:.0f} KiB of html each):")
+    for name in ("previous", "single_parse"):
+        print(f"{report[name]['ms_per_page']:10.1f} ms/page  {report[name]['chars_per_page']:10.0f} chars/page  {name}")
+    print(f"{report['previous']['ms_per_page'] / report['single_parse']['ms_per_page']:10.2f} x   faster, "
+          f"{report['previous']['chars_per_page'] / max(report['single_parse']['chars_per_page'], 1):.2f} x less text for the prompts")
+    if "pool_pages_per_second" in report:
+        print(f"{report['pool_pages_per_second']:10.1f} pages/s with {EXTRACT_WORKERS} extraction processes")
@@ -0,0 +1,196 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+from utils.logger import setup_logger
+from utils.envvars import FIXTURE_MODE, FIXTURE_DIR, FIXTURE_LATENCY_SCALE, FIXTURE_SETTINGS
+
+logger = setup_logger("Fixtures")
+
+
+class MissingFixtureError(Exception):
+    """Raised on replay when a request was not part of the recording"""
+
+
+class FixtureBundle:
+    """
+    A directory with every LLM and HTTP response of a recorded run:
+        manifest.json       the non secret settings of the recording (models, personality)
+        llm/<key>.json      one file per LLM call, keyed by a hash of the model settings and prompt
+        http/<key>.json     one file per HTTP request, keyed by a hash of the method, url and body
+    Each entry also keeps the latency of the original call so replays can simulate it.
+    """
+
+    def __init__(self, path: str, mode: str, latency_scale: float = 0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Invalid fixture mode '{mode}', expected 'record' or 'replay'")
+        self.logger = logger
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        if mode == "record":
+            os.makedirs(os.path.join(path, "llm"), exist_ok=True)
+            os.makedirs(os.path.join(path, "http"), exist_ok=True)
+            with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as f:
+                json.dump({"recorded_at": datetime.now().isoformat(),
+                           "settings": {var: os.getenv(var) for var in FIXTURE_SETTINGS if os.getenv(var)}}, f, indent=2)
+        elif not os.path.isdir(path):
+            raise ValueError(f"Fixture bundle {path} does not exist, record it first with FIXTURE_MODE=record")
+        self.logger.info(f"Fixture bundle {path} opened for {mode}")
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def save(self, kind: str, key: str, entry: Dict[str, Any]):
+        file_path = os.path.join(self.path, kind, f"{key}.json")
+        with open(f"{file_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(f"{file_path}.tmp", file_path)
+
+    def load(self, kind: str, key: str, description: str) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.path, kind, f"{key}.json"), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            raise MissingFixtureError(f"No recorded {kind} response for {description} in {self.path}")
+        if self.latency_scale:
+            time.sleep(entry.get("latency", 0) * self.latency_scale)
+        return entry
+
+
+def llm_fixture_key(bundle: FixtureBundle, prompt: str, llm_string: str) -> str:
+    """
+    Key of an LLM call. The API endpoint settings are left out of the model settings so a replay
+    pointed at a different (or unreachable) endpoint still finds the recording.
+    """
+    serialized, _, params = llm_string.partition("---")
+    try:
+        llm = json.loads(serialized)
+        llm["kwargs"] = {k: v for k, v in llm.get("kwargs", {}).items() if not k.endswith(("api_url", "base_url", "api_base"))}
+        serialized = json.dumps(llm, sort_keys=True)
+    except ValueError:
+        pass
+    return bundle.make_key(serialized, params, prompt)
+
+
+class FixtureLLMCache(BaseCache):
+    """
+    LangChain cache that records every LLM response into the bundle (record mode, every lookup
+    misses so the real API is called) or serves them back (replay mode, a miss is an error).
+    """
+
+    def __init__(self, bundle: FixtureBundle):
+        self.bundle = bundle
+        self.started: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = llm_fixture_key(self.bundle, prompt, llm_string)
+        if self.bundle.mode == "record":
+            # lookup runs right before the API call, update right after it
+            with self.lock:
+                self.started[key] = time.perf_counter()
+            return None
+        return loads(self.bundle.load("llm", key, "LLM prompt")["generations"])
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = llm_fixture_key(self.bundle, prompt, llm_string)
+        with self.lock:
+            started = self.started.pop(key, None)
+        latency = time.perf_counter() - started if started else 0
+        self.bundle.save("llm", key, {"latency": latency, "generations": dumps(return_val)})
+
+    def clear(self, **kwargs: Any) -> None:
+        pass
+
+
+class FixtureAdapter(HTTPAdapter):
+    """
+    requests transport adapter that records responses into the bundle or replays them without any network.
+    Conditional headers are dropped so recordings always hold the full response.
+    """
+
+    def __init__(self, bundle: FixtureBundle, **kwargs):
+        super().__init__(**kwargs)
+        self.bundle = bundle
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        request.headers.pop("If-None-Match", None)
+        request.headers.pop("If-Modified-Since", None)
+        body = request.body or b""
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        key = self.bundle.make_key(request.method, request.url, hashlib.sha256(body).hexdigest())
+
+        if self.bundle.mode == "replay":
+            entry = self.bundle.load("http", key, f"{request.method} {request.url}")
+            response = requests.Response()
+            response.status_code = entry["status_code"]
+            response.reason = entry["reason"]
+            response.headers = CaseInsensitiveDict(entry["headers"])
+            response.encoding = get_encoding_from_headers(response.headers)
+            response._content = base64.b64decode(entry["content"])
+            response._content_consumed = True
+            response.url = request.url
+            response.request = request
+            return response
+
+        started = time.perf_counter()
+        response = super().send(request, **kwargs)
+        content = response.content
+        self.bundle.save("http", key, {"method": request.method,
+                                       "url": request.url,
+                                       "status_code": response.status_code,
+                                       "reason": response.reason,
+                                       "headers": dict(response.headers),
+                                       "content": base64.b64encode(content).decode("ascii"),
+                                       "latency": time.perf_counter() - started})
+        return response
+
+
+bundle: Optional[FixtureBundle] = None
+llm_cache: Optional[FixtureLLMCache] = None
+bundle_lock = threading.Lock()
+
+
+def fixtures_enabled() -> bool:
+    return FIXTURE_MODE != "off"
+
+
+def get_bundle() -> FixtureBundle:
+    global bundle
+    with bundle_lock:
+        if bundle is None:
+            bundle = FixtureBundle(FIXTURE_DIR, FIXTURE_MODE, FIXTURE_LATENCY_SCALE)
+        return bundle
+
+
+def get_fixture_llm_cache() -> FixtureLLMCache:
+    global llm_cache
+    fixture_bundle = get_bundle()
+    with bundle_lock:
+        if llm_cache is None:
+            llm_cache = FixtureLLMCache(fixture_bundle)
+        return llm_cache
+
+
+def install_http_fixtures(session: requests.Session):
+    """
+    Routes the session's requests through the fixture bundle when FIXTURE_MODE is record or replay
+    """
+    if not fixtures_enabled():
+        return
+    adapter = FixtureAdapter(get_bundle())
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
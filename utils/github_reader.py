@@ -1,8 +1,16 @@
 import requests
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 import base64
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
 from utils.logger import setup_logger
+from utils.fixtures import fixtures_enabled, install_http_fixtures
+from utils.envvars import GITHUB_CACHE_DIR, GITHUB_CACHE_TTL_SECONDS, GITHUB_TIMEOUT_SECONDS
 import os
 from dotenv import load_dotenv
 
@@ -14,71 +22,165 @@ logger = setup_logger("GithubReader")
 
 class GithubReader:
     """Utility for reading content from GitHub files"""
-    
+
+    # shared by every reader so all GitHub requests reuse the same pooled connections
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_maxsize=16))
+    # files already read by this process with the time they were fetched, keyed by GitHub url
+    memory_cache: Dict[str, Tuple[str, float]] = {}
+    memory_cache_lock = threading.Lock()
+
     def __init__(self):
         self.logger = logger
         self.base_api_url = "https://api.github.com/repos"
         self.github_token = os.getenv('GITHUB_TOKEN')
         if not self.github_token:
             self.logger.warning("No GitHub token found in environment variables")
-            
+        # persistent copies of the files, revalidated with their ETag once older than the ttl
+        self.cache_dir = GITHUB_CACHE_DIR
+        self.cache_ttl = GITHUB_CACHE_TTL_SECONDS
+        self.timeout = GITHUB_TIMEOUT_SECONDS
+        self.max_workers = 8
+
     def get_headers(self):
         """Get headers for GitHub API requests"""
         headers = {'Accept': 'application/vnd.github.v3+json'}
         if self.github_token:
             headers['Authorization'] = f'token {self.github_token}'
         return headers
-    
+
     def extract_repo_info(self, github_url: str) -> tuple[str, str, str]:
         """Extract owner, repo, and path from GitHub URL"""
         parsed = urlparse(github_url)
         parts = parsed.path.strip('/').split('/')
-        
+
         if len(parts) < 3:
             raise ValueError("Invalid GitHub URL format")
-            
+
         owner = parts[0]
         repo = parts[1]
         path = '/'.join(parts[2:]) if len(parts) > 2 else ''
-        
+
         return owner, repo, path
-    
+
+    def get_api_url(self, url: str) -> str:
+        owner, repo, path = self.extract_repo_info(url)
+
+        # Remove 'blob/main' or 'blob/master' from path
+        path = path.replace('blob/main/', '').replace('blob/master/', '')
+
+        return f"{self.base_api_url}/{owner}/{repo}/contents/{path}"
+
+    def get_cache_path(self, api_url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(api_url.encode('utf-8')).hexdigest() + '.json')
+
+    def load_cached(self, api_url: str) -> Optional[dict]:
+        if fixtures_enabled():
+            # recordings and replays always go to the (recorded) API so they don't depend on local state
+            return None
+        try:
+            with open(self.get_cache_path(api_url), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_cached(self, api_url: str, content: str, etag: Optional[str]):
+        if fixtures_enabled():
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            cache_path = self.get_cache_path(api_url)
+            tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'url': api_url, 'etag': etag, 'content': content, 'fetched_at': time.time()}, f)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            self.logger.warning(f"Could not write GitHub cache file: {str(e)}")
+
     def read_file(self, url: str) -> Optional[str]:
         """
         Fetches and returns the content of a file from GitHub using the API.
-        
+
         Args:
             url (str): GitHub URL to the file
                 (e.g., https://github.com/owner/repo/blob/main/path/to/file.txt)
-            
+
         Returns:
             Optional[str]: File content if successful, None if failed
         """
+        with self.memory_cache_lock:
+            remembered = self.memory_cache.get(url)
+        # the copy in memory expires with the ttl like the one on disk, so an updated prompt is picked up without a restart
+        if remembered and time.time() - remembered[1] < self.cache_ttl:
+            return remembered[0]
+
         try:
-            owner, repo, path = self.extract_repo_info(url)
-            
-            # Remove 'blob/main' or 'blob/master' from path
-            path = path.replace('blob/main/', '').replace('blob/master/', '')
-            
-            # Construct API URL
-            api_url = f"{self.base_api_url}/{owner}/{repo}/contents/{path}"
-            
+            api_url = self.get_api_url(url)
+            cached = self.load_cached(api_url)
+            if cached and time.time() - cached['fetched_at'] < self.cache_ttl:
+                self.logger.info(f"Using cached GitHub content for {api_url}")
+                return self.remember(url, cached['content'], cached['fetched_at'])
+
+            headers = self.get_headers()
+            if cached and cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+
             self.logger.info(f"Fetching content from GitHub API: {api_url}")
-            response = requests.get(api_url, headers=self.get_headers())
-            
+            try:
+                response = self.session.get(api_url, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                if cached:
+                    self.logger.warning(f"GitHub unreachable ({str(e)}), using last cached copy of {api_url}")
+                    return self.remember(url, cached['content'])
+                raise
+
+            if response.status_code == 304 and cached:
+                self.logger.info("GitHub content not modified, using cached copy")
+                self.save_cached(api_url, cached['content'], cached.get('etag'))
+                return self.remember(url, cached['content'])
+
             if response.status_code != 200:
                 self.logger.warning(f"Failed to fetch GitHub content: {response.status_code}")
+                if cached:
+                    self.logger.warning(f"Using last cached copy of {api_url}")
+                    return self.remember(url, cached['content'])
                 return None
-                
+
             # GitHub API returns content as base64
             content = response.json().get('content', '')
             if content:
                 decoded_content = base64.b64decode(content).decode('utf-8')
+                self.save_cached(api_url, decoded_content, response.headers.get('ETag'))
                 self.logger.info("Successfully fetched GitHub content")
-                return decoded_content
-            
+                return self.remember(url, decoded_content)
+
             return None
-            
+
         except Exception as e:
             self.logger.error(f"Error fetching GitHub content: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
+
+    def read_files(self, urls: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Fetches several files from GitHub concurrently.
+
+        Args:
+            urls (List[str]): GitHub URLs to the files
+
+        Returns:
+            Dict[str, Optional[str]]: File content for each url, None for the ones that failed
+        """
+        urls = list(dict.fromkeys(urls))
+        self.logger.info(f"Reading {len(urls)} files from GitHub")
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, max(len(urls), 1))) as executor:
+            contents = list(executor.map(self.read_file, urls))
+        return dict(zip(urls, contents))
+
+    def remember(self, url: str, content: str, fetched_at: Optional[float] = None) -> str:
+        """Keeps the content in memory until the ttl after fetched_at (now by default, also for copies used because GitHub failed)"""
+        with self.memory_cache_lock:
+            self.memory_cache[url] = (content, fetched_at or time.time())
+        return content
+
+
+install_http_fixtures(GithubReader.session)
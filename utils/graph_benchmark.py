@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from importlib.metadata import version
+from typing import Any, Dict, List, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from agent.data_class.blog_data import BlogState
+from utils.artifacts import serialize
+from utils.envvars import CHECKPOINT_BACKEND
+from tests.fake_tools import ROUNDS, build_supervisor
+
+# article sizes in KiB, from a short post to a pathological 1 MiB one
+ARTICLE_KIB = (1, 10, 100, 1024)
+BASELINE_PATH = "benchmarks/graph_baseline.json"
+
+
+class NodeTimer(BaseCallbackHandler):
+    """
+    Wall time of every graph node run, as LangGraph sees it (from the start to the end callback of the
+    node, so including the state validation and writes around the node function)
+    """
+
+    def __init__(self):
+        self.started: Dict[Any, tuple] = {}
+        self.times: Dict[str, List[float]] = {}
+        self.lock = threading.Lock()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        name = kwargs.get("name")
+        if metadata and name == metadata.get("langgraph_node") and not name.startswith("__"):
+            with self.lock:
+                self.started[run_id] = (name, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        with self.lock:
+            started = self.started.pop(run_id, None)
+            if started:
+                self.times.setdefault(started[0], []).append(time.perf_counter() - started[1])
+
+
+def serialization_costs(state: BlogState, repeat: int) -> Dict[str, float]:
+    """
+    Milliseconds to validate the state the way LangGraph builds each node's input, to dump it for the
+    channels, to serialize it for a checkpoint and for an artifact, and the size of the checkpoint
+    """
+    values = {field: getattr(state, field) for field in BlogState.model_fields}
+    serde = JsonPlusSerializer()
+    steps = {
+        "validate_ms": lambda: BlogState(**values),
+        "model_dump_ms": lambda: state.model_dump(),
+        "checkpoint_ms": lambda: serde.dumps_typed(values),
+        "artifact_json_ms": lambda: serialize(state),
+    }
+    costs = {}
+    for name, step in steps.items():
+        started = time.perf_counter()
+        for _ in range(repeat):
+            step()
+        costs[name] = (time.perf_counter() - started) * 1000 / repeat
+    costs["checkpoint_kib"] = len(serde.dumps_typed(values)[1]) / 1024
+    return costs
+
+
+def benchmark_size(article_kib: int, runs: int, checkpointer: str) -> Dict[str, Any]:
+    body_times: Dict[str, List[float]] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        supervisor = build_supervisor(directory, article_kib * 1024, checkpointer, body_times)
+        # the first run warms up the imports and caches
+        supervisor.create_blogpost("benchmark")
+        body_times.clear()
+        timer = NodeTimer()
+        supervisor.metrics = timer
+        totals = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            state = supervisor.create_blogpost("benchmark")
+            totals.append(time.perf_counter() - started)
+        body_times = {node: list(times) for node, times in body_times.items()}
+
+        supervisor.metrics = NodeTimer()
+        tracemalloc.start()
+        supervisor.create_blogpost("benchmark")
+        allocated, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if checkpointer == "sqlite":
+            supervisor.checkpointer.conn.close()
+
+    nodes = {}
+    for node, times in timer.times.items():
+        wall = sum(times) / runs
+        # the subgraph nodes run the other nodes, their own work is what's left after them
+        body = sum(body_times.get(node, [])) / runs
+        nodes[node] = {"calls": len(times) // runs, "wall_ms": wall * 1000, "body_ms": body * 1000}
+    for subgraph, graph in (("research_subgraph", supervisor.researcher.graph), ("write_subgraph", supervisor.writer.graph)):
+        if subgraph in nodes:
+            nodes[subgraph]["body_ms"] = sum(nodes[node]["wall_ms"] for node in graph.nodes if node in nodes)
+    top_level = sum(nodes[node]["wall_ms"] for node in ("research_subgraph", "write_subgraph") if node in nodes)
+    total_ms = statistics.median(totals) * 1000
+    return {
+        "article_kib": article_kib,
+        "run_ms": total_ms,
+        # time spent in the node functions (our code and the fake tools), everything else is LangGraph and pydantic
+        "node_body_ms": sum(sum(times) for times in body_times.values()) * 1000 / runs,
+        "between_nodes_ms": total_ms - top_level,
+        "nodes": nodes,
+        "tracemalloc_peak_kib": peak / 1024,
+        "tracemalloc_retained_kib": allocated / 1024,
+        "serialization": serialization_costs(state, 5 if article_kib >= 1024 else 20),
+    }
+
+
+def environment() -> Dict[str, str]:
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+            "langgraph": version("langgraph"), "pydantic": version("pydantic"), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def graph_report(sizes=ARTICLE_KIB, runs: int = 5, checkpointer: str = CHECKPOINT_BACKEND) -> Dict[str, Any]:
+    """
+    Runs the Supervisor graph (with the research and write subgraphs) on zero-latency fake tools for
+    each article size, so what's measured is the orchestration: LangGraph, state validation and
+    copying, checkpoints, artifacts and logging
+    """
+    return {"environment": environment(), "checkpointer": checkpointer, "rounds": ROUNDS,
+            "sizes": [benchmark_size(size, runs, checkpointer) for size in sizes]}
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    previous = {size["article_kib"]: size for size in baseline["sizes"]} if baseline else {}
+
+    def change(value: float, size: int, key: str, table: Optional[str] = None) -> str:
+        old = previous.get(size, {})
+        old = old.get(table, {}) if table else old
+        if key not in old or not old[key]:
+            return ""
+        return f" ({(value - old[key]) / old[key]:+.0%})"
+
+    print(f"Graph orchestration overhead ({report['checkpointer']} checkpoints, {report['rounds']} outline and article rounds per run)"
+          + (f", compared to {baseline['environment']['commit']} of {baseline['environment']['time']}" if baseline else "") + ":")
+    for size in report["sizes"]:
+        kib = size["article_kib"]
+        print(f"\n{kib} KiB article: {size['run_ms']:.1f} ms per run{change(size['run_ms'], kib, 'run_ms')}, "
+              f"{size['node_body_ms']:.1f} ms in the node functions, {size['between_nodes_ms']:.1f} ms between the top level nodes")
+        print(f"  tracemalloc: {size['tracemalloc_peak_kib']:.0f} KiB peak{change(size['tracemalloc_peak_kib'], kib, 'tracemalloc_peak_kib')}, "
+              f"{size['tracemalloc_retained_kib']:.0f} KiB retained")
+        print("  " + ", ".join(f"{name} {value:.2f}{change(value, kib, name, 'serialization')}" for name, value in size["serialization"].items()))
+        for node, timing in size["nodes"].items():
+            overhead = timing["wall_ms"] - timing["body_ms"]
+            print(f"  {node:30s} x{timing['calls']}  {timing['wall_ms']:8.2f} ms per run, {overhead:8.2f} ms of it framework")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the graph orchestration with zero-latency fake tools")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in ARTICLE_KIB), help="Article sizes in KiB, comma separated")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per size (the median run time is reported)")
+    parser.add_argument("--checkpointer", default=CHECKPOINT_BACKEND, choices=["sqlite", "memory"])
+    parser.add_argument("--save", nargs="?", const=BASELINE_PATH, help=f"Save the report as a baseline (default {BASELINE_PATH})")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, help=f"Compare with a saved baseline (default {BASELINE_PATH})")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    report = graph_report([int(size) for size in args.sizes.split(",")], args.runs, args.checkpointer)
+    print_report(report, baseline)
+    if args.save:
+        if os.path.dirname(args.save):
+            os.makedirs(os.path.dirname(args.save), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.save}")
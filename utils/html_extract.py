@@ -0,0 +1,206 @@
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+from bs4 import BeautifulSoup, Comment, NavigableString, Tag
+
+# This module is imported by the extraction worker processes, keep its imports light (no settings, loggers or SDKs)
+
+# never content: dropped from the whole page before anything else
+NON_CONTENT_TAGS = ["script", "style", "noscript", "template", "svg", "canvas", "iframe", "object", "embed", "link", "meta"]
+# page chrome: dropped from the main content
+BOILERPLATE_TAGS = ["nav", "aside", "footer", "form", "button", "input", "select", "textarea", "dialog"]
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "dialog", "menu", "menubar"}
+BOILERPLATE_PATTERN = re.compile(
+    r"(?:^|[\s_-])(?:ads?|advert\w*|banner|breadcrumbs?|comments?|cookie\w*|footer|masthead|menu|modal|navbar|newsletter|"
+    r"popup|promo\w*|related|share|sharing|sidebar|social|sponsor\w*|subscribe|toolbar|widget)(?:$|[\s_-])", re.IGNORECASE)
+# the main content element has to hold at least this share of the page's text, otherwise the whole body is used
+MAIN_CONTENT_SHARE = 0.3
+TRUNCATION_NOTE = "\n\n[... rest of the page left out]"
+# stored with the markdown in the content cache, bump it when the conversion changes so cached pages are converted again
+MARKDOWN_VERSION = 1
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "header", "figure", "figcaption", "dl", "dt", "dd", "address", "details", "summary"}
+
+
+class OutputFull(Exception):
+    pass
+
+
+class MarkdownWriter:
+    """Markdown of a parsed page, built in one walk of the tree that stops once max_chars is reached"""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.parts: List[str] = []
+        self.size = 0
+
+    def write(self, text: str):
+        if not text:
+            return
+        self.parts.append(text)
+        self.size += len(text)
+        if self.max_chars and self.size > self.max_chars:
+            raise OutputFull()
+
+    def inline(self, node) -> str:
+        """The text of an element on one line, with links, emphasis and code kept"""
+        if isinstance(node, NavigableString):
+            return "" if isinstance(node, Comment) else re.sub(r"\s+", " ", str(node))
+        name = node.name
+        if name == "br":
+            return "\n"
+        if name == "img":
+            alt = (node.get("alt") or "").strip()
+            return f"![{alt}]({node.get('src', '')})" if alt else ""
+        text = "".join(self.inline(child) for child in node.children)
+        if name == "a":
+            href = node.get("href", "")
+            label = text.strip()
+            return f"[{label}]({href})" if label and href and not href.startswith(("#", "javascript:")) else text
+        if name in ("strong", "b") and text.strip():
+            return f"**{text.strip()}**"
+        if name in ("em", "i") and text.strip():
+            return f"*{text.strip()}*"
+        if name == "code" and text.strip():
+            return f"`{text.strip()}`"
+        return text
+
+    def block(self, node, list_depth: int = 0):
+        if isinstance(node, NavigableString):
+            self.write(self.inline(node))
+            return
+        name = node.name
+        if name in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self.write(f"\n\n{'#' * int(name[1])} {self.inline(node).strip()}\n\n")
+        elif name in ("ul", "ol"):
+            if not list_depth:
+                self.write("\n\n")
+            for i, item in enumerate(node.find_all("li", recursive=False), 1):
+                marker = f"{i}." if name == "ol" else "-"
+                self.write(f"{'  ' * list_depth}{marker} {self.inline_without_lists(item).strip()}\n")
+                for sublist in item.find_all(["ul", "ol"], recursive=False):
+                    # nested lists continue right under their item
+                    self.block(sublist, list_depth + 1)
+            if not list_depth:
+                self.write("\n")
+        elif name == "pre":
+            self.write(f"\n\n```\n{node.get_text().strip(chr(10))}\n```\n\n")
+        elif name == "blockquote":
+            text = self.inline(node).strip()
+            self.write("\n\n" + "\n".join(f"> {line.strip()}" for line in text.splitlines() if line.strip()) + "\n\n")
+        elif name == "table":
+            self.write("\n\n")
+            header = True
+            for row in node.find_all("tr"):
+                cells = [self.inline(cell).strip().replace("|", "\\|") for cell in row.find_all(["th", "td"], recursive=False)]
+                if any(cells):
+                    self.write(f"| {' | '.join(cells)} |\n")
+                    if header:
+                        self.write(f"|{' --- |' * len(cells)}\n")
+                        header = False
+            self.write("\n")
+        elif name == "hr":
+            self.write("\n\n---\n\n")
+        elif name in BLOCK_TAGS or any(isinstance(child, Tag) and (child.name in BLOCK_TAGS or child.name in ("ul", "ol", "pre", "table")) for child in node.children):
+            separator = "\n\n" if name in BLOCK_TAGS else ""
+            self.write(separator)
+            for child in node.children:
+                self.block(child, list_depth)
+            self.write(separator)
+        else:
+            self.write(self.inline(node))
+
+    def inline_without_lists(self, item: Tag) -> str:
+        return "".join(self.inline(child) for child in item.children if not (isinstance(child, Tag) and child.name in ("ul", "ol")))
+
+    def markdown(self) -> str:
+        segments = "".join(self.parts).split("```")
+        # tidy the whitespace left between the blocks, but not inside the code blocks
+        for i in range(0, len(segments), 2):
+            text = re.sub(r"[ \t]+\n", "\n", segments[i])
+            text = re.sub(r"\n[ \t]+(?=[^\s\d-])", "\n", text)
+            segments[i] = re.sub(r"\n{3,}", "\n\n", text)
+        return "```".join(segments).strip()
+
+
+def is_boilerplate(tag: Tag) -> bool:
+    if tag.attrs is None:
+        return False
+    if tag.get("role") in BOILERPLATE_ROLES or tag.get("aria-hidden") == "true" or tag.has_attr("hidden"):
+        return True
+    names = " ".join(tag.get("class") or []) + " " + (tag.get("id") or "")
+    return bool(names.strip()) and bool(BOILERPLATE_PATTERN.search(names))
+
+
+def main_content(soup: BeautifulSoup) -> Tag:
+    """
+    The element holding the page's main text: the largest <article>, <main> or role=main element if it
+    has a fair share of the page's text, otherwise the body with its header stripped too
+    """
+    body = soup.body or soup
+    page_chars = len(body.get_text(" ", strip=True))
+    candidates = soup.find_all(["article", "main"]) + soup.find_all(attrs={"role": "main"})
+    best, best_chars = None, 0
+    for candidate in candidates:
+        chars = len(candidate.get_text(" ", strip=True))
+        if chars > best_chars:
+            best, best_chars = candidate, chars
+    if best is not None and best_chars >= MAIN_CONTENT_SHARE * page_chars:
+        return best
+    for header in body.find_all("header"):
+        if not header.find_parent(["article", "main"]):
+            header.decompose()
+    return body
+
+
+def extract_markdown(html: str, max_chars: int = 0) -> str:
+    """
+    Converts a page to markdown: parses it once, drops scripts, styles and page chrome (navigation,
+    sidebars, ads, cookie banners, share and comment blocks), keeps only the main content and stops
+    at max_chars (0 = no cap)
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup.find_all(NON_CONTENT_TAGS):
+        tag.decompose()
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+    root = main_content(soup)
+    for tag in root.find_all(BOILERPLATE_TAGS):
+        tag.decompose()
+    for tag in [tag for tag in root.find_all(True) if is_boilerplate(tag)]:
+        # a parent may have been removed already, its children go with it
+        if tag.parent is not None:
+            tag.decompose()
+
+    writer = MarkdownWriter(max_chars)
+    try:
+        title = soup.title.get_text(strip=True) if soup.title else ""
+        if title and not root.find("h1"):
+            writer.write(f"# {title}\n\n")
+        writer.block(root)
+    except OutputFull:
+        markdown = writer.markdown()[:max_chars]
+        # cut at the last paragraph break so the page doesn't end mid sentence
+        cut = markdown.rfind("\n\n")
+        return (markdown[:cut] if cut > max_chars // 2 else markdown) + TRUNCATION_NOTE
+    except RecursionError:
+        return re.sub(r"\n{3,}", "\n\n", root.get_text("\n", strip=True))[:max_chars or None]
+    return writer.markdown()
+
+
+pool: Optional[ProcessPoolExecutor] = None
+pool_lock = threading.Lock()
+
+
+def get_extraction_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    The process wide pool the pages are converted in, so parsing a big page doesn't hold the GIL
+    against the request threads. Workers are spawned rather than forked, a fork of the app would copy
+    its threads' locks (logging, caches) in whatever state they were in.
+    """
+    global pool
+    with pool_lock:
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return pool
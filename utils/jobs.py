@@ -0,0 +1,141 @@
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+from pydantic import BaseModel, Field
+from utils.logger import setup_logger
+
+logger = setup_logger("JobManager")
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(BaseModel):
+    id: str = Field(description="The id of the job, also the run id its graph checkpoints are saved under")
+    topic: str = Field(description="The topic the blog post is being written about")
+    status: JobStatus = Field(default=JobStatus.QUEUED, description="The status of the job")
+    current_node: Optional[str] = Field(default=None, description="The graph node the job is currently running")
+    created_at: datetime = Field(default_factory=datetime.now, description="When the job was submitted")
+    started_at: Optional[datetime] = Field(default=None, description="When a worker picked up the job")
+    finished_at: Optional[datetime] = Field(default=None, description="When the job succeeded or failed")
+    error: Optional[str] = Field(default=None, description="The error message if the job failed")
+    result: Optional[Dict[str, Any]] = Field(default=None, description="The final BlogState of the job, dumped to a dict")
+
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while all workers are busy and the queue is full"""
+
+
+class JobManager:
+    """
+    Runs blog post jobs on a bounded worker pool.
+
+    At most `workers` jobs run at once and at most `max_queue` more wait for a worker, anything
+    beyond that is rejected with JobQueueFullError so callers can apply backpressure. Finished jobs
+    are kept in memory (up to `max_finished`) so their status and result can be polled.
+    run_fn(topic, on_node, run_id) runs a job, resume_fn(run_id, on_node) continues a failed one from its last checkpoint.
+    """
+
+    def __init__(self, run_fn: Callable[[str, Callable[[str], None], str], BaseModel],
+                 resume_fn: Optional[Callable[[str, Callable[[str], None]], BaseModel]] = None,
+                 workers: int = 2, max_queue: int = 10, max_finished: int = 100):
+        self.logger = logger
+        self.run_fn = run_fn
+        self.resume_fn = resume_fn
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_finished = max_finished
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="blogjob")
+        self.jobs: Dict[str, Job] = {}
+        self.finished_ids = []
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.logger.info(f"Initialized JobManager with {workers} workers and a queue of {max_queue}")
+
+    def submit(self, topic: str) -> Job:
+        """
+        Queues a new job for the topic and returns it straight away
+        """
+        with self.lock:
+            self.reserve_slot()
+            job = Job(id=uuid.uuid4().hex, topic=topic)
+            self.jobs[job.id] = job
+            self.pending += 1
+        self.logger.info(f"Queued job {job.id}")
+        self.executor.submit(self._run, job, False)
+        return job
+
+    def resume(self, job_id: str) -> Job:
+        """
+        Queues a failed job again, it continues from the last node that completed before it failed
+        """
+        if self.resume_fn is None:
+            raise ValueError("This job manager can't resume jobs")
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            if job.status != JobStatus.FAILED:
+                raise ValueError(f"Job {job_id} is {job.status.value}, only failed jobs can be resumed")
+            self.reserve_slot()
+            self.finished_ids.remove(job_id)
+            job.status = JobStatus.QUEUED
+            job.error = None
+            job.started_at = job.finished_at = None
+            self.pending += 1
+        self.logger.info(f"Queued job {job.id} to resume")
+        self.executor.submit(self._run, job, True)
+        return job
+
+    def reserve_slot(self):
+        # called with the lock held
+        if self.pending >= self.workers + self.max_queue:
+            self.logger.warning(f"Rejecting job, {self.pending} jobs already pending")
+            raise JobQueueFullError(f"Job queue is full ({self.pending} jobs pending)")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def queue_depth(self) -> int:
+        """
+        Number of jobs that are waiting for a worker
+        """
+        with self.lock:
+            return max(self.pending - self.workers, 0)
+
+    def _run(self, job: Job, resume: bool):
+        job.status = JobStatus.RUNNING
+        job.started_at = datetime.now()
+        self.logger.info(f"Running job {job.id}")
+
+        def on_node(node: str):
+            job.current_node = node
+
+        try:
+            if resume:
+                state = self.resume_fn(job.id, on_node)
+            else:
+                state = self.run_fn(job.topic, on_node, job.id)
+            job.result = state.model_dump()
+            job.status = JobStatus.SUCCEEDED
+            self.logger.info(f"Job {job.id} succeeded")
+        except Exception as e:
+            job.error = str(e)
+            job.status = JobStatus.FAILED
+            self.logger.error(f"Job {job.id} failed: {str(e)}")
+        finally:
+            job.current_node = None
+            job.finished_at = datetime.now()
+            with self.lock:
+                self.pending -= 1
+                self.finished_ids.append(job.id)
+                while len(self.finished_ids) > self.max_finished:
+                    self.jobs.pop(self.finished_ids.pop(0), None)
@@ -0,0 +1,173 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.language_models import BaseChatModel
+from langchain_core.load import dumps, loads
+from utils.logger import setup_logger
+from utils.fixtures import fixtures_enabled, get_fixture_llm_cache
+from utils.metrics import CACHE_HIT_METADATA
+from utils.envvars import LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_SITES
+
+logger = setup_logger("LLMCache")
+
+
+class LLMResponseStore:
+    """
+    SQLite store of LLM responses, keyed by a sha256 of the model settings (model, temperature, ...)
+    and the serialized prompt messages. Entries older than `ttl` seconds are ignored and, once there
+    are more than `max_entries`, the least recently used ones are deleted.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.logger = logger
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                site TEXT,
+                value TEXT,
+                created_at REAL,
+                last_access REAL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.conn.commit()
+        self.logger.info(f"Initialized LLM response store at {path}")
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if time.time() - created_at > self.ttl:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.conn.commit()
+                return None
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            return value
+
+    def put(self, key: str, site: str, value: str):
+        now = time.time()
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO responses (key, site, value, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                              (key, site, value, now, now))
+            count = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                                  (count - self.max_entries,))
+            self.conn.commit()
+
+    def clear(self, site: Optional[str] = None):
+        with self.lock:
+            if site:
+                self.conn.execute("DELETE FROM responses WHERE site = ?", (site,))
+            else:
+                self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+
+    def entries(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class LLMResponseCache(BaseCache):
+    """
+    LangChain cache for one call site (e.g. 'construct_thesis'), backed by the shared LLMResponseStore.
+    Keeps its own hit/miss counters so the savings can be seen per call site.
+    """
+
+    def __init__(self, store: LLMResponseStore, site: str):
+        self.store = store
+        self.site = site
+        self.hits = 0
+        self.misses = 0
+        # lookups come from the parallel revise nodes and the batch runs at once
+        self.lock = threading.Lock()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        value = self.store.get(self.store.make_key(prompt, llm_string))
+        if value is None:
+            self.record("miss")
+            return None
+        self.record("hit")
+        logger.info(f"LLM cache hit for {self.site}")
+        generations = loads(value)
+        # so the metrics callbacks don't count the stored usage and the instant reply as a request
+        for generation in generations:
+            if message := getattr(generation, "message", None):
+                message.response_metadata[CACHE_HIT_METADATA] = True
+        return generations
+
+    def record(self, outcome: str):
+        """Counts a lookup outcome: 'hit' or 'miss'"""
+        with self.lock:
+            if outcome == "hit":
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.store.put(self.store.make_key(prompt, llm_string), self.site, dumps(return_val))
+
+    def clear(self, **kwargs: Any) -> None:
+        self.store.clear(self.site)
+
+
+store: Optional[LLMResponseStore] = None
+site_caches: Dict[str, LLMResponseCache] = {}
+site_caches_lock = threading.Lock()
+
+
+def get_site_cache(site: str) -> LLMResponseCache:
+    global store
+    with site_caches_lock:
+        if store is None:
+            store = LLMResponseStore(LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES)
+        if site not in site_caches:
+            site_caches[site] = LLMResponseCache(store, site)
+        return site_caches[site]
+
+
+def cached_llm(llm: BaseChatModel, site: str) -> BaseChatModel:
+    """
+    Returns a copy of the chat model that caches its responses for the call site, if the cache is
+    enabled and the site is listed in LLM_CACHE_SITES. Otherwise the model is returned unchanged.
+    In fixture record/replay mode every call site goes through the fixture bundle instead.
+    """
+    if fixtures_enabled():
+        return llm.model_copy(update={"cache": get_fixture_llm_cache()})
+    if not LLM_CACHE_ENABLED or site not in LLM_CACHE_SITES:
+        return llm
+    logger.info(f"Caching LLM responses for {site}")
+    return llm.model_copy(update={"cache": get_site_cache(site)})
+
+
+def llm_cache_stats() -> Dict[str, Any]:
+    """
+    Hit/miss counts per call site and the number of stored responses
+    """
+    with site_caches_lock:
+        return {
+            "enabled": LLM_CACHE_ENABLED,
+            "entries": store.entries() if store else 0,
+            "sites": {site: cache.stats() for site, cache in site_caches.items()},
+        }
@@ -1,46 +1,136 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+import threading
+from datetime import datetime, timezone
+from utils.envvars import LOG_LEVEL, LOG_DIR, LOG_FILE_FORMAT, LOG_ROTATION, LOG_MAX_MB, LOG_BACKUP_COUNT, LOG_MAX_MESSAGE_CHARS
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+log_queue = queue.Queue(-1)
+listener = None
+queue_handler = None
+setup_lock = threading.Lock()
+
+
+class TruncatingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts the records on the log queue, so the file and console I/O happens on the listener thread
+    and not in the thread that logged. Messages longer than max_chars (whole articles and research)
+    are cut down here, before they are queued. The first record starts the listener.
+    """
+
+    def __init__(self, log_queue: queue.Queue, max_chars: int):
+        super().__init__(log_queue)
+        self.max_chars = max_chars
+
+    def enqueue(self, record: logging.LogRecord):
+        start_listener()
+        super().enqueue(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        message = record.getMessage()
+        if self.max_chars and len(message) > self.max_chars:
+            message = f"{message[:self.max_chars]}... [{len(message) - self.max_chars} more chars]"
+        record.msg = message
+        record.args = None
+        if record.exc_info:
+            # tracebacks can't be pickled or formatted later, keep their text
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def file_handler() -> logging.Handler:
+    if LOG_ROTATION == "size":
+        handler = logging.handlers.RotatingFileHandler(os.path.join(LOG_DIR, 'blog-agent.log'), maxBytes=LOG_MAX_MB * 1024 * 1024,
+                                                       backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    elif LOG_ROTATION == "time":
+        handler = logging.handlers.TimedRotatingFileHandler(os.path.join(LOG_DIR, 'blog-agent.log'), when='midnight',
+                                                            backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    else:
+        raise ValueError(f"Invalid log rotation '{LOG_ROTATION}', expected 'size' or 'time'")
+    handler.setFormatter(JsonFormatter() if LOG_FILE_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+def start_listener():
+    """
+    Starts the process wide log listener once: a rotating log file (everything, JSON records by
+    default) and the console (INFO and above), both written from the listener's thread. Not started
+    before something is logged, so a process that only imports the modules (like the spawned
+    extraction workers) opens no log file and starts no thread.
+    """
+    global listener
+    if listener is not None:
+        return
+    with setup_lock:
+        if listener is None:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            # File handler (logs everything to file)
+            file = file_handler()
+            file.setLevel(logging.DEBUG)
+            # Console handler (logs INFO and above to console)
+            console = logging.StreamHandler()
+            console.setLevel(logging.INFO)
+            console.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+            listener = logging.handlers.QueueListener(log_queue, file, console, respect_handler_level=True)
+            listener.start()
+            # flushes the records still on the queue when the process exits
+            atexit.register(listener.stop)
+
+
+def start_logging() -> logging.Handler:
+    """The process wide handler that puts the records on the log queue"""
+    global queue_handler
+    with setup_lock:
+        if queue_handler is None:
+            queue_handler = TruncatingQueueHandler(log_queue, LOG_MAX_MESSAGE_CHARS)
+        return queue_handler
+
+
+def log_to_file(content: str, filename: str) -> None:
+    """Write content to a specific file in the logs directory."""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    filepath = os.path.join(LOG_DIR, filename)
+    with open(filepath, 'a', encoding='utf-8') as f:
+        f.write(content + '\n')
+
 
 def setup_logger(name):
-    # Create logs directory if it doesn't exist
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
-    
-    # Create logger
+    """
+    Returns the named logger, sending its records to the shared log queue. Safe to call for the
+    same name any number of times (every module and tool instance does), the handler is only added once.
+    """
+    handler = start_logging()
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    
-    # Create formatters
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
-    # File handler (logs everything to file)
-    file_handler = logging.FileHandler(
-        f'logs/{datetime.now().strftime("%Y-%m-%d")}.log'
-    )
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(formatter)
-    
-    # Console handler (logs INFO and above to console)
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-
-    def log_to_file(content: str, filename: str) -> None:
-        """Write content to a specific file in the logs directory."""
-        if not os.path.exists('logs'):
-            os.makedirs('logs')
-        filepath = os.path.join('logs', filename)
-        with open(filepath, 'a', encoding='utf-8') as f:
-            f.write(content + '\n')
-    
-    # Attach the method to the logger object
-    logger.log_to_file = log_to_file
-    
-    return logger 
\ No newline at end of file
+    if handler not in logger.handlers:
+        logger.setLevel(LOG_LEVEL)
+        logger.addHandler(handler)
+        # the records are handled here, not again by the root logger's handlers
+        logger.propagate = False
+        # Attach the method to the logger object
+        logger.log_to_file = log_to_file
+    return logger
@@ -0,0 +1,120 @@
+import gc
+import random
+import sys
+import tracemalloc
+from typing import Callable, Dict, List
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from agent.data_class.blog_data import (BlogState, BlogOutline, BlogOutlineSimple, BlogOutlineEvaluation, ResearchResponse,
+                                        BlogArticle, BlogArticleEvaluation)
+from utils.eval_history import EvaluationHistory, document_prompt
+from utils.utils import shared_system_message
+
+WORDS = ("agent graph model prompt token latency cache research article outline draft writer evaluator thesis author "
+         "voice reader system memory state python request response network parallel revise section summary data").split()
+SYSTEM_PROMPT_CHARS = 4000
+RESEARCH_CHARS = 20000
+PERSONALITY_CHARS = 3000
+ARTICLE_PARAGRAPHS = 25
+ITERATIONS = 3
+# share of the paragraphs rewritten between two drafts
+CHANGED_PARAGRAPHS = 0.3
+
+
+def text(rng: random.Random, chars: int) -> str:
+    words = []
+    length = 0
+    while length < chars:
+        words.append(rng.choice(WORDS))
+        length += len(words[-1]) + 1
+    return " ".join(words)
+
+
+def drafts(rng: random.Random) -> List[str]:
+    """Successive drafts of an article, each one rewriting part of the paragraphs of the previous one"""
+    paragraphs = [text(rng, 600) for _ in range(ARTICLE_PARAGRAPHS)]
+    versions = []
+    for _ in range(ITERATIONS):
+        versions.append("\n\n".join(paragraphs))
+        for i in rng.sample(range(ARTICLE_PARAGRAPHS), int(ARTICLE_PARAGRAPHS * CHANGED_PARAGRAPHS)):
+            paragraphs[i] = text(rng, 600)
+    return versions
+
+
+def copy(value: str) -> str:
+    """A separate string object with the same text, the way each run used to load its own copy"""
+    return (value + " ")[:-1]
+
+
+def run_state(seed: int, system_prompts: Dict[str, str], compact: bool) -> BlogState:
+    """
+    The state of a run after ITERATIONS outline and article evaluation rounds. compact=False builds
+    the old layout: every draft kept whole, full documents in the evaluator transcripts and a
+    separate system prompt message per run.
+    """
+    rng = random.Random(seed)
+    outlines = [BlogOutlineSimple(title=text(rng, 80), intro=text(rng, 400), body=text(rng, 1500), conclusion=text(rng, 300))
+                for _ in range(ITERATIONS)]
+    articles = drafts(rng)
+    history = EvaluationHistory("diff", 1, 10 ** 9, 1500)
+
+    def evaluation(evaluation_class, system_prompt: str, documents: List[str]):
+        evaluation = evaluation_class()
+        system = shared_system_message(system_prompt) if compact else SystemMessage(content=copy(system_prompt))
+        evaluation.messages = [system]
+        for document in documents:
+            prompt = document_prompt("Evaluate this and answer YES or NO first: ", document)
+            if compact:
+                history.record(evaluation.messages, evaluation.documents, prompt)
+            else:
+                evaluation.messages.append(HumanMessage(content=prompt.content))
+            evaluation.messages.append(AIMessage(content="NO " + text(rng, 1200)))
+        return evaluation
+
+    outline = BlogOutline(thesis=text(rng, 300),
+                          research=ResearchResponse(content=text(rng, RESEARCH_CHARS), sources=[f"https://example.com/{i}" for i in range(8)]),
+                          outline=outlines[-1],
+                          outline_evaluation=evaluation(BlogOutlineEvaluation, system_prompts["outline"], [o.model_dump_json() for o in outlines]))
+    article_evaluation = evaluation(BlogArticleEvaluation, system_prompts["article"], articles)
+    third = len(articles[-1]) // 3
+    revised = {"revised_intro_text": copy(articles[-1][:third]),
+               "revised_body_text": copy(articles[-1][third:2 * third]),
+               "revised_conclusion_text": copy(articles[-1][2 * third:])}
+    if compact:
+        article = BlogArticle(article_text=articles[-1], article_text_history=articles[:-1], article_evaluation=article_evaluation, **revised)
+    else:
+        article = BlogArticle.model_construct(article_text=articles[-1], article_text_history=articles[:-1], article_evaluation=article_evaluation, **revised)
+    return BlogState(article_idea=text(rng, 200), outline=outline, author_personality=text(rng, PERSONALITY_CHARS), article=article)
+
+
+def bytes_per_run(build: Callable[[int], BlogState], runs: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    states = [build(seed) for seed in range(runs)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del states
+    return (after - before) / runs
+
+
+def memory_report(runs: int = 20) -> Dict[str, float]:
+    """
+    Resident bytes of the state of one in-flight run, in the old and the compact layout, measured
+    with tracemalloc over `runs` states built at once (so shared objects count once, as they do in the app)
+    """
+    rng = random.Random(0)
+    system_prompts = {"outline": text(rng, SYSTEM_PROMPT_CHARS), "article": text(rng, SYSTEM_PROMPT_CHARS)}
+    return {
+        "full_copies": bytes_per_run(lambda seed: run_state(seed, system_prompts, compact=False), runs),
+        "compact": bytes_per_run(lambda seed: run_state(seed, system_prompts, compact=True), runs),
+    }
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    report = memory_report(runs)
+    print(f"State memory per in-flight run ({runs} runs, {ITERATIONS} outline and article iterations each):")
+    for layout, size in report.items():
+        print(f"{size / 1024:10.1f} KiB  {layout}")
+    print(f"{report['full_copies'] / report['compact']:10.2f} x   smaller")
@@ -0,0 +1,94 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+from prometheus_client import Counter, Gauge, Histogram
+
+# response_metadata key set on the messages served from the LLM response cache, they cost no tokens and take no time
+CACHE_HIT_METADATA = "llm_cache_hit"
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1200)
+
+NODE_DURATION = Histogram("blog_node_duration_seconds", "Wall time of each graph node", ["node"], buckets=DURATION_BUCKETS)
+NODE_ERRORS = Counter("blog_node_errors_total", "Graph nodes that raised an error", ["node"])
+LLM_DURATION = Histogram("blog_llm_request_duration_seconds", "Latency of LLM requests", ["provider", "model"], buckets=DURATION_BUCKETS)
+LLM_ERRORS = Counter("blog_llm_errors_total", "LLM requests that raised an error", ["provider", "model"])
+LLM_TOKENS = Counter("blog_llm_tokens_total", "Tokens sent to and received from LLMs", ["provider", "model", "direction"])
+LLM_RATE_LIMITED = Counter("blog_llm_rate_limited_total", "LLM requests rejected with a rate limit or overload error", ["provider"])
+LLM_RETRIED = Counter("blog_llm_retried_total", "LLM requests that failed with a transient error (connection, timeout, server error) and were retried", ["provider"])
+LLM_LIMITER_WAIT = Histogram("blog_llm_limiter_wait_seconds", "Time LLM requests waited for the provider rate limiter", ["provider"], buckets=DURATION_BUCKETS)
+LLM_CONCURRENCY_LIMIT = Gauge("blog_llm_concurrency_limit", "Current limit on the LLM requests in flight per provider", ["provider"])
+EVAL_HISTORY_TOKENS_SAVED = Counter("blog_evaluator_history_tokens_saved_total", "Estimated evaluator prompt tokens each history policy saves over resending the full history", ["policy"])
+LOOP_ITERATIONS = Histogram("blog_loop_iterations", "Evaluation loop iterations per run", ["loop"], buckets=(1, 2, 3, 4, 5))
+RUNS_IN_PROGRESS = Gauge("blog_runs_in_progress", "Blog post runs currently in flight")
+RUNS = Counter("blog_runs_total", "Finished blog post runs", ["status"])
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler that records graph node wall times and LLM request latency / token usage.
+    Pass it in the config callbacks of a graph run, it is inherited by the subgraphs and the LLM calls made in the nodes.
+    """
+
+    def __init__(self):
+        self.started: Dict[UUID, tuple] = {}
+        self.lock = threading.Lock()
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], *, run_id: UUID,
+                       metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        # only the runs of the graph nodes themselves, not the runnables inside them or the internal __start__ node
+        name = kwargs.get("name")
+        if metadata and name == metadata.get("langgraph_node") and not name.startswith("__"):
+            with self.lock:
+                self.started[run_id] = ("node", name, time.perf_counter())
+
+    def on_chain_end(self, outputs: Dict[str, Any], *, run_id: UUID, **kwargs: Any) -> None:
+        if started := self.pop_started(run_id, "node"):
+            _, node, start = started
+            NODE_DURATION.labels(node).observe(time.perf_counter() - start)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        if started := self.pop_started(run_id, "node"):
+            _, node, start = started
+            NODE_DURATION.labels(node).observe(time.perf_counter() - start)
+            NODE_ERRORS.labels(node).inc()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], *, run_id: UUID,
+                            metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        metadata = metadata or {}
+        provider = metadata.get("ls_provider", "unknown")
+        model = metadata.get("ls_model_name", "unknown")
+        with self.lock:
+            self.started[run_id] = ("llm", (provider, model), time.perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        if started := self.pop_started(run_id, "llm"):
+            _, (provider, model), start = started
+            messages = [getattr(generation, "message", None) for generations in response.generations for generation in generations]
+            if any(getattr(message, "response_metadata", {}).get(CACHE_HIT_METADATA) for message in messages):
+                return
+            LLM_DURATION.labels(provider, model).observe(time.perf_counter() - start)
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                    if usage:
+                        LLM_TOKENS.labels(provider, model, "input").inc(usage.get("input_tokens", 0))
+                        LLM_TOKENS.labels(provider, model, "output").inc(usage.get("output_tokens", 0))
+                        details = usage.get("input_token_details", {})
+                        LLM_TOKENS.labels(provider, model, "cache_read").inc(details.get("cache_read") or 0)
+                        LLM_TOKENS.labels(provider, model, "cache_write").inc(details.get("cache_creation") or 0)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        if started := self.pop_started(run_id, "llm"):
+            _, (provider, model), start = started
+            LLM_DURATION.labels(provider, model).observe(time.perf_counter() - start)
+            LLM_ERRORS.labels(provider, model).inc()
+
+    def pop_started(self, run_id: UUID, kind: str) -> Optional[tuple]:
+        with self.lock:
+            started = self.started.get(run_id)
+            if started and started[0] == kind:
+                return self.started.pop(run_id)
+        return None
@@ -0,0 +1,285 @@
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, ClassVar, Dict, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from utils.logger import setup_logger
+from utils.metrics import LLM_RATE_LIMITED, LLM_RETRIED, LLM_LIMITER_WAIT, LLM_CONCURRENCY_LIMIT
+from utils.eval_history import estimate_tokens
+from utils.envvars import (ANTHROPIC_RPM, ANTHROPIC_TPM, ANTHROPIC_MAX_CONCURRENCY, GEMINI_RPM, GEMINI_TPM, GEMINI_MAX_CONCURRENCY,
+                           PERPLEXITY_RPM, PERPLEXITY_TPM, PERPLEXITY_MAX_CONCURRENCY, RATE_LIMIT_MAX_RETRIES,
+                           RATE_LIMIT_COMPLETION_TOKENS)
+
+logger = setup_logger("RateLimit")
+
+# status codes of the errors that mean "slow down": too many requests, overloaded (Anthropic) and unavailable (Gemini)
+RATE_LIMIT_STATUS = (429, 503, 529)
+RATE_LIMIT_ERRORS = ("RateLimitError", "ResourceExhausted", "TooManyRequests", "OverloadedError", "ServiceUnavailable")
+# errors worth retrying that don't mean "slow down": request timeout, server errors and the connection failing or timing out
+TRANSIENT_STATUS = (408, 500, 502, 504)
+TRANSIENT_ERRORS = ("APIConnectionError", "APITimeoutError", "InternalServerError", "DeadlineExceeded", "ConnectionError", "TimeoutError")
+MAX_BACKOFF_SECONDS = 60
+
+PROVIDER_LIMITS = {
+    "anthropic": (ANTHROPIC_RPM, ANTHROPIC_TPM, ANTHROPIC_MAX_CONCURRENCY),
+    "gemini": (GEMINI_RPM, GEMINI_TPM, GEMINI_MAX_CONCURRENCY),
+    "perplexity": (PERPLEXITY_RPM, PERPLEXITY_TPM, PERPLEXITY_MAX_CONCURRENCY),
+}
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return status in RATE_LIMIT_STATUS or type(error).__name__ in RATE_LIMIT_ERRORS
+
+
+def is_transient(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return status in TRANSIENT_STATUS or any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+def backoff(attempt: int) -> float:
+    return min(2 ** attempt, MAX_BACKOFF_SECONDS) * random.uniform(0.5, 1)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked to wait before retrying, from the headers of the error's HTTP response"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1)):
+        try:
+            return float(headers.get(header)) * scale
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class TokenBucket:
+    """
+    Refills at per_minute / 60 per second up to per_minute. Amounts taken beyond what is in the
+    bucket leave it in debt, which has to be refilled before anything else is taken. 0 = no limit.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if not self.capacity:
+            return 0
+        self.refill(now)
+        # an amount bigger than the whole bucket only needs a full bucket
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0
+
+    def take(self, amount: float):
+        if self.capacity:
+            self.level -= amount
+
+
+class ProviderLimiter:
+    """
+    Process wide limiter of the calls to one LLM provider: token buckets on the requests and on the
+    tokens (prompt + completion) per minute, and a limit on the calls in flight that adapts to the
+    provider (AIMD): it halves on every rate limit / overload error and grows back by one for about
+    every `limit` calls that succeed. After such an error every caller waits for the retry-after the
+    provider sent (or an exponential backoff) before the next call goes out. Transient errors
+    (connection failures, timeouts, server errors) are retried too, but only the failed call backs off.
+    The SDK clients are built without retries of their own, this is the only retry layer.
+    """
+
+    def __init__(self, provider: str, requests_per_minute: int, tokens_per_minute: int, max_concurrency: int):
+        self.provider = provider
+        self.logger = logger
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max(max_concurrency, 1)
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.condition = threading.Condition()
+        LLM_CONCURRENCY_LIMIT.labels(provider).set(self.max_concurrency)
+
+    def acquire(self, estimated_tokens: int):
+        started = time.monotonic()
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                wait = max(self.blocked_until - now,
+                           self.requests.wait_time(1, now),
+                           self.tokens.wait_time(estimated_tokens, now))
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    break
+                # woken up early when a call finishes
+                self.condition.wait(wait if wait > 0 else None)
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+            self.in_flight += 1
+        LLM_LIMITER_WAIT.labels(self.provider).observe(time.monotonic() - started)
+
+    def release(self, estimated_tokens: int, used_tokens: Optional[int] = None):
+        """A call finished or failed with an error that isn't retried, used_tokens corrects the estimate"""
+        with self.condition:
+            self.in_flight -= 1
+            if used_tokens is not None:
+                self.tokens.take(used_tokens - estimated_tokens)
+            self.condition.notify_all()
+
+    def succeeded(self, estimated_tokens: int, used_tokens: Optional[int] = None):
+        """A call succeeded: releases it and grows the limit, only successes show the provider can take more"""
+        self.release(estimated_tokens, used_tokens)
+        with self.condition:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            LLM_CONCURRENCY_LIMIT.labels(self.provider).set(int(self.limit))
+            self.condition.notify_all()
+
+    def throttled(self, error: BaseException, attempt: int) -> float:
+        """A call was rejected with a rate limit / overload error, returns how long everyone backs off"""
+        delay = retry_after(error)
+        if delay is None:
+            delay = backoff(attempt)
+        with self.condition:
+            self.in_flight -= 1
+            self.limit = max(1.0, self.limit / 2)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            LLM_CONCURRENCY_LIMIT.labels(self.provider).set(int(self.limit))
+            self.condition.notify_all()
+        LLM_RATE_LIMITED.labels(self.provider).inc()
+        self.logger.warning(f"{self.provider} rate limited ({type(error).__name__}), backing off {delay:.1f}s with at most {int(self.limit)} calls in flight")
+        return delay
+
+    def failed(self, error: BaseException, attempt: int) -> float:
+        """A call failed with a transient error, returns how long it backs off before its retry"""
+        delay = backoff(attempt)
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+        LLM_RETRIED.labels(self.provider).inc()
+        self.logger.warning(f"{self.provider} call failed ({type(error).__name__}: {error}), retrying in {delay:.1f}s")
+        return delay
+
+    def retry(self, error: BaseException, attempt: int, estimated_tokens: int) -> bool:
+        """Handles a failed call, returns whether it is retried (after backing off) or the error raised"""
+        if is_rate_limited(error):
+            self.throttled(error, attempt)
+        elif is_transient(error):
+            delay = self.failed(error, attempt)
+            if attempt < RATE_LIMIT_MAX_RETRIES:
+                time.sleep(delay)
+        else:
+            self.release(estimated_tokens)
+            return False
+        return attempt < RATE_LIMIT_MAX_RETRIES
+
+    def call(self, request: Callable[[], Any], estimated_tokens: int, used_tokens: Callable[[Any], Optional[int]]) -> Any:
+        """Runs the request within the limits, retrying it on rate limit and transient errors up to RATE_LIMIT_MAX_RETRIES times"""
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            self.acquire(estimated_tokens)
+            try:
+                result = request()
+            except Exception as e:
+                if not self.retry(e, attempt, estimated_tokens):
+                    raise
+                continue
+            self.succeeded(estimated_tokens, used_tokens(result))
+            return result
+
+    def stream(self, request: Callable[[], Iterator[Any]], estimated_tokens: int, used_tokens: Callable[[List[Any]], Optional[int]]) -> Iterator[Any]:
+        """Like call() for a streamed response, it can only be retried if it fails before its first chunk"""
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            self.acquire(estimated_tokens)
+            chunks = []
+            try:
+                for chunk in request():
+                    chunks.append(chunk)
+                    yield chunk
+            except GeneratorExit:
+                # the caller stopped reading the stream
+                self.release(estimated_tokens)
+                raise
+            except Exception as e:
+                if chunks:
+                    self.release(estimated_tokens)
+                    raise
+                if not self.retry(e, attempt, estimated_tokens):
+                    raise
+                continue
+            self.succeeded(estimated_tokens, used_tokens(chunks))
+            return
+
+
+limiters: Dict[str, ProviderLimiter] = {}
+limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str) -> ProviderLimiter:
+    """The process wide limiter of a provider: 'anthropic', 'gemini' or 'perplexity'"""
+    with limiters_lock:
+        if provider not in limiters:
+            if provider not in PROVIDER_LIMITS:
+                raise ValueError(f"Invalid LLM provider '{provider}', expected one of {list(PROVIDER_LIMITS)}")
+            requests_per_minute, tokens_per_minute, max_concurrency = PROVIDER_LIMITS[provider]
+            limiters[provider] = ProviderLimiter(provider, requests_per_minute, tokens_per_minute, max_concurrency)
+            logger.info(f"Limiting {provider} to {requests_per_minute or 'unlimited'} requests/min, "
+                        f"{tokens_per_minute or 'unlimited'} tokens/min and {max_concurrency} calls in flight")
+        return limiters[provider]
+
+
+def result_tokens(result: ChatResult) -> Optional[int]:
+    usage = [generation.message.usage_metadata for generation in result.generations
+             if getattr(generation.message, "usage_metadata", None)]
+    return sum(u["total_tokens"] for u in usage) if usage else None
+
+
+def chunk_tokens(chunks: List[ChatGenerationChunk]) -> Optional[int]:
+    usage = [chunk.message.usage_metadata for chunk in chunks if getattr(chunk.message, "usage_metadata", None)]
+    return sum(u["total_tokens"] for u in usage) if usage else None
+
+
+class RateLimitedChatModel:
+    """
+    Mixed into a chat model class so every request it sends to the provider goes through the
+    provider's limiter. It wraps _generate / _stream, which LangChain only calls after the cache
+    lookup, so cached responses don't use up any of the limits.
+    """
+    provider: ClassVar[str]
+
+    def estimated_tokens(self, messages: List[BaseMessage], **kwargs: Any) -> int:
+        """
+        The prompt and the completion expected, not max_tokens: most replies are far shorter and the
+        actual usage corrects the booking when the call finishes
+        """
+        max_tokens = kwargs.get("max_tokens") or getattr(self, "max_tokens", None) or RATE_LIMIT_COMPLETION_TOKENS
+        return estimate_tokens(messages) + min(max_tokens, RATE_LIMIT_COMPLETION_TOKENS)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        return get_limiter(self.provider).call(lambda: super(RateLimitedChatModel, self)._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+                                               self.estimated_tokens(messages, **kwargs), result_tokens)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        return get_limiter(self.provider).stream(lambda: super(RateLimitedChatModel, self)._stream(messages, stop=stop, run_manager=run_manager, **kwargs),
+                                                 self.estimated_tokens(messages, **kwargs), chunk_tokens)
+
+
+@lru_cache(maxsize=None)
+def rate_limited_class(model_class: type, provider: str) -> type:
+    # same class name, so the cache and fixture keys (which include it) don't change
+    return type(model_class.__name__, (RateLimitedChatModel, model_class), {"provider": provider, "__annotations__": {"provider": ClassVar[str]}, "__module__": __name__})
+
+
+def rate_limited(llm: BaseChatModel, provider: str) -> BaseChatModel:
+    """
+    Returns a copy of the chat model whose calls go through the process wide limiter of the provider.
+    Wrap the model before cached_llm so the copies made for each call site keep the limiter.
+    """
+    get_limiter(provider)
+    limited = llm.model_copy()
+    limited.__class__ = rate_limited_class(type(llm), provider)
+    return limited
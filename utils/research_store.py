@@ -0,0 +1,203 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+import numpy as np
+from pydantic import BaseModel, Field
+from agent.data_class.blog_data import ResearchResponse
+from utils.logger import setup_logger
+from utils.envvars import RESEARCH_REUSE_PATH, RESEARCH_REUSE_THRESHOLD, RESEARCH_REUSE_MAX_AGE_DAYS, RESEARCH_REUSE_MAX_ENTRIES
+
+logger = setup_logger("ResearchStore")
+
+NUM_PERMUTATIONS = 128
+# LSH bands of ROWS_PER_BAND signature values: two theses share a band (and get compared) with a probability of
+# 1 - (1 - s^4)^32 for a similarity s, about 0.5 at s = 0.42 and over 0.99 from s = 0.6
+ROWS_PER_BAND = 4
+BANDS = NUM_PERMUTATIONS // ROWS_PER_BAND
+PRIME = (1 << 31) - 1
+# fixed seed, the signatures are stored and have to be the same in every process
+PERMUTATIONS = np.random.default_rng(20240601).integers(1, PRIME, size=(2, NUM_PERMUTATIONS), dtype=np.uint64)
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+CLAUSE_PATTERN = re.compile(r"[.,;:!?()]")
+NEGATIONS = {"not", "no", "never", "nor", "none", "neither", "without", "cannot", "hardly", "rarely"}
+
+
+def thesis_words(thesis: str) -> List[str]:
+    """
+    The words of the thesis, stopwords kept, with the ones after a negation (up to the end of its
+    clause) marked as negated: "won't replace programmers" gives won't, not_replace, not_programmers
+    """
+    words = []
+    for clause in CLAUSE_PATTERN.split(thesis.lower()):
+        negated = False
+        for word in WORD_PATTERN.findall(clause):
+            words.append(f"not_{word}" if negated else word)
+            if word in NEGATIONS or word.endswith("n't"):
+                negated = True
+    return words
+
+
+def shingles(thesis: str) -> List[int]:
+    """
+    The thesis as a set of hashed words and word pairs. The negation marks and the pairs keep a thesis
+    apart from its opposite and from the same words in another order, which a bag of keywords would
+    find identical.
+    """
+    words = thesis_words(thesis)
+    terms = set(words) | {f"{first} {second}" for first, second in zip(words, words[1:])}
+    return [zlib.crc32(term.encode("utf-8")) % PRIME for term in terms]
+
+
+def minhash(thesis: str) -> np.ndarray:
+    """
+    MinHash signature of the thesis: the share of equal values between two signatures estimates the
+    Jaccard similarity of their shingles
+    """
+    values = np.array(shingles(thesis), dtype=np.uint64)
+    if not len(values):
+        return np.full(NUM_PERMUTATIONS, PRIME, dtype=np.uint64)
+    a, b = PERMUTATIONS
+    # values and a are below 2^31, so the products fit in 64 bits
+    return ((values[:, None] * a[None, :] + b[None, :]) % PRIME).min(axis=0)
+
+
+def similarity(first: np.ndarray, second: np.ndarray) -> float:
+    return float(np.mean(first == second))
+
+
+def band_keys(signature: np.ndarray) -> List[str]:
+    return [f"{band}:{zlib.crc32(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes())}" for band in range(BANDS)]
+
+
+class StoredResearch(BaseModel):
+    thesis: str = Field(description="The thesis the research was done for")
+    research: ResearchResponse = Field(description="The research, without the content of the source pages")
+    similarity: float = Field(description="Estimated similarity of the stored thesis to the one looked up, 0 to 1")
+    age_days: float = Field(description="Days since the research was done")
+
+
+class ResearchStore:
+    """
+    Research results of earlier runs, kept in SQLite and found again by the similarity of their
+    thesis. Theses are compared by MinHash signature and indexed with LSH bands, so a lookup only
+    compares the signatures of the theses that share a band with the new one.
+    """
+
+    def __init__(self, path: str = "cache/research.sqlite", threshold: float = 0.6, max_age_days: float = 7, max_entries: int = 1000):
+        if not 0 < threshold <= 1:
+            raise ValueError(f"Invalid research reuse threshold {threshold}, expected a similarity above 0 and at most 1")
+        self.logger = logger
+        self.path = path
+        self.threshold = threshold
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        self.counts = {"reused": 0, "researched": 0}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS research (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                thesis TEXT,
+                signature BLOB,
+                content BLOB,
+                sources TEXT,
+                created_at REAL
+            )""")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS research_bands (
+                band TEXT,
+                research_id INTEGER
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS research_bands_band ON research_bands (band)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS research_bands_research ON research_bands (research_id)")
+        self.conn.commit()
+        self.logger.info(f"Initialized ResearchStore at {path}")
+
+    def find(self, thesis: str) -> Optional[StoredResearch]:
+        """
+        The most similar research done in the last max_age_days for a thesis at least `threshold`
+        similar to this one, or None
+        """
+        signature = minhash(thesis)
+        keys = band_keys(signature)
+        oldest = time.time() - self.max_age_days * 24 * 3600
+        with self.lock:
+            rows = self.conn.execute(
+                f"""SELECT id, thesis, signature, created_at FROM research WHERE created_at >= ? AND id IN
+                    (SELECT research_id FROM research_bands WHERE band IN ({', '.join('?' * len(keys))}))""",
+                [oldest, *keys],
+            ).fetchall()
+        best, best_similarity = None, 0.0
+        for research_id, stored_thesis, stored_signature, created_at in rows:
+            score = similarity(signature, np.frombuffer(stored_signature, dtype=np.uint64))
+            if score >= self.threshold and score > best_similarity:
+                best, best_similarity = (research_id, stored_thesis, created_at), score
+        if best is None:
+            return None
+        research_id, stored_thesis, created_at = best
+        with self.lock:
+            content, sources = self.conn.execute("SELECT content, sources FROM research WHERE id = ?", (research_id,)).fetchone()
+        research = ResearchResponse(content=zlib.decompress(content).decode("utf-8"), sources=json.loads(sources))
+        return StoredResearch(thesis=stored_thesis, research=research, similarity=best_similarity,
+                              age_days=(time.time() - created_at) / (24 * 3600))
+
+    def put(self, thesis: str, research: ResearchResponse):
+        """Stores the research (content and sources, the pages are fetched again when it's reused)"""
+        signature = minhash(thesis)
+        with self.lock:
+            cur = self.conn.execute(
+                "INSERT INTO research (thesis, signature, content, sources, created_at) VALUES (?, ?, ?, ?, ?)",
+                (thesis, signature.tobytes(), zlib.compress(research.content.encode("utf-8")), json.dumps(research.sources), time.time()),
+            )
+            self.conn.executemany("INSERT INTO research_bands (band, research_id) VALUES (?, ?)",
+                                  [(key, cur.lastrowid) for key in band_keys(signature)])
+            self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        """
+        Deletes research older than max_age_days and the oldest beyond max_entries, call with the lock held
+        """
+        oldest = time.time() - self.max_age_days * 24 * 3600
+        expired = [row[0] for row in self.conn.execute(
+            "SELECT id FROM research WHERE created_at < ? OR id NOT IN (SELECT id FROM research ORDER BY id DESC LIMIT ?)",
+            (oldest, self.max_entries)).fetchall()]
+        if expired:
+            self.conn.executemany("DELETE FROM research_bands WHERE research_id = ?", [(i,) for i in expired])
+            self.conn.executemany("DELETE FROM research WHERE id = ?", [(i,) for i in expired])
+            self.logger.info(f"Evicted {len(expired)} researches from the research store")
+
+    def record(self, outcome: str):
+        """Counts a lookup outcome: 'reused' or 'researched'"""
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM research").fetchone()[0]
+            return {**self.counts, "entries": entries, "threshold": self.threshold, "max_age_days": self.max_age_days}
+
+
+store: Optional[ResearchStore] = None
+store_lock = threading.Lock()
+
+
+def get_research_store() -> ResearchStore:
+    """The process wide research store in RESEARCH_REUSE_PATH"""
+    global store
+    with store_lock:
+        if store is None:
+            store = ResearchStore(RESEARCH_REUSE_PATH, RESEARCH_REUSE_THRESHOLD, RESEARCH_REUSE_MAX_AGE_DAYS, RESEARCH_REUSE_MAX_ENTRIES)
+        return store
+
+
+def research_store_stats() -> Dict[str, Any]:
+    with store_lock:
+        return store.stats() if store else {"entries": 0}
@@ -0,0 +1,122 @@
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Tuple
+import numpy as np
+from pydantic import BaseModel, Field
+from utils.eval_history import CHARS_PER_TOKEN
+
+SOURCE_PATTERN = re.compile(r"--- START OF CONTENT FROM (.+?) ---\n\n(.*?)\n\n--- END OF CONTENT FROM \1 ---", re.DOTALL)
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""a an and are as at be but by for from has have how in is it its of on or that the their this to was
+were what when which who will with you your we our not can all more about into than they them then there these also""".split())
+
+
+class Chunk(BaseModel):
+    source: str = Field(description="The url of the page the chunk comes from")
+    text: str = Field(description="A few paragraphs of the page's markdown")
+    position: int = Field(description="Position of the chunk in the index, chunks of the same page are consecutive")
+
+
+def split_sources(sources_content: str) -> List[Tuple[str, str]]:
+    """
+    The (url, markdown) of every page in ResearchResponse.sources_content, pages that couldn't be fetched are left out
+    """
+    return [(url, markdown) for url, markdown in SOURCE_PATTERN.findall(sources_content) if markdown.strip()]
+
+
+def chunk_text(text: str, max_chars: int) -> List[str]:
+    """
+    Splits the text into chunks of whole paragraphs of up to max_chars, paragraphs longer than that are cut
+    """
+    chunks, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        while len(paragraph) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+class ResearchIndex:
+    """
+    BM25 index over chunks of the source pages of the research. Kept as postings (for each term the
+    chunks it is in and how often), so scoring a query only touches the chunks that share a term with it.
+    """
+
+    def __init__(self, chunks: List[Chunk], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        counts = [Counter(tokenize(chunk.text)) for chunk in chunks]
+        self.lengths = np.array([sum(count.values()) for count in counts], dtype=np.float64)
+        self.average_length = float(self.lengths.mean()) if chunks else 0.0
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for i, count in enumerate(counts):
+            for term, frequency in count.items():
+                chunk_ids, frequencies = postings.setdefault(term, ([], []))
+                chunk_ids.append(i)
+                frequencies.append(frequency)
+        self.postings = {term: (np.array(chunk_ids), np.array(frequencies, dtype=np.float64)) for term, (chunk_ids, frequencies) in postings.items()}
+
+    @classmethod
+    def from_sources_content(cls, sources_content: str, chunk_chars: int) -> "ResearchIndex":
+        chunks = []
+        for url, markdown in split_sources(sources_content):
+            for text in chunk_text(markdown, chunk_chars):
+                chunks.append(Chunk(source=url, text=text, position=len(chunks)))
+        return cls(chunks)
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.chunks))
+        if not self.chunks:
+            return scores
+        norms = self.k1 * (1 - self.b + self.b * self.lengths / max(self.average_length, 1e-9))
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            chunk_ids, frequencies = self.postings[term]
+            idf = math.log(1 + (len(self.chunks) - len(chunk_ids) + 0.5) / (len(chunk_ids) + 0.5))
+            scores[chunk_ids] += idf * frequencies * (self.k1 + 1) / (frequencies + norms[chunk_ids])
+        return scores
+
+    def search(self, query: str, top_k: int, token_budget: int) -> List[Chunk]:
+        """
+        The best matching chunks for the query, at most top_k of them and together under token_budget
+        (estimated), in the order of the pages they come from
+        """
+        scores = self.scores(query)
+        chosen, budget = [], token_budget * CHARS_PER_TOKEN
+        for i in np.argsort(-scores, kind="stable"):
+            if scores[i] <= 0 or len(chosen) == top_k:
+                break
+            if len(self.chunks[i].text) <= budget:
+                chosen.append(self.chunks[i])
+                budget -= len(self.chunks[i].text)
+        return sorted(chosen, key=lambda chunk: chunk.position)
+
+
+@lru_cache(maxsize=16)
+def research_index(sources_content: str, chunk_chars: int) -> ResearchIndex:
+    """The index of a run's source pages, built once and shared by all the writer calls of the run"""
+    return ResearchIndex.from_sources_content(sources_content, chunk_chars)
+
+
+def format_excerpts(chunks: List[Chunk]) -> str:
+    return "\n\n".join(f"[{chunk.source}]\n{chunk.text}" for chunk in chunks)
@@ -0,0 +1,105 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+from utils.logger import setup_logger
+
+logger = setup_logger("Startup")
+
+T = TypeVar("T")
+
+
+class LazyInstance(Generic[T]):
+    """
+    Builds an expensive object (e.g. the Supervisor) the first time it is needed instead of at import time.
+
+    get() builds it on first use and returns the same instance afterwards, warm_up() starts building it
+    on a background thread so the first request doesn't have to wait. If building fails the error is
+    kept for status() and the next get() tries again.
+    """
+
+    def __init__(self, factory: Callable[[], T], name: str):
+        self.factory = factory
+        self.name = name
+        self.logger = logger
+        self.instance: Optional[T] = None
+        self.error: Optional[str] = None
+        self.build_seconds: Optional[float] = None
+        self.building = False
+        self.lock = threading.Lock()
+
+    def get(self) -> T:
+        if self.instance is not None:
+            return self.instance
+        with self.lock:
+            if self.instance is None:
+                self.building = True
+                start = time.perf_counter()
+                try:
+                    self.logger.info(f"Building {self.name}")
+                    self.instance = self.factory()
+                    self.error = None
+                    self.build_seconds = time.perf_counter() - start
+                    self.logger.info(f"Built {self.name} in {self.build_seconds:.2f}s")
+                except Exception as e:
+                    self.error = str(e)
+                    self.logger.error(f"Failed to build {self.name}: {str(e)}")
+                    raise
+                finally:
+                    self.building = False
+        return self.instance
+
+    def warm_up(self) -> threading.Thread:
+        """
+        Builds the instance on a background (daemon) thread
+        """
+        def build():
+            try:
+                self.get()
+            except Exception:
+                pass
+        thread = threading.Thread(target=build, name=f"warmup-{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> Dict[str, object]:
+        if self.instance is not None:
+            state = "ready"
+        elif self.building:
+            state = "warming"
+        elif self.error:
+            state = "failed"
+        else:
+            state = "cold"
+        return {"status": state, "error": self.error, "build_seconds": self.build_seconds}
+
+
+def import_time_report(module: str = "app", top: int = 20) -> List[Tuple[str, float]]:
+    """
+    Imports a module in a fresh interpreter with -X importtime and returns the top packages by
+    self import time (in milliseconds), so it's easy to see which SDKs slow down boot.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, STARTUP_MODE="lazy")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=root, env=env, capture_output=True, text=True)
+    totals: Dict[str, float] = defaultdict(float)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _cumulative_us, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us) / 1000
+    if result.returncode != 0:
+        logger.warning(f"Importing {module} failed: {result.stderr.strip().splitlines()[-1]}")
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    module = sys.argv[1] if len(sys.argv) > 1 else "app"
+    report = import_time_report(module)
+    print(f"Import time of '{module}' by top level package:")
+    for package, ms in report:
+        print(f"{ms:10.1f} ms  {package}")
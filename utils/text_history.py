@@ -0,0 +1,84 @@
+import difflib
+import json
+import zlib
+from typing import Any, List, Optional
+from pydantic import BaseModel, Field, model_serializer, model_validator
+
+
+def encode_version(previous: Optional[str], text: str) -> bytes:
+    """
+    Compresses a text as a line delta against the previous version: a list of [start, end] ranges of
+    previous lines to copy and strings of new lines. The text is stored whole when that is smaller.
+    """
+    whole = zlib.compress(json.dumps({"text": text}).encode("utf-8"))
+    if not previous:
+        return whole
+    old_lines = previous.splitlines(keepends=True)
+    new_lines = text.splitlines(keepends=True)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(new_lines[j1:j2]))
+    delta = zlib.compress(json.dumps({"ops": ops}).encode("utf-8"))
+    return delta if len(delta) < len(whole) else whole
+
+
+def decode_version(previous: Optional[str], blob: bytes) -> str:
+    payload = json.loads(zlib.decompress(blob))
+    if "text" in payload:
+        return payload["text"]
+    old_lines = previous.splitlines(keepends=True)
+    return "".join("".join(old_lines[op[0]:op[1]]) if isinstance(op, list) else op for op in payload["ops"])
+
+
+class TextHistory(BaseModel):
+    """
+    The versions of a text (article drafts, evaluated outlines) kept compressed, each one as a delta
+    against the one before it. Versions are only rebuilt when they are read. Validates from and
+    serializes to a plain list of strings, so it can stand in for a List[str] field.
+    """
+    entries: List[bytes] = Field(default_factory=list)
+
+    @model_validator(mode="before")
+    @classmethod
+    def from_texts(cls, value: Any) -> Any:
+        if isinstance(value, list):
+            entries, previous = [], None
+            for text in value:
+                entries.append(encode_version(previous, text))
+                previous = text
+            return {"entries": entries}
+        return value
+
+    @model_serializer
+    def to_texts(self) -> List[str]:
+        return self.versions()
+
+    def append(self, text: str):
+        self.entries.append(encode_version(self.latest(), text))
+
+    def versions(self) -> List[str]:
+        texts, previous = [], None
+        for blob in self.entries:
+            previous = decode_version(previous, blob)
+            texts.append(previous)
+        return texts
+
+    def latest(self) -> Optional[str]:
+        return self[-1] if self.entries else None
+
+    def compressed_size(self) -> int:
+        return sum(len(blob) for blob in self.entries)
+
+    def __getitem__(self, index: int) -> str:
+        return self.versions()[index]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __repr__(self) -> str:
+        return f"TextHistory(versions={len(self.entries)}, compressed_bytes={self.compressed_size()})"
+
+    __str__ = __repr__
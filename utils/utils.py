@@ -1,17 +1,93 @@
 import io
+from functools import lru_cache
+from langchain_core.messages import SystemMessage
+import hashlib
+import threading
+import time
 from flask import send_file
 import os
-from datetime import datetime
+from utils.envvars import LOG_DIR
+
+GRAPH_CACHE_DIR = os.path.join('cache', 'graphs')
+# rendered graph images keyed by the hash of the graph's mermaid source
+graph_render_cache = {}
+graph_render_cache_lock = threading.Lock()
+# when rendering a structure last failed, so an unreachable renderer isn't retried on every request
+graph_render_failures = {}
+GRAPH_RENDER_RETRY_SECONDS = 300
+
+def graph_mermaid(graph, xray=False) -> tuple[str, str]:
+    """
+    Returns the mermaid source of a compiled graph and its sha256 hash. Both are computed locally,
+    and the hash only changes when the graph structure does.
+    """
+    mermaid = graph.get_graph(xray=xray).draw_mermaid()
+    return mermaid, hashlib.sha256(mermaid.encode('utf-8')).hexdigest()
+
+def render_graph_png(graph, logger, xray=False) -> tuple[bytes, str]:
+    """
+    Renders a compiled graph to a PNG, reusing earlier renders of the same graph structure from
+    memory or from disk so the remote mermaid renderer is only called once per structure.
+
+    Returns:
+        tuple[bytes, str]: The PNG data and the structure hash (usable as an ETag)
+    """
+    _, digest = graph_mermaid(graph, xray)
+    with graph_render_cache_lock:
+        if digest in graph_render_cache:
+            return graph_render_cache[digest], digest
+
+    cache_path = os.path.join(GRAPH_CACHE_DIR, f"{digest}.png")
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            img_data = f.read()
+    else:
+        with graph_render_cache_lock:
+            failed_at = graph_render_failures.get(digest)
+        if failed_at and time.time() - failed_at < GRAPH_RENDER_RETRY_SECONDS:
+            raise RuntimeError("Graph rendering failed recently, not retrying yet")
+        logger.info("Rendering graph with the mermaid renderer")
+        try:
+            img_data = graph.get_graph(xray=xray).draw_mermaid_png()
+        except Exception:
+            with graph_render_cache_lock:
+                graph_render_failures[digest] = time.time()
+            raise
+        os.makedirs(GRAPH_CACHE_DIR, exist_ok=True)
+        with open(cache_path, "wb") as f:
+            f.write(img_data)
+
+    with graph_render_cache_lock:
+        graph_render_cache[digest] = img_data
+    return img_data, digest
+
+def send_graph(graph, logger, format="png", xray=False):
+    """
+    Flask response with the graph as a PNG, or as mermaid source if format is 'mermaid' or the
+    PNG can't be rendered (e.g. no network). Sent with the structure hash as ETag so clients can revalidate.
+    """
+    if format == "png":
+        try:
+            img_data, digest = render_graph_png(graph, logger, xray)
+            return send_file(io.BytesIO(img_data), mimetype='image/png', etag=digest, max_age=0)
+        except Exception as e:
+            logger.warning(f"Could not render graph as PNG, falling back to mermaid source: {str(e)}")
+    mermaid, digest = graph_mermaid(graph, xray)
+    return send_file(io.BytesIO(mermaid.encode('utf-8')), mimetype='text/plain', etag=f"{digest}-mmd", max_age=0)
 
 def showgraph(graph, logger, graph_name):
+    """
+    Saves the mermaid source of the graph to LOG_DIR/<graph_name>.mmd. This is local only so it never
+    blocks on the remote renderer, the PNG is rendered on demand by render_graph_png.
+    """
     try:
-        img_data = graph.get_graph(xray=2).draw_mermaid_png()
-        timestamp = datetime.now().strftime("%Y-%m-%d-%H%M%S")
-        
-        # Write image data to file
-        output_path = f"logs/{timestamp}-{graph_name}.png"
-        with open(output_path, "wb") as f:
-            f.write(img_data)
+        mermaid, _ = graph_mermaid(graph, xray=2)
+
+        # Write mermaid source to file
+        os.makedirs(LOG_DIR, exist_ok=True)
+        output_path = os.path.join(LOG_DIR, f"{graph_name}.mmd")
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(mermaid)
         logger.info(f"Graph saved to {output_path}")
             
         return output_path
@@ -19,41 +95,20 @@ def showgraph(graph, logger, graph_name):
         logger.error(f"Failed to display graph: {str(e)}")
         raise
 
-def write_to_file(content: any, filename: str, logger) -> str:
+def message_text(message) -> str:
     """
-    Writes content to a file in the logs directory with timestamp.
-    
-    Args:
-        content: Content to write
-        filename: Base name of the file
-        logger: Logger instance for error handling
-        
-    Returns:
-        str: Path to the written file
+    Returns the text of an LLM message or message chunk. The content is either a string or,
+    for tool calling / multi part responses, a list of content blocks of which only the text ones count.
     """
-    try:
-        extension = "txt"
-        if type(content) == str:
-            extension = "txt"
-        elif hasattr(content, 'model_dump_json'):
-            extension = "json"
-            content = content.model_dump_json()
-        # Ensure logs directory exists
-        if not os.path.exists('logs'):
-            os.makedirs('logs')
-        # Convert any literal \n strings to actual newlines
-        content = content.replace('\\n', '\n')
-        # Add timestamp to filename
-        timestamp = datetime.now().strftime("%Y-%m-%d-%H%M%S")
-        filename_with_timestamp = f"{timestamp}-{filename}.{extension}"
-        
-        filepath = os.path.join('logs', filename_with_timestamp)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
-            
-        logger.info(f"Content written to {filepath}")
-        return filepath
-        
-    except Exception as e:
-        logger.error(f"Failed to write to file: {str(e)}")
-        raise
\ No newline at end of file
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+
+@lru_cache(maxsize=64)
+def shared_system_message(text: str) -> SystemMessage:
+    """
+    Returns the same SystemMessage object for the same prompt text, so the states of all the runs
+    (and every tool that loaded the prompt) reference one copy of it instead of their own
+    """
+    return SystemMessage(content=text)